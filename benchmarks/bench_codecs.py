@@ -0,0 +1,83 @@
+"""Encode/decode microbenchmarks for every event codec and event type.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_codecs.py
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+
+from trader import codecs
+from trader.events import Event
+
+
+def sample_events() -> dict[str, Event]:
+    base_ts = 1_700_000_000_000
+    candle = [[base_ts + i * 60_000, 42_000.5 + i, 42_100.25, 41_950.0, 42_050.75, 123.456] for i in range(2)]
+    signal = {
+        "strategy": "trend_following",
+        "exchange": "binance",
+        "symbol": "BTC/USDT",
+        "decision": "buy",
+        "confidence": 0.6,
+        "price": 42_050.75,
+        "risk": {"stop_distance": 310.5, "position_size": 0.644},
+    }
+    return {
+        "market_data": Event(
+            type="market_data",
+            payload={
+                "exchange": "binance",
+                "symbol": "BTC/USDT",
+                "timeframe": "1m",
+                "data": candle,
+                "timestamp": "2024-01-01T00:00:00.000000",
+            },
+        ),
+        "market_data_500": Event(
+            type="market_data",
+            payload={
+                "exchange": "binance",
+                "symbol": "BTC/USDT",
+                "timeframe": "1m",
+                "data": [[base_ts + i * 60_000, 1.0, 2.0, 0.5, 1.5, 10.0] for i in range(500)],
+                "timestamp": "2024-01-01T00:00:00.000000",
+            },
+        ),
+        "signal": Event(type="signal", payload=signal),
+        "approved_signal": Event(type="approved_signal", payload={**signal, "risk_approved": True}),
+        "reinstall_stop": Event(
+            type="reinstall_stop",
+            payload={
+                "symbol": "BTC/USDT",
+                "exchange": "binance",
+                "strategy": "trend_following",
+                "quantity": 0.644,
+                "stop_price": 41_740.25,
+            },
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20_000, help="Iterations per measurement.")
+    args = parser.parse_args()
+
+    print(f"{'event':<18} {'codec':<8} {'bytes':>7} {'encode ns':>10} {'decode ns':>10}")
+    for name, event in sample_events().items():
+        for codec in codecs.CODECS.values():
+            encoded = event.dumps(codec.name)
+            assert Event.from_bytes(encoded).type == event.type
+            encode_s = timeit.timeit(lambda: event.dumps(codec.name), number=args.number)
+            decode_s = timeit.timeit(lambda: Event.from_bytes(encoded), number=args.number)
+            print(
+                f"{name:<18} {codec.name:<8} {len(encoded):>7} "
+                f"{encode_s / args.number * 1e9:>10,.0f} {decode_s / args.number * 1e9:>10,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Measure EventBus throughput against a local Redis at several batch sizes.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_event_bus.py --redis-url redis://localhost:6379/15
+
+The benchmark writes to throwaway streams and deletes them afterwards; point it
+at a scratch database.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from trader.events import Event, EventBus
+
+
+BATCH_SIZES = (1, 16, 256)
+
+
+def _market_event(i: int) -> Event:
+    return Event(
+        type="market_data",
+        payload={
+            "exchange": "binance",
+            "symbol": f"SYM{i % 500}/USDT",
+            "timeframe": "1m",
+            "data": [[1_700_000_000_000 + i * 60_000, 100.0, 101.0, 99.0, 100.5, 12.5]] * 2,
+            "timestamp": "2024-01-01T00:00:00",
+        },
+    )
+
+
+async def _bench_batch(bus: EventBus, batch_size: int, total: int) -> tuple[float, float]:
+    stream = f"bench.{uuid.uuid4().hex}"
+    group = "bench"
+    events = [_market_event(i) for i in range(total)]
+    try:
+        await bus.ensure_group(stream, group)
+
+        started = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            chunk = events[offset:offset + batch_size]
+            if batch_size == 1:
+                await bus.publish(stream, chunk[0])
+            else:
+                await bus.publish_many(stream, chunk)
+        publish_rate = total / (time.perf_counter() - started)
+
+        consumed = 0
+        started = time.perf_counter()
+        while consumed < total:
+            batch = await bus.consume_group(stream, group, "bench-1", count=batch_size, block_ms=100)
+            await bus.ack(stream, group, [message_id for _, message_id in batch])
+            consumed += len(batch)
+        consume_rate = total / (time.perf_counter() - started)
+        return publish_rate, consume_rate
+    finally:
+        assert bus._redis is not None
+        await bus._redis.delete(stream)
+
+
+async def _main(redis_url: str, total: int) -> None:
+    bus = EventBus(redis_url=redis_url)
+    await bus.connect()
+    try:
+        print(f"{'batch':>6} {'publish ev/s':>14} {'consume+ack ev/s':>18}")
+        for batch_size in BATCH_SIZES:
+            publish_rate, consume_rate = await _bench_batch(bus, batch_size, total)
+            print(f"{batch_size:>6} {publish_rate:>14,.0f} {consume_rate:>18,.0f}")
+    finally:
+        await bus.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--events", type=int, default=20_000, help="Events per batch size.")
+    args = parser.parse_args()
+    asyncio.run(_main(args.redis_url, args.events))
+
+
+if __name__ == "__main__":
+    main()
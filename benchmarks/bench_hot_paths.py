@@ -0,0 +1,433 @@
+"""Regression benchmarks for the trader hot paths, with stored baselines.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_hot_paths.py                  # compare with the baseline
+    PYTHONPATH=src python benchmarks/bench_hot_paths.py --save-baseline  # record a new baseline
+    PYTHONPATH=src python benchmarks/bench_hot_paths.py --only risk_signals --only order_id
+
+Everything runs offline: services use the in-memory EventBus, stub
+exchanges and a throwaway SQLite database. Fixtures are sized like a
+production universe (500 symbols, 10,000 open positions, bar closes arriving
+as bursts of one event per symbol). Each case reports throughput and
+p50/p99 latency per operation, best of ``--repeat`` runs. The run fails
+(exit status 1) when a case's throughput drops more than ``--max-slowdown``
+below its baseline or its p99 latency grows more than ``--max-p99-increase``
+above it. Baselines are only comparable on the machine that recorded them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Sequence
+
+import numpy as np
+
+from trader.config import Settings, get_settings
+from trader.db import create_schema, create_session_factory, session_scope
+from trader.events import Event, EventBus
+from trader.gateway import ExchangeGateway
+from trader.ledger import RiskLedger, database_checksum
+from trader.logging import configure_logging
+from trader.models import Position
+from trader.replay import StubExchange
+from trader.services.execution_service import ExecutionService
+from trader.services.risk_service import RiskService
+from trader.services.strategy_service import StrategyService
+from trader.utils import calculate_position_size, make_client_order_id
+
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+
+SYMBOLS = 500
+POSITIONS = 10_000
+EXCHANGE = "binance"
+TIMEFRAME_MS = 60_000
+FIRST_BAR_MS = 1_700_000_000_000
+
+
+@dataclass
+class Result:
+    name: str
+    ops: int
+    seconds: float
+    p50_us: float
+    p99_us: float
+
+    @property
+    def throughput(self) -> float:
+        return self.ops / self.seconds
+
+
+def _result(name: str, samples_ns: Sequence[int], ops_per_sample: int = 1) -> Result:
+    """Summarise per-sample durations; latencies are per operation."""
+    per_op_us = np.asarray(samples_ns, dtype=float) / ops_per_sample / 1_000
+    return Result(
+        name=name,
+        ops=len(samples_ns) * ops_per_sample,
+        seconds=float(np.sum(samples_ns)) / 1e9,
+        p50_us=float(np.percentile(per_op_us, 50)),
+        p99_us=float(np.percentile(per_op_us, 99)),
+    )
+
+
+def _time_calls(name: str, call: Callable[[int], object], *, chunks: int, chunk_size: int) -> Result:
+    """Time ``call(i)`` in chunks, so timer overhead stays small next to sub-microsecond calls."""
+    samples = []
+    i = 0
+    for _ in range(chunks):
+        started = time.perf_counter_ns()
+        for _ in range(chunk_size):
+            call(i)
+            i += 1
+        samples.append(time.perf_counter_ns() - started)
+    return _result(name, samples, chunk_size)
+
+
+def _settings(workdir: str) -> Settings:
+    settings = get_settings().model_copy(deep=True)
+    settings.app.dry_run = False
+    settings.redis.enabled = False
+    settings.redis.consumer_groups.enabled = False
+    settings.sharding.enabled = False
+    settings.candle_store.enabled = False
+    settings.database.engine = "sqlite"
+    settings.database.url = f"sqlite:///{Path(workdir) / 'bench.db'}"
+    settings.execution.order_updates = "poll"  # no ccxt.pro clients for the stub venue
+    settings.exchanges = [
+        {
+            "name": EXCHANGE,
+            "module": "ccxt.binanceusdm",
+            "symbols": [_symbol(i) for i in range(SYMBOLS)],
+            "timeframe": "1m",
+        }
+    ]
+    return settings
+
+
+def _symbol(i: int) -> str:
+    return f"SYM{i:03d}/USDT"
+
+
+# --- primitives --------------------------------------------------------------
+
+
+def bench_order_id(workdir: str) -> List[Result]:
+    symbols = [_symbol(i) for i in range(SYMBOLS)]
+    return [
+        _time_calls(
+            "order_id",
+            lambda i: make_client_order_id("trend_following", symbols[i % SYMBOLS], "buy"),
+            chunks=200,
+            chunk_size=100,
+        )
+    ]
+
+
+def bench_position_size(workdir: str) -> List[Result]:
+    settings = get_settings().risk.model_dump()
+    settings["volatility_targeting"] = {"enabled": True, "target_portfolio_vol": 0.12}
+    stops = np.random.default_rng(1).uniform(0.5, 50.0, 1024).tolist()
+    return [
+        _time_calls(
+            "position_size",
+            lambda i: calculate_position_size(100_000.0, stops[i % 1024], settings, asset_vol=0.6),
+            chunks=200,
+            chunk_size=500,
+        )
+    ]
+
+
+def bench_codecs(workdir: str) -> List[Result]:
+    candles = [[FIRST_BAR_MS + i * TIMEFRAME_MS, 42_000.5, 42_100.25, 41_950.0, 42_050.75, 123.456] for i in range(2)]
+    event = Event(
+        type="market_data",
+        payload={
+            "exchange": EXCHANGE,
+            "symbol": _symbol(0),
+            "timeframe": "1m",
+            "data": candles,
+            "timestamp": "2024-01-01T00:00:00.000000",
+        },
+    ).stamp("ingest")
+    results = []
+    for codec in ("json", "msgpack"):
+        encoded = event.dumps(codec)
+        results.append(_time_calls(f"event_dumps[{codec}]", lambda i: event.dumps(codec), chunks=200, chunk_size=200))
+        results.append(
+            _time_calls(f"event_from_bytes[{codec}]", lambda i: Event.from_bytes(encoded), chunks=200, chunk_size=200)
+        )
+    return results
+
+
+# --- services ----------------------------------------------------------------
+
+
+def _market_event(symbol: str, bar_ms: int, close: float, rng: random.Random) -> Event:
+    spread = close * 0.002
+    candle = [bar_ms, close, close + spread * rng.random(), close - spread * rng.random(), close, 10.0]
+    return Event(
+        type="market_data",
+        payload={"exchange": EXCHANGE, "symbol": symbol, "timeframe": "1m", "data": [candle]},
+    )
+
+
+def _bar_bursts(bars: int, rng: random.Random) -> List[List[Event]]:
+    """One burst per bar: every symbol's candle, in random order."""
+    closes = np.full(SYMBOLS, 100.0)
+    walk = np.random.default_rng(7)
+    bursts = []
+    for bar in range(bars):
+        closes *= np.exp(walk.normal(0.0, 0.004, SYMBOLS))
+        bar_ms = FIRST_BAR_MS + bar * TIMEFRAME_MS
+        burst = [_market_event(_symbol(i), bar_ms, float(closes[i]), rng) for i in range(SYMBOLS)]
+        rng.shuffle(burst)
+        bursts.append(burst)
+    return bursts
+
+
+async def _strategy_market_events(workdir: str) -> List[Result]:
+    settings = _settings(workdir)
+    bus = EventBus(codec=settings.redis.codec, memory_maxlen=100_000)
+    service = StrategyService(settings, bus=bus)
+    await service.setup()
+    signal_stream = settings.redis.streams.signals
+    warmup = service._lookback + 1
+    bursts = _bar_bursts(warmup + 20, random.Random(3))
+    try:
+        for burst in bursts[:warmup]:
+            for event in burst:
+                await service._handle_market_event(event, signal_stream)
+        samples = []
+        for burst in bursts[warmup:]:
+            for event in burst:
+                started = time.perf_counter_ns()
+                await service._handle_market_event(event, signal_stream)
+                samples.append(time.perf_counter_ns() - started)
+    finally:
+        await bus.disconnect()
+    return [_result("strategy_market_events", samples)]
+
+
+def _seed_positions(settings: Settings) -> None:
+    create_schema(settings)
+    rng = np.random.default_rng(11)
+    entries = rng.uniform(10.0, 1_000.0, POSITIONS)
+    with session_scope(create_session_factory(settings)) as session:
+        session.add_all(
+            Position(
+                exchange=EXCHANGE,
+                symbol=_symbol(i % SYMBOLS),
+                strategy=f"strategy_{i // SYMBOLS}",
+                quantity=0.001 if i % 2 else -0.001,
+                entry_price=float(entries[i]),
+                stop_price=float(entries[i]) * (0.98 if i % 2 else 1.02),
+                reduce_only_stop_installed=True,
+            )
+            for i in range(POSITIONS)
+        )
+
+
+def _signal(i: int, rng: random.Random) -> Event:
+    price = rng.uniform(10.0, 1_000.0)
+    stop_distance = price * rng.uniform(0.005, 0.03)
+    return Event(
+        type="signal",
+        payload={
+            "strategy": "trend_following",
+            "exchange": EXCHANGE,
+            "symbol": _symbol(i % SYMBOLS),
+            "decision": "buy" if i % 3 else "sell",
+            "confidence": rng.uniform(0.5, 0.9),
+            "price": price,
+            "risk": {"stop_distance": stop_distance, "position_size": 20.0 / stop_distance},
+        },
+    )
+
+
+async def _risk_signals(workdir: str) -> List[Result]:
+    settings = _settings(workdir)
+    _seed_positions(settings)
+    bus = EventBus(codec=settings.redis.codec, memory_maxlen=100_000)
+    service = RiskService(settings, bus=bus)
+    await service.setup()
+    assert len(service.ledger) == POSITIONS
+    batch_size = settings.redis.consumer_groups.batch_size
+    rng = random.Random(5)
+    # Bursty arrival: mostly full consumer batches, some stragglers.
+    batches = [
+        [_signal(i * batch_size + j, rng) for j in range(batch_size if i % 4 else rng.randint(1, batch_size))]
+        for i in range(200)
+    ]
+    approved_stream = settings.redis.streams.approved_signals
+    samples, signals = [], 0
+    try:
+        for batch in batches:
+            started = time.perf_counter_ns()
+            await service._handle_signals(batch, approved_stream)
+            samples.append(time.perf_counter_ns() - started)
+            signals += len(batch)
+        checksums = []
+        for _ in range(10):
+            started = time.perf_counter_ns()
+            await asyncio.to_thread(database_checksum, service._session_factory)
+            checksums.append(time.perf_counter_ns() - started)
+        loads = []
+        for _ in range(5):
+            started = time.perf_counter_ns()
+            await asyncio.to_thread(RiskLedger.from_database, service._session_factory)
+            loads.append(time.perf_counter_ns() - started)
+    finally:
+        await bus.disconnect()
+    per_batch = _result("risk_signals", samples)
+    # Throughput in signals, latency per batch handled.
+    risk_signals = Result("risk_signals", signals, per_batch.seconds, per_batch.p50_us, per_batch.p99_us)
+    return [risk_signals, _result("risk_ledger_checksum", checksums), _result("risk_ledger_load", loads)]
+
+
+async def _execution_signals(workdir: str) -> List[Result]:
+    settings = _settings(workdir)
+    create_schema(settings)
+    bus = EventBus(codec=settings.redis.codec, memory_maxlen=100_000)
+    gateway = ExchangeGateway.from_settings(settings, clients={EXCHANGE: StubExchange(EXCHANGE)}, rate_limited=False)
+    service = ExecutionService(settings, bus=bus, gateway=gateway)
+    await service.setup()
+    rng = random.Random(9)
+    events = [
+        Event(type="approved_signal", payload={**_signal(i, rng).payload, "risk_approved": True})
+        for i in range(2_000)
+    ]
+    samples = []
+    try:
+        for event in events:
+            started = time.perf_counter_ns()
+            await service._handle_signal(event)
+            samples.append(time.perf_counter_ns() - started)
+    finally:
+        await service.teardown()
+        await gateway.close()
+        await bus.disconnect()
+    return [_result("execution_signals", samples)]
+
+
+def _run_async(case: Callable[[str], Awaitable[List[Result]]]) -> Callable[[str], List[Result]]:
+    return lambda workdir: asyncio.run(case(workdir))
+
+
+CASES: Dict[str, Callable[[str], List[Result]]] = {
+    "order_id": bench_order_id,
+    "position_size": bench_position_size,
+    "codecs": bench_codecs,
+    "strategy_market_events": _run_async(_strategy_market_events),
+    "risk_signals": _run_async(_risk_signals),
+    "execution_signals": _run_async(_execution_signals),
+}
+
+
+# --- baselines ---------------------------------------------------------------
+
+
+def _environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.machine(),
+        "system": platform.system(),
+        "numpy": np.__version__,
+    }
+
+
+def run_cases(names: Sequence[str], repeat: int) -> Dict[str, Result]:
+    """Run each case ``repeat`` times; keep the best throughput and the lowest p99 seen."""
+    best: Dict[str, Result] = {}
+    for name in names:
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory(prefix="trader-bench-") as workdir:
+                for result in CASES[name](workdir):
+                    previous = best.get(result.name)
+                    if previous is None:
+                        best[result.name] = result
+                        continue
+                    if result.throughput > previous.throughput:
+                        previous.ops, previous.seconds = result.ops, result.seconds
+                    previous.p50_us = min(previous.p50_us, result.p50_us)
+                    previous.p99_us = min(previous.p99_us, result.p99_us)
+    return best
+
+
+def compare(
+    results: Dict[str, Result],
+    baseline: Dict[str, Dict[str, float]],
+    *,
+    max_slowdown: float,
+    max_p99_increase: float,
+) -> List[str]:
+    """Print results next to the baseline and return the names of regressed cases."""
+    print(f"{'case':<26} {'ops/s':>12} {'vs base':>8} {'p50 us':>10} {'p99 us':>10} {'vs base':>8}")
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        throughput_delta = p99_delta = ""
+        failed = False
+        if base:
+            throughput_change = result.throughput / base["throughput"] - 1
+            p99_change = result.p99_us / base["p99_us"] - 1
+            throughput_delta, p99_delta = f"{throughput_change:+.0%}", f"{p99_change:+.0%}"
+            failed = throughput_change < -max_slowdown or p99_change > max_p99_increase
+        print(
+            f"{name:<26} {result.throughput:>12,.0f} {throughput_delta:>8} "
+            f"{result.p50_us:>10,.1f} {result.p99_us:>10,.1f} {p99_delta:>8}{'  REGRESSED' if failed else ''}"
+        )
+        if failed:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", action="append", choices=sorted(CASES), help="Run only these cases.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the best is kept.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--max-slowdown", type=float, default=0.25, help="Tolerated throughput drop (0.25 = 25%%).")
+    parser.add_argument("--max-p99-increase", type=float, default=0.5, help="Tolerated p99 growth (0.5 = 50%%).")
+    args = parser.parse_args()
+
+    configure_logging(level="CRITICAL")
+    results = run_cases(args.only or list(CASES), args.repeat)
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {"results": {}}
+    if stored.get("environment") and stored["environment"] != _environment():
+        print(f"note: baseline was recorded on {stored['environment']}, comparisons may not be meaningful")
+    regressions = compare(
+        results,
+        stored["results"],
+        max_slowdown=args.max_slowdown,
+        max_p99_increase=args.max_p99_increase,
+    )
+
+    if args.save_baseline:
+        stored["environment"] = _environment()
+        stored["results"].update(
+            {
+                name: {"throughput": result.throughput, **{k: v for k, v in asdict(result).items() if k.endswith("_us")}}
+                for name, result in results.items()
+            }
+        )
+        args.baseline.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print(f"regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
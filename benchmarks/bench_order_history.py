@@ -0,0 +1,226 @@
+"""Order and position query latency over a large order history.
+
+Usage::
+
+    PYTHONPATH=src python benchmarks/bench_order_history.py                   # 10M orders, throwaway SQLite
+    PYTHONPATH=src python benchmarks/bench_order_history.py --orders 1000000
+    PYTHONPATH=src python benchmarks/bench_order_history.py --database-url postgresql://localhost/trader_bench
+
+Seeds a year of orders over 500 symbols (a small recent slice still open)
+and a position history with 1% open positions. It then times the lookups
+the services make in three states: without the secondary indexes, with
+them, and after older settled orders were moved to ``orders_archive``.
+Point ``--database-url`` at a scratch database; its trader tables are
+dropped first.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session, sessionmaker
+
+from trader.archive import archive_orders
+from trader.config import Settings, get_settings
+from trader.db import Base, create_schema, create_session_factory
+from trader.logging import configure_logging
+from trader.models import OPEN_ORDER_STATUSES, Order, OrderSide, OrderStatus, OrderType, Position
+from trader.utils import utc_now
+
+
+SYMBOLS = 500
+EXCHANGE = "binance"
+HISTORY_DAYS = 365
+ARCHIVE_AFTER_DAYS = 30
+CHUNK = 20_000
+
+
+def _settings(url: str) -> Settings:
+    settings = get_settings().model_copy(deep=True)
+    settings.database.engine = "postgresql" if url.startswith("postgresql") else "sqlite"
+    settings.database.url = url
+    return settings
+
+
+def _symbol(i: int) -> str:
+    return f"SYM{i:03d}/USDT"
+
+
+def _seed(factory: sessionmaker[Session], orders: int, positions: int) -> None:
+    now = utc_now()
+    rng = np.random.default_rng(17)
+    started = time.perf_counter()
+    for offset in range(0, orders, CHUNK):
+        count = min(CHUNK, orders - offset)
+        ages = rng.uniform(0, HISTORY_DAYS * 86_400, count)
+        symbols = rng.integers(0, SYMBOLS, count)
+        rows = []
+        for j in range(count):
+            i = offset + j
+            age = float(ages[j])
+            if age < 3_600 and j % 10 == 0:
+                status = OPEN_ORDER_STATUSES[j % len(OPEN_ORDER_STATUSES)]
+            else:
+                status = OrderStatus.FILLED if j % 7 else OrderStatus.CANCELED
+            created = now - timedelta(seconds=age)
+            rows.append(
+                {
+                    "id": uuid.uuid4(),
+                    "client_order_id": f"bench{i:012d}",
+                    "external_order_id": str(i),
+                    "strategy": "trend_following",
+                    "symbol": _symbol(int(symbols[j])),
+                    "exchange": EXCHANGE,
+                    "side": OrderSide.BUY if j % 2 else OrderSide.SELL,
+                    "type": OrderType.LIMIT,
+                    "status": status,
+                    "quantity": 1.0,
+                    "filled_quantity": 1.0 if status == OrderStatus.FILLED else 0.0,
+                    "price": 100.0,
+                    "reduce_only": False,
+                    "created_at": created,
+                    "updated_at": created,
+                }
+            )
+        with factory.begin() as session:
+            session.execute(insert(Order), rows)
+        if offset // CHUNK % 50 == 0:
+            print(f"  seeded {offset + count:,} orders ({time.perf_counter() - started:,.0f}s)")
+    strategies = max(1, positions // SYMBOLS)
+    with factory.begin() as session:
+        session.execute(
+            insert(Position),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "exchange": EXCHANGE,
+                    "symbol": _symbol(i % SYMBOLS),
+                    "strategy": f"strategy_{i // SYMBOLS % strategies}",
+                    "quantity": 1.0,
+                    "entry_price": 100.0,
+                    "stop_price": 95.0,
+                    "reduce_only_stop_installed": True,
+                    # 1% of the history is still open.
+                    "closed_at": None if i >= positions - positions // 100 else now,
+                }
+                for i in range(positions)
+            ],
+        )
+
+
+def _queries(orders: int, positions: int) -> Dict[str, Callable[[random.Random], Any]]:
+    client_order_ids = [f"bench{i:012d}" for i in range(0, orders, max(1, orders // 10_000))]
+    strategies = max(1, positions // SYMBOLS)
+
+    def random_symbol(rng: random.Random) -> str:
+        return _symbol(rng.randrange(SYMBOLS))
+
+    return {
+        "order_by_client_order_id": lambda rng: select(Order).where(
+            Order.client_order_id == rng.choice(client_order_ids)
+        ),
+        "last_day_orders_for_symbol": lambda rng: select(Order)
+        .where(
+            Order.exchange == EXCHANGE,
+            Order.symbol == random_symbol(rng),
+            Order.created_at >= utc_now() - timedelta(days=1),
+        )
+        .order_by(Order.created_at.desc())
+        .limit(100),
+        "open_positions": lambda rng: select(Position).where(Position.closed_at.is_(None)),
+        "open_position_by_key": lambda rng: select(Position.id).where(
+            tuple_(Position.exchange, Position.symbol, Position.strategy).in_(
+                [(EXCHANGE, random_symbol(rng), f"strategy_{rng.randrange(strategies)}")]
+            ),
+            Position.closed_at.is_(None),
+        ),
+    }
+
+
+def _measure(
+    factory: sessionmaker[Session],
+    queries: Dict[str, Callable[[random.Random], Any]],
+    repeat: int,
+) -> Dict[str, List[float]]:
+    rng = random.Random(23)
+    timings: Dict[str, List[float]] = {}
+    with factory() as session:
+        for name, build in queries.items():
+            session.execute(build(rng)).all()  # warm the cache and the statement
+            samples = []
+            for _ in range(repeat):
+                statement = build(rng)
+                started = time.perf_counter()
+                session.execute(statement).all()
+                samples.append((time.perf_counter() - started) * 1_000)
+            timings[name] = samples
+    return timings
+
+
+def _drop_secondary_indexes(factory: sessionmaker[Session]) -> None:
+    with factory.begin() as session:
+        for table in (Order.__table__, Position.__table__):
+            for index in table.indexes:
+                index.drop(session.connection(), checkfirst=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=10_000_000)
+    parser.add_argument("--positions", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200, help="Executions of each query per state.")
+    parser.add_argument(
+        "--database-url", default=None, help="Scratch database (default: a temporary SQLite file)."
+    )
+    args = parser.parse_args()
+
+    configure_logging(level="WARNING")
+
+    with tempfile.TemporaryDirectory(prefix="trader-bench-") as workdir:
+        settings = _settings(args.database_url or f"sqlite:///{Path(workdir) / 'orders.db'}")
+        create_schema(settings)
+        factory = create_session_factory(settings)
+        with factory.begin() as session:
+            Base.metadata.drop_all(session.connection())
+        create_schema(settings)
+        _drop_secondary_indexes(factory)  # seed as fast as possible, then index once
+
+        print(f"seeding {args.orders:,} orders and {args.positions:,} positions")
+        _seed(factory, args.orders, args.positions)
+        queries = _queries(args.orders, args.positions)
+
+        results = {"no indexes": _measure(factory, queries, args.queries)}
+        started = time.perf_counter()
+        create_schema(settings)
+        print(f"indexes built in {time.perf_counter() - started:,.1f}s")
+        results["indexed"] = _measure(factory, queries, args.queries)
+        started = time.perf_counter()
+        moved = archive_orders(
+            factory,
+            before=utc_now() - timedelta(days=ARCHIVE_AFTER_DAYS),
+            batch_size=settings.database.archive_batch_size,
+        )
+        print(f"archived {moved:,} orders in {time.perf_counter() - started:,.1f}s")
+        results["indexed + archived"] = _measure(factory, queries, args.queries)
+        factory.kw["bind"].dispose()
+
+    states = list(results)
+    print(f"\n{'query (ms, p50 / p99)':<28}" + "".join(f"{state:>24}" for state in states))
+    for name in queries:
+        cells = []
+        for state in states:
+            samples = results[state][name]
+            cells.append(f"{np.percentile(samples, 50):>11,.2f} / {np.percentile(samples, 99):>9,.2f}")
+        print(f"{name:<28}" + "".join(f"{cell:>24}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
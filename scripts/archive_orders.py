@@ -0,0 +1,39 @@
+import argparse
+from datetime import timedelta
+
+from trader.archive import archive_orders
+from trader.config import get_settings
+from trader.db import create_session_factory
+from trader.logging import configure_logging
+from trader.utils import utc_now
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Move filled, canceled and rejected orders older than the cutoff to orders_archive."
+    )
+    parser.add_argument(
+        "--older-than-days",
+        type=int,
+        default=None,
+        help="Cutoff age in days (default: database.archive_orders_after_days).",
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        help="Logging level (default: INFO).",
+    )
+    args = parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    settings = get_settings()
+    days = args.older_than_days if args.older_than_days is not None else settings.database.archive_orders_after_days
+    archive_orders(
+        create_session_factory(settings),
+        before=utc_now() - timedelta(days=days),
+        batch_size=settings.database.archive_batch_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
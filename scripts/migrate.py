@@ -0,0 +1,26 @@
+import argparse
+
+from trader.config import get_settings
+from trader.db import create_schema
+from trader.logging import configure_logging, get_logger
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Create the database schema. Run after installing or upgrading, before starting services."
+    )
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        help="Logging level (default: INFO).",
+    )
+    args = parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    settings = get_settings()
+    create_schema(settings)
+    get_logger("migrate").info("database.migrated", engine=settings.database.engine)
+
+
+if __name__ == "__main__":
+    main()
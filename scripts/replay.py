@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+
+from trader.config import get_settings
+from trader.events import EventBus
+from trader.logging import configure_logging, get_logger
+from trader.replay import ReplayHarness, load_ohlcv, read_events, record_market_data
+
+
+async def _record(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    bus = EventBus(args.redis_url or settings.redis.url, codec=settings.redis.codec)
+    await bus.connect()
+    try:
+        await record_market_data(
+            bus,
+            settings.redis.streams.market_data,
+            args.output,
+            count=args.count,
+            duration=args.duration,
+            from_start=args.from_start,
+        )
+    finally:
+        await bus.disconnect()
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.events:
+        events = read_events(args.events)
+    else:
+        events = load_ohlcv(args.ohlcv, exchange=args.exchange, symbol=args.symbol, timeframe=args.timeframe)
+    harness = ReplayHarness(
+        get_settings(),
+        speed=args.speed,
+        exchange_latency_ms=args.exchange_latency_ms,
+    )
+    for _ in range(args.repeat):
+        report = await harness.run(events)
+        print(json.dumps(report.as_dict()) if args.json else report.format())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record and replay market data through the trader pipeline.")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level (default: WARNING).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Record the market data stream from Redis to a file.")
+    record.add_argument("output", help="Destination JSON-lines file.")
+    record.add_argument("--redis-url", help="Redis URL (default: redis.url from the config).")
+    record.add_argument("--count", type=int, help="Stop after this many events.")
+    record.add_argument("--duration", type=float, help="Stop after this many seconds.")
+    record.add_argument("--from-start", action="store_true", help="Include events already in the stream.")
+
+    run = commands.add_parser("run", help="Replay recorded events or an OHLCV file offline.")
+    source = run.add_mutually_exclusive_group(required=True)
+    source.add_argument("--events", help="JSON-lines file written by 'record'.")
+    source.add_argument("--ohlcv", help="CSV or JSON OHLCV file, one candle per row.")
+    run.add_argument("--exchange", default="binance", help="Exchange name for --ohlcv candles.")
+    run.add_argument("--symbol", default="BTC/USDT", help="Symbol for --ohlcv candles.")
+    run.add_argument("--timeframe", default="1m", help="Timeframe for --ohlcv candles.")
+    run.add_argument("--speed", type=float, help="Replay at this multiple of real time (default: as fast as possible).")
+    run.add_argument("--exchange-latency-ms", type=float, default=0.0, help="Simulated order round trip.")
+    run.add_argument("--repeat", type=int, default=1, help="Number of runs over the same input.")
+    run.add_argument("--json", action="store_true", help="Print each report as JSON.")
+    args = parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    logger = get_logger("replay")
+    try:
+        asyncio.run(_record(args) if args.command == "record" else _run(args))
+    except KeyboardInterrupt:
+        logger.info("replay.stopped_by_user", command=args.command)
+
+
+if __name__ == "__main__":
+    main()
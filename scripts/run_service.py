@@ -1,41 +1,80 @@
 import argparse
 import asyncio
+import importlib
+import time
 from typing import Dict, Type
 
 from trader.config import get_settings
 from trader.logging import configure_logging, get_logger
 from trader.services.base import BaseService
-from trader.services.data_service import DataService
-from trader.services.strategy_service import StrategyService
-from trader.services.risk_service import RiskService
-from trader.services.execution_service import ExecutionService
-from trader.services.reconciliation_service import ReconciliationService
-from trader.services.monitor_service import MonitorService
-
-
-SERVICE_REGISTRY: Dict[str, Type[BaseService]] = {
-    "data": DataService,
-    "strategy": StrategyService,
-    "risk": RiskService,
-    "execution": ExecutionService,
-    "reconciliation": ReconciliationService,
-    "monitor": MonitorService,
+
+
+#: Service name -> ``module:class``. A service module, and with it heavy
+#: dependencies such as ccxt or FastAPI, is only imported when launched.
+SERVICE_REGISTRY: Dict[str, str] = {
+    "data": "trader.services.data_service:DataService",
+    "strategy": "trader.services.strategy_service:StrategyService",
+    "risk": "trader.services.risk_service:RiskService",
+    "execution": "trader.services.execution_service:ExecutionService",
+    "reconciliation": "trader.services.reconciliation_service:ReconciliationService",
+    "monitor": "trader.services.monitor_service:MonitorService",
 }
 
+#: Services that talk to exchanges and accept a shared ``gateway``.
+EXCHANGE_SERVICES = frozenset({"data", "execution", "reconciliation"})
+
+
+def load_service(service_name: str) -> Type[BaseService]:
+    module_name, _, class_name = SERVICE_REGISTRY[service_name].partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
 
-async def _run_service(service_name: str) -> None:
+async def _run_service(service_name: str, launched_at: float) -> None:
     settings = get_settings()
-    service_cls = SERVICE_REGISTRY[service_name]
+    importing = time.perf_counter()
+    service_cls = load_service(service_name)
+    imported = time.perf_counter() - importing
     service = service_cls(settings)
+    service.launched_at = launched_at
+    service.startup_phases["import"] = imported
     await service.start()
 
 
+async def _run_all_services(launched_at: float) -> None:
+    """Run every service in this event loop over one shared in-process bus and exchange gateway."""
+    from trader.events import EventBus
+    from trader.gateway import ExchangeGateway
+
+    settings = get_settings()
+    bus = EventBus(codec=settings.redis.codec)
+    await bus.connect()
+    gateway = ExchangeGateway.from_settings(settings)
+    importing = time.perf_counter()
+    service_classes = {name: load_service(name) for name in SERVICE_REGISTRY}
+    imported = time.perf_counter() - importing
+    services = [
+        service_cls(settings, bus=bus, gateway=gateway)
+        if name in EXCHANGE_SERVICES
+        else service_cls(settings, bus=bus)
+        for name, service_cls in service_classes.items()
+    ]
+    for service in services:
+        service.launched_at = launched_at
+        service.startup_phases["import"] = imported
+    try:
+        await asyncio.gather(*(service.start() for service in services))
+    finally:
+        await gateway.close()
+        await bus.disconnect()
+
+
 def main() -> None:
+    launched_at = time.perf_counter()
     parser = argparse.ArgumentParser(description="Run a trader service.")
     parser.add_argument(
         "service",
-        choices=sorted(SERVICE_REGISTRY.keys()),
-        help="Service to launch.",
+        choices=sorted(SERVICE_REGISTRY.keys()) + ["all"],
+        help="Service to launch, or 'all' to run every service in one process.",
     )
     parser.add_argument(
         "--log-level",
@@ -49,7 +88,10 @@ def main() -> None:
     logger.info("service.starting", service=args.service)
 
     try:
-        asyncio.run(_run_service(args.service))
+        if args.service == "all":
+            asyncio.run(_run_all_services(launched_at))
+        else:
+            asyncio.run(_run_service(args.service, launched_at))
     except KeyboardInterrupt:
         logger.info("service.stopped_by_user", service=args.service)
 
@@ -0,0 +1,78 @@
+"""Moves settled order history out of the hot ``orders`` table.
+
+Orders in a terminal status that are older than a cutoff are copied to
+:data:`~trader.models.orders_archive` and deleted from ``orders`` in
+batches, one transaction per batch, so the table the services write and
+look up stays the size of recent activity. On PostgreSQL the archive is
+partitioned by month of ``created_at``; the partitions a run needs are
+created first, and an old month can later be detached or dropped whole.
+Run it periodically with ``scripts/archive_orders.py``.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Iterator, Tuple
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from .db import session_scope
+from .logging import get_logger
+from .models import TERMINAL_ORDER_STATUSES, Order, orders_archive
+
+
+logger = get_logger(__name__)
+
+
+def archive_orders(
+    session_factory: sessionmaker[Session],
+    *,
+    before: datetime,
+    batch_size: int = 5_000,
+) -> int:
+    """Move terminal orders created before ``before`` to the archive; returns how many moved."""
+    archivable = (Order.created_at < before, Order.status.in_(TERMINAL_ORDER_STATUSES))
+    columns = [column.name for column in Order.__table__.columns]
+    moved = 0
+    with session_scope(session_factory) as session:
+        if session.get_bind().dialect.name == "postgresql":
+            oldest = session.scalar(select(func.min(Order.created_at)).where(*archivable))
+            if oldest is not None:
+                for start, end in _months(oldest, before):
+                    _create_partition(session, start, end)
+    while True:
+        with session_scope(session_factory) as session:
+            ids = session.scalars(select(Order.id).where(*archivable).limit(batch_size)).all()
+            if not ids:
+                break
+            session.execute(
+                insert(orders_archive).from_select(
+                    columns,
+                    select(*(Order.__table__.c[name] for name in columns)).where(Order.id.in_(ids)),
+                )
+            )
+            session.execute(delete(Order).where(Order.id.in_(ids)))
+        moved += len(ids)
+        logger.debug("archive.batch_moved", orders=len(ids), total=moved)
+    logger.info("archive.orders_moved", orders=moved, before=before.isoformat())
+    return moved
+
+
+def _months(first: datetime, last: datetime) -> Iterator[Tuple[datetime, datetime]]:
+    """Calendar months (UTC) from the one holding ``first`` through the one holding ``last``."""
+    first = first if first.tzinfo else first.replace(tzinfo=timezone.utc)
+    start = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    while start <= last:
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+        yield start, end
+        start = end
+
+
+def _create_partition(session: Session, start: datetime, end: datetime) -> None:
+    name = f"{orders_archive.name}_{start:%Y_%m}"
+    session.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {orders_archive.name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
@@ -0,0 +1,139 @@
+"""Append-only on-disk candle store, one memory-mappable file per series.
+
+Each ``(exchange, symbol, timeframe)`` series lives in
+``<root>/<exchange>/<symbol>/<timeframe>.ohlcv`` as packed little-endian
+records of :data:`CANDLE_DTYPE`, oldest first. New candles are appended; a
+candle with the same timestamp as the last record replaces it in place
+(the forming candle is reported repeatedly), and older candles are ignored.
+Readers map the file with :func:`numpy.memmap`, so loading the tail of a
+series costs one page-in instead of a parse.
+"""
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+CANDLE_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+
+SeriesKey = Tuple[str, str, str]
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class CandleSeries:
+    """One append-only candle file."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._last_timestamp: Optional[int] = None
+        self._length = 0
+        if path.exists():
+            self._length = path.stat().st_size // CANDLE_DTYPE.itemsize
+            if self._length:
+                self._last_timestamp = int(self.read(1)["timestamp"][0])
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return self._last_timestamp
+
+    def append(self, candles: Sequence[Sequence[float]]) -> int:
+        """Write ``[timestamp, open, high, low, close, volume]`` candles; returns records written."""
+        last = self._last_timestamp
+        revise = False
+        rows = []
+        for candle in candles:
+            timestamp = int(candle[0])
+            if last is not None and timestamp < last:
+                continue
+            if last is not None and timestamp == last:
+                if rows:
+                    rows[-1] = candle
+                else:
+                    revise = True
+                    rows.append(candle)
+                continue
+            rows.append(candle)
+            last = timestamp
+        if not rows:
+            return 0
+
+        records = np.empty(len(rows), dtype=CANDLE_DTYPE)
+        for index, candle in enumerate(rows):
+            records[index] = tuple(candle[:6])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "r+b" if self.path.exists() else "wb") as handle:
+            # Drop a torn record left by an interrupted write before appending.
+            offset = self._length * CANDLE_DTYPE.itemsize
+            if revise:
+                offset -= CANDLE_DTYPE.itemsize
+            handle.seek(offset)
+            handle.write(records.tobytes())
+            handle.truncate()
+        self._length = offset // CANDLE_DTYPE.itemsize + len(records)
+        self._last_timestamp = last
+        return len(records)
+
+    def read(self, limit: Optional[int] = None) -> np.ndarray:
+        """The last ``limit`` records (all by default), memory-mapped read-only."""
+        if not self.path.exists():
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        length = self.path.stat().st_size // CANDLE_DTYPE.itemsize
+        if not length:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        records = np.memmap(self.path, dtype=CANDLE_DTYPE, mode="r", shape=(length,))
+        return records if limit is None else records[max(0, length - limit) :]
+
+
+class CandleStore:
+    """Candle series under one root directory, keyed by exchange/symbol/timeframe."""
+
+    def __init__(self, root: str | os.PathLike[str]):
+        self.root = Path(root)
+        self._series: Dict[SeriesKey, CandleSeries] = {}
+
+    def series(self, exchange: str, symbol: str, timeframe: str) -> CandleSeries:
+        key = (exchange, symbol, timeframe)
+        series = self._series.get(key)
+        if series is None:
+            path = self.root / _safe(exchange) / _safe(symbol) / f"{_safe(timeframe)}.ohlcv"
+            series = self._series[key] = CandleSeries(path)
+        return series
+
+    def append(self, exchange: str, symbol: str, timeframe: str, candles: Sequence[Sequence[float]]) -> int:
+        return self.series(exchange, symbol, timeframe).append(candles)
+
+    def read(self, exchange: str, symbol: str, timeframe: str, limit: Optional[int] = None) -> np.ndarray:
+        return self.series(exchange, symbol, timeframe).read(limit)
+
+    def last_timestamp(self, exchange: str, symbol: str, timeframe: str) -> Optional[int]:
+        return self.series(exchange, symbol, timeframe).last_timestamp
+
+
+def _safe(part: str) -> str:
+    """Filesystem-safe path component: ``BTC/USDT:USDT`` -> ``BTC_USDT_USDT``."""
+    return _UNSAFE.sub("_", part)
+
+
+def as_candles(records: np.ndarray) -> np.ndarray:
+    """Structured records as a plain ``(n, 6)`` float array."""
+    candles = np.empty((len(records), 6))
+    for column, name in enumerate(CANDLE_DTYPE.names):
+        candles[:, column] = records[name]
+    return candles
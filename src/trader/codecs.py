@@ -0,0 +1,131 @@
+"""Wire codecs for :class:`trader.events.Event`.
+
+The first byte of an encoded event identifies its codec. JSON documents always
+start with ``{``, so JSON-encoded events carry no extra prefix and stay
+readable by consumers that predate the codec layer. Binary codecs prepend a
+single version byte.
+"""
+from __future__ import annotations
+
+import abc
+import json
+import struct
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, Optional, Tuple
+
+import msgpack
+
+
+JSON_VERSION = ord("{")
+MSGPACK_VERSION = 0x02
+
+# msgpack extension type for a packed OHLCV matrix: uint32 row count followed
+# by rows of (int64 timestamp ms, float64 open, high, low, close, volume).
+_OHLCV_EXT = 1
+_OHLCV_ROW = struct.Struct("<q5d")
+_ROW_COUNT = struct.Struct("<I")
+
+
+Trace = Dict[str, int]
+Decoded = Tuple[str, Dict[str, Any], Trace]
+
+
+class EventCodec(abc.ABC):
+    """Encodes an event's type, payload and trace stamps to bytes and back."""
+
+    name: str
+    version: int
+
+    @abc.abstractmethod
+    def encode(self, event_type: str, payload: Dict[str, Any], trace: Optional[Trace] = None) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def decode(self, data: bytes) -> Decoded:
+        ...
+
+
+class JsonCodec(EventCodec):
+    name = "json"
+    version = JSON_VERSION
+
+    def encode(self, event_type: str, payload: Dict[str, Any], trace: Optional[Trace] = None) -> bytes:
+        document: Dict[str, Any] = {"type": event_type, "payload": payload}
+        if trace:
+            document["trace"] = trace
+        return json.dumps(document, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, data: bytes) -> Decoded:
+        raw = json.loads(data)
+        return raw["type"], raw["payload"], raw.get("trace") or {}
+
+
+class MsgpackCodec(EventCodec):
+    """msgpack body with OHLCV list-of-lists packed as a fixed struct layout."""
+
+    name = "msgpack"
+    version = MSGPACK_VERSION
+
+    def encode(self, event_type: str, payload: Dict[str, Any], trace: Optional[Trace] = None) -> bytes:
+        packed = {key: _pack_ohlcv(value) for key, value in payload.items()}
+        return bytes((self.version,)) + msgpack.packb((event_type, packed, trace or {}), use_bin_type=True)
+
+    def decode(self, data: bytes) -> Decoded:
+        body = msgpack.unpackb(
+            memoryview(data)[1:],
+            raw=False,
+            ext_hook=_unpack_ext,
+            strict_map_key=False,
+        )
+        # Bodies written before trace stamps existed are (type, payload).
+        trace = body[2] if len(body) > 2 else {}
+        return body[0], body[1], trace
+
+
+def _pack_ohlcv(value: Any) -> Any:
+    if not isinstance(value, list) or not value:
+        return value
+    if not all(isinstance(row, (list, tuple)) and len(row) == 6 for row in value):
+        return value
+    try:
+        packed = _ohlcv_struct(len(value)).pack(len(value), *chain.from_iterable(value))
+    except struct.error:
+        # Missing values (ccxt reports None volume on some venues) or
+        # fractional timestamps: leave the rows as plain msgpack arrays.
+        return value
+    return msgpack.ExtType(_OHLCV_EXT, packed)
+
+
+@lru_cache(maxsize=64)
+def _ohlcv_struct(rows: int) -> struct.Struct:
+    return struct.Struct("<I" + "q5d" * rows)
+
+
+def _unpack_ext(code: int, data: bytes) -> Any:
+    if code != _OHLCV_EXT:
+        return msgpack.ExtType(code, data)
+    (count,) = _ROW_COUNT.unpack_from(data, 0)
+    body = memoryview(data)[_ROW_COUNT.size:_ROW_COUNT.size + count * _OHLCV_ROW.size]
+    return [list(row) for row in _OHLCV_ROW.iter_unpack(body)]
+
+
+CODECS: Dict[str, EventCodec] = {codec.name: codec for codec in (JsonCodec(), MsgpackCodec())}
+_BY_VERSION: Dict[int, EventCodec] = {codec.version: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str) -> EventCodec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown event codec {name!r}; expected one of {sorted(CODECS)}") from None
+
+
+def decode(data: bytes) -> Decoded:
+    """Decode bytes produced by any registered codec."""
+    if not data:
+        raise ValueError("Cannot decode an empty event.")
+    codec = _BY_VERSION.get(data[0])
+    if codec is None:
+        raise ValueError(f"Unknown event codec version byte 0x{data[0]:02x}")
+    return codec.decode(data)
@@ -19,6 +19,28 @@ class RedisStreamsConfig(BaseModel):
     orders: str
     executions: str
     reconciliations: str
+    #: Per-candle ingest lag published by DataService for MonitorService.
+    ingest: str = "trader.ingest"
+
+
+class ConsumerGroupConfig(BaseModel):
+    enabled: bool = False
+    consumer_name: str | None = None
+    batch_size: int = Field(default=64, ge=1)
+    block_ms: int = Field(default=1_000, ge=0)
+    reclaim_idle_ms: int = Field(default=60_000, ge=0)
+    reclaim_interval_seconds: float = 30.0
+
+
+class BackpressureConfig(BaseModel):
+    #: Approximate ``MAXLEN`` on every ``XADD``. Off by default: trimming can drop
+    #: entries a lagging consumer group has not acknowledged yet, which the
+    #: ledger check and reconciliation would then never see.
+    stream_maxlen: int | None = Field(default=None, ge=1)
+    coalesce_lag_ms: int = Field(default=0, ge=0)
+    coalesce_batch_size: int = Field(default=1_000, ge=1)
+    producer_max_lag: int = Field(default=0, ge=0)
+    producer_max_wait_ms: int = Field(default=1_000, ge=0)
 
 
 class RedisConfig(BaseModel):
@@ -26,6 +48,9 @@ class RedisConfig(BaseModel):
     url: str = "redis://localhost:6379/0"
     client_name: str = "trader-bot"
     streams: RedisStreamsConfig
+    codec: str = Field(default="json", pattern=r"^(json|msgpack)$")
+    consumer_groups: ConsumerGroupConfig = Field(default_factory=ConsumerGroupConfig)
+    backpressure: BackpressureConfig = Field(default_factory=BackpressureConfig)
 
 
 class DatabaseConfig(BaseModel):
@@ -34,6 +59,13 @@ class DatabaseConfig(BaseModel):
     echo: bool = False
     pool_size: int = 5
     connect_args: Dict[str, Any] = Field(default_factory=dict)
+    write_batch_size: int = Field(default=500, ge=1)
+    write_max_latency_ms: int = Field(default=50, ge=0)
+    write_max_attempts: int = Field(default=5, ge=1)
+    write_close_timeout_seconds: float = Field(default=30.0, gt=0)
+    write_journal_path: str | None = "./data/write_behind.journal"
+    archive_orders_after_days: int = Field(default=30, ge=1)
+    archive_batch_size: int = Field(default=5_000, ge=1)
 
 
 class StrategyConfig(BaseModel):
@@ -43,10 +75,16 @@ class StrategyConfig(BaseModel):
     parameters: Dict[str, Any] = Field(default_factory=dict)
 
 
+class StrategyEngineConfig(BaseModel):
+    bar_close_grace_seconds: float = Field(default=5.0, gt=0)
+
+
 class RiskConfig(BaseModel):
     max_risk_per_trade: float = 0.02
     max_portfolio_heat: float = 0.06
     max_leverage: float = 1.5
+    ledger_checksum_interval_seconds: float = 60.0
+    ledger_rebuild_after_mismatches: int = Field(default=2, ge=1)
     volatility_targeting: Dict[str, Any] = Field(default_factory=dict)
     circuit_breakers: Dict[str, Any] = Field(default_factory=dict)
 
@@ -61,6 +99,32 @@ class ReconciliationConfig(BaseModel):
     enabled: bool = True
     interval_seconds: int = 30
     auto_repair: bool = True
+    max_requests_per_venue: int = Field(default=10, ge=2)
+
+
+class CandleStoreConfig(BaseModel):
+    enabled: bool = True
+    path: str = "./data/candles"
+    warmup_candles: int = Field(default=500, ge=1)
+    backfill_page_size: int = Field(default=500, ge=1)
+
+
+class ShardingConfig(BaseModel):
+    enabled: bool = False
+    partitions: int = Field(default=64, ge=1)
+    virtual_nodes: int = Field(default=64, ge=1)
+    heartbeat_interval_seconds: float = Field(default=5.0, gt=0)
+    member_ttl_seconds: float = Field(default=15.0, gt=0)
+
+
+class GatewayConfig(BaseModel):
+    pool_size: int = Field(default=100, ge=1)
+    keepalive_seconds: float = Field(default=30.0, gt=0)
+
+
+class ExecutionConfig(BaseModel):
+    order_updates: str = Field(default="auto", pattern=r"^(auto|stream|poll)$")
+    order_poll_interval_seconds: float = Field(default=2.0, gt=0)
 
 
 class AppConfig(BaseModel):
@@ -76,8 +140,13 @@ class Settings(BaseModel):
     redis: RedisConfig
     risk: RiskConfig
     strategies: list[StrategyConfig]
+    strategy_engine: StrategyEngineConfig = Field(default_factory=StrategyEngineConfig)
     monitoring: MonitoringConfig
     reconciliation: ReconciliationConfig
+    candle_store: CandleStoreConfig = Field(default_factory=CandleStoreConfig)
+    sharding: ShardingConfig = Field(default_factory=ShardingConfig)
+    gateway: GatewayConfig = Field(default_factory=GatewayConfig)
+    execution: ExecutionConfig = Field(default_factory=ExecutionConfig)
     exchanges: list[Dict[str, Any]] = Field(default_factory=list)
     backtesting: Dict[str, Any] = Field(default_factory=dict)
 
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from contextlib import contextmanager
-from typing import Iterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from .config import Settings
@@ -23,12 +25,69 @@ def create_engine_from_settings(settings: Settings):
     )
 
 
+#: Indexes earlier schema versions created that no query reads any more.
+OBSOLETE_INDEXES = ("ix_orders_exchange_external_order_id", "ix_orders_open")
+
+
+def create_schema(settings: Settings) -> None:
+    """Create any missing tables and indexes and drop :data:`OBSOLETE_INDEXES`.
+
+    This is the explicit migration step (``scripts/migrate.py``); session
+    factories do not touch the schema, so services start without a DDL
+    round trip. Indexes added to an existing table are created too, which
+    locks writes to it while they build.
+    """
+    from . import models  # noqa: F401  (registers every table on Base.metadata)
+
+    engine = create_engine_from_settings(settings)
+    try:
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            # create_all skips existing tables together with their indexes.
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+            for name in OBSOLETE_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    finally:
+        engine.dispose()
+
+
 def create_session_factory(settings: Settings) -> sessionmaker[Session]:
     engine = create_engine_from_settings(settings)
-    Base.metadata.create_all(engine)
     return sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+psycopg"}
+
+
+def async_database_url(url: str) -> str:
+    """Swap a synchronous database URL's driver for its asyncio counterpart."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for database backend {backend!r}")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def create_async_engine_from_settings(settings: Settings) -> AsyncEngine:
+    connect_args = dict(settings.database.connect_args or {})
+    kwargs = {}
+    if settings.database.engine != "sqlite":
+        kwargs["pool_size"] = settings.database.pool_size
+    return create_async_engine(
+        async_database_url(settings.database.url),
+        echo=settings.database.echo,
+        connect_args=connect_args,
+        **kwargs,
+    )
+
+
+def create_async_session_factory(settings: Settings) -> async_sessionmaker[AsyncSession]:
+    engine = create_async_engine_from_settings(settings)
+    return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
 @contextmanager
 def session_scope(factory: sessionmaker[Session]) -> Iterator[Session]:
     session = factory()
@@ -40,3 +99,16 @@ def session_scope(factory: sessionmaker[Session]) -> Iterator[Session]:
         raise
     finally:
         session.close()
+
+
+@asynccontextmanager
+async def async_session_scope(factory: async_sessionmaker[AsyncSession]) -> AsyncIterator[AsyncSession]:
+    session = factory()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from dataclasses import dataclass, asdict
-from typing import Any, Dict, Optional
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
 
 import redis.asyncio as redis
+from redis.exceptions import ResponseError
 
+from . import codecs
 from .logging import get_logger
 
 
@@ -17,66 +19,582 @@ logger = get_logger(__name__)
 class Event:
     type: str
     payload: Dict[str, Any]
+    #: Pipeline stage -> wall-clock ``time.time_ns()`` when the event passed it.
+    #: Wall time rather than monotonic time because stages run in different
+    #: processes; hosts are expected to be NTP synchronised.
+    trace: Dict[str, int] = field(default_factory=dict)
 
-    def dumps(self) -> bytes:
-        return json.dumps({"type": self.type, "payload": self.payload}).encode("utf-8")
+    def stamp(self, stage: str) -> "Event":
+        self.trace[stage] = time.time_ns()
+        return self
+
+    def derive(self, type: str, payload: Dict[str, Any]) -> "Event":
+        """New event that carries this event's trace forward."""
+        return Event(type=type, payload=payload, trace=dict(self.trace))
+
+    @property
+    def stamped_ns(self) -> Optional[int]:
+        """Time of the latest trace stamp, i.e. when the event was last published."""
+        return max(self.trace.values()) if self.trace else None
+
+    def dumps(self, codec: str = "json") -> bytes:
+        return codecs.get_codec(codec).encode(self.type, self.payload, self.trace)
 
     @classmethod
     def from_bytes(cls, data: bytes) -> "Event":
-        raw = json.loads(data.decode("utf-8"))
-        return cls(type=raw["type"], payload=raw["payload"])
+        event_type, payload, trace = codecs.decode(data)
+        return cls(type=event_type, payload=payload, trace=trace)
+
+
+class MemoryGroup:
+    """Cursor and pending entries of one in-process consumer group.
+
+    ``pending`` maps the sequence number of every delivered but unacknowledged
+    entry to the consumer it was delivered to and ``time.monotonic()`` at
+    delivery, like the pending entries list of a Redis consumer group.
+    """
+
+    __slots__ = ("cursor", "pending")
+
+    def __init__(self, cursor: int):
+        self.cursor = cursor
+        self.pending: Dict[int, Tuple[str, float]] = {}
+
+    def forget_before(self, seq: int) -> None:
+        """Drop pending entries that were trimmed from the stream."""
+        for trimmed in [pending for pending in self.pending if pending < seq]:
+            del self.pending[trimmed]
+
+    def deliver(self, consumer: str, seqs: Sequence[int]) -> None:
+        delivered = time.monotonic()
+        for seq in seqs:
+            self.pending[seq] = (consumer, delivered)
+
+
+class MemoryStream:
+    """One in-process stream: an append-only window of the latest events.
+
+    Entries get ids ``"<seq>-0"`` with ``seq`` counting from 1, so cursors
+    compare the same way Redis stream ids do. Events are stored and handed
+    out as-is (no serialization), which means every reader of a stream shares
+    the same :class:`Event` objects and must treat them as read-only.
+    """
+
+    __slots__ = ("maxlen", "_events", "_first_seq", "_changed", "groups")
+
+    def __init__(self, maxlen: int = 10_000):
+        self.maxlen = maxlen
+        self._events: List[Event] = []
+        self._first_seq = 1
+        self._changed = asyncio.Event()
+        self.groups: Dict[str, MemoryGroup] = {}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def first_seq(self) -> int:
+        return self._first_seq
+
+    @property
+    def last_seq(self) -> int:
+        return self._first_seq + len(self._events) - 1
+
+    def append(self, events: Sequence[Event]) -> List[str]:
+        first = self.last_seq + 1
+        self._events.extend(events)
+        excess = len(self._events) - self.maxlen
+        # Trim in chunks so that appends stay amortised O(1).
+        if excess > 0 and excess >= self.maxlen // 4:
+            del self._events[:excess]
+            self._first_seq += excess
+        # Wake every blocked reader, then arm a fresh event for the next append.
+        self._changed.set()
+        self._changed = asyncio.Event()
+        return [f"{seq}-0" for seq in range(first, first + len(events))]
+
+    def resolve(self, message_id: str) -> int:
+        """Sequence number for ``message_id``; ``"$"`` is the current tail."""
+        if message_id == "$":
+            return self.last_seq
+        return int(message_id.partition("-")[0])
+
+    def read_after(self, seq: int, count: int) -> List[Tuple[Event, str]]:
+        start = max(seq + 1, self._first_seq)
+        offset = start - self._first_seq
+        return [
+            (event, f"{start + index}-0")
+            for index, event in enumerate(self._events[offset : offset + count])
+        ]
+
+    def entries(self, seqs: Sequence[int]) -> List[Tuple[Event, str]]:
+        """The entries at ``seqs``, which must not have been trimmed."""
+        return [(self._events[seq - self._first_seq], f"{seq}-0") for seq in seqs]
+
+    async def wait(self, block_ms: int) -> bool:
+        """Wait up to ``block_ms`` for the next append; False on timeout."""
+        if block_ms <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=block_ms / 1000)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+CoalesceKey = Callable[[Event], Optional[Hashable]]
+CoalesceMerge = Callable[[Event, Event], Event]
+
+
+def coalesce_events(
+    batch: Sequence[Tuple[Event, str]],
+    key: CoalesceKey,
+    merge: Optional[CoalesceMerge] = None,
+) -> Tuple[List[Tuple[Event, str]], Dict[str, List[str]]]:
+    """Keep only the newest event per ``key`` in ``batch``.
+
+    Surviving entries keep their relative order, and events whose key is
+    ``None`` always survive. ``merge(older, newer)`` folds a superseded event
+    into the one replacing it; without it superseded events are dropped.
+    Returns the surviving entries and, for each surviving id, the ids folded
+    into it, which must be acknowledged together with it.
+    """
+    newest: Dict[Hashable, int] = {}
+    for index, (event, _) in enumerate(batch):
+        event_key = key(event)
+        if event_key is not None:
+            newest[event_key] = index
+
+    kept: List[Tuple[Event, str]] = []
+    folded: Dict[str, List[str]] = {}
+    carried: Dict[Hashable, Tuple[Event, List[str]]] = {}
+    for index, (event, message_id) in enumerate(batch):
+        event_key = key(event)
+        if event_key is None:
+            kept.append((event, message_id))
+            continue
+        previous = carried.pop(event_key, None)
+        if previous is not None and merge is not None:
+            event = merge(previous[0], event)
+        superseded = previous[1] if previous is not None else []
+        if newest[event_key] != index:
+            carried[event_key] = (event, superseded + [message_id])
+            continue
+        kept.append((event, message_id))
+        if superseded:
+            folded[message_id] = superseded
+    return kept, folded
 
 
 class EventBus:
-    """Abstract event bus backed by Redis Streams or in-memory queue."""
+    """Event bus backed by Redis Streams or by in-process streams.
+
+    Without a Redis URL every stream is a :class:`MemoryStream` with the same
+    cursor, fan-out and consumer-group semantics the services rely on, so one
+    connected bus can be shared by several services in a single event loop.
+    ``stream_maxlen`` caps Redis streams with an approximate ``MAXLEN`` on
+    every ``XADD``; in-process streams are capped at ``memory_maxlen``.
+    """
 
-    def __init__(self, redis_url: Optional[str] = None):
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        *,
+        codec: str = "json",
+        memory_maxlen: int = 10_000,
+        stream_maxlen: Optional[int] = None,
+    ):
         self.redis_url = redis_url
+        self.codec = codecs.get_codec(codec)
+        self.memory_maxlen = memory_maxlen
+        self.stream_maxlen = stream_maxlen
         self._redis: Optional[redis.Redis] = None
-        self._queue: Optional[asyncio.Queue[Event]] = None
+        self._streams: Optional[Dict[str, MemoryStream]] = None
+        self._members: Dict[str, Dict[str, int]] = {}
+        self._coalesced: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._redis is not None or self._streams is not None
 
     async def connect(self) -> None:
+        if self.connected:
+            return
         if self.redis_url:
             self._redis = redis.from_url(self.redis_url, decode_responses=False)
             await self._redis.ping()
             logger.info("event_bus.redis_connected", url=self.redis_url)
         else:
-            self._queue = asyncio.Queue()
+            self._streams = {}
             logger.warning("event_bus.in_memory_mode")
 
     async def disconnect(self) -> None:
         if self._redis:
             await self._redis.aclose()
-        if self._queue:
-            self._queue = None
+            self._redis = None
+        self._streams = None
+
+    def _memory_stream(self, stream: str) -> MemoryStream:
+        if self._streams is None:
+            raise RuntimeError("EventBus is not connected.")
+        memory_stream = self._streams.get(stream)
+        if memory_stream is None:
+            memory_stream = self._streams[stream] = MemoryStream(self.memory_maxlen)
+        return memory_stream
 
     async def publish(self, stream: str, event: Event) -> None:
         if self._redis:
-            await self._redis.xadd(stream, {"payload": event.dumps()})
-        elif self._queue:
-            await self._queue.put(event)
+            await self._redis.xadd(stream, {"payload": self._encode(event)}, **self._trim_args())
         else:
+            self._memory_stream(stream).append((event,))
+
+    def _encode(self, event: Event) -> bytes:
+        return self.codec.encode(event.type, event.payload, event.trace)
+
+    def _trim_args(self) -> Dict[str, Any]:
+        if self.stream_maxlen is None:
+            return {}
+        return {"maxlen": self.stream_maxlen, "approximate": True}
+
+    async def publish_many(self, stream: str, events: Sequence[Event]) -> List[str]:
+        """Publish events in a single pipelined round trip, preserving order."""
+        if not events:
+            return []
+        if self._redis:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                trim_args = self._trim_args()
+                for event in events:
+                    pipe.xadd(stream, {"payload": self._encode(event)}, **trim_args)
+                ids = await pipe.execute()
+            return [_decode_id(message_id) for message_id in ids]
+        return self._memory_stream(stream).append(events)
+
+    async def tail_id(self, stream: str) -> str:
+        """Id of the newest entry in ``stream`` (``"0-0"`` when empty).
+
+        Resolving ``"$"`` once up front keeps a reader from skipping events
+        published between two of its reads.
+        """
+        if self._redis:
+            entries = await self._redis.xrevrange(stream, count=1)
+            return _decode_id(entries[0][0]) if entries else "0-0"
+        return f"{self._memory_stream(stream).last_seq}-0"
+
+    async def consume(self, stream: str, last_id: str = "$") -> Tuple[Event, str]:
+        batch = await self.consume_batch(stream, last_id, count=1)
+        if not batch:
+            raise asyncio.TimeoutError
+        return batch[0]
+
+    async def consume_batch(
+        self,
+        stream: str,
+        last_id: str = "$",
+        *,
+        count: int = 64,
+        block_ms: int = 1_000,
+    ) -> List[Tuple[Event, str]]:
+        """Read up to ``count`` events after ``last_id`` in one round trip.
+
+        Returns an empty list when nothing arrives within ``block_ms``.
+        """
+        if self._redis:
+            messages = await self._redis.xread({stream: last_id}, count=count, block=block_ms)
+            return _decode_messages(messages)
+        memory_stream = self._memory_stream(stream)
+        seq = memory_stream.resolve(last_id)
+        batch = memory_stream.read_after(seq, count)
+        if not batch and await memory_stream.wait(block_ms):
+            batch = memory_stream.read_after(seq, count)
+        return batch
+
+    async def ensure_group(self, stream: str, group: str, start_id: str = "0") -> None:
+        """Create ``group`` on ``stream`` (and the stream itself) if missing."""
+        if not self._redis:
+            memory_stream = self._memory_stream(stream)
+            if group not in memory_stream.groups:
+                memory_stream.groups[group] = MemoryGroup(memory_stream.resolve(start_id))
+            return
+        try:
+            await self._redis.xgroup_create(stream, group, id=start_id, mkstream=True)
+            logger.info("event_bus.group_created", stream=stream, group=group)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def consume_group(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        *,
+        count: int = 64,
+        block_ms: int = 1_000,
+        pending: bool = False,
+    ) -> List[Tuple[Event, str]]:
+        """Read a batch through a consumer group.
+
+        With ``pending=True`` the consumer's own delivered-but-unacknowledged
+        entries are returned instead of new ones, which is how a restarted
+        consumer resumes where it crashed. In-memory groups keep the same
+        pending entries per consumer, although they do not survive a restart
+        of the process.
+        """
+        if self._redis:
+            messages = await self._redis.xreadgroup(
+                group,
+                consumer,
+                {stream: "0" if pending else ">"},
+                count=count,
+                block=None if pending else block_ms,
+            )
+            return _decode_messages(messages)
+        memory_stream, memory_group = self._memory_group(stream, group)
+        if pending:
+            memory_group.forget_before(memory_stream.first_seq)
+            owned = sorted(seq for seq, (owner, _) in memory_group.pending.items() if owner == consumer)
+            return memory_stream.entries(owned[:count])
+        batch = memory_stream.read_after(memory_group.cursor, count)
+        if not batch and await memory_stream.wait(block_ms):
+            # Re-read the cursor: another consumer of the group may have woken first.
+            batch = memory_stream.read_after(memory_group.cursor, count)
+        if batch:
+            seqs = [memory_stream.resolve(message_id) for _, message_id in batch]
+            memory_group.cursor = seqs[-1]
+            memory_group.deliver(consumer, seqs)
+        return batch
+
+    def _memory_group(self, stream: str, group: str) -> Tuple[MemoryStream, MemoryGroup]:
+        memory_stream = self._memory_stream(stream)
+        memory_group = memory_stream.groups.get(group)
+        if memory_group is None:
+            raise RuntimeError(f"Consumer group {group!r} does not exist on {stream!r}.")
+        return memory_stream, memory_group
+
+    async def ack(self, stream: str, group: str, message_ids: Sequence[str]) -> int:
+        if not message_ids:
+            return 0
+        if self._redis:
+            return await self._redis.xack(stream, group, *message_ids)
+        memory_stream, memory_group = self._memory_group(stream, group)
+        acked = 0
+        for message_id in message_ids:
+            if memory_group.pending.pop(memory_stream.resolve(message_id), None) is not None:
+                acked += 1
+        return acked
+
+    async def reclaim(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        *,
+        min_idle_ms: int,
+        count: int = 64,
+    ) -> List[Tuple[Event, str]]:
+        """Claim entries other consumers left pending for longer than ``min_idle_ms``.
+
+        Like ``XAUTOCLAIM``, entries trimmed from the stream while pending
+        are dropped from the group instead of being returned.
+        """
+        if not self._redis:
+            memory_stream, memory_group = self._memory_group(stream, group)
+            idle_before = time.monotonic() - min_idle_ms / 1000
+            memory_group.forget_before(memory_stream.first_seq)
+            stale = sorted(seq for seq, (_, delivered) in memory_group.pending.items() if delivered <= idle_before)
+            memory_group.deliver(consumer, stale[:count])
+            return memory_stream.entries(stale[:count])
+        claimed: List[Tuple[Event, str]] = []
+        start_id = "0-0"
+        while len(claimed) < count:
+            response = await self._redis.xautoclaim(
+                stream,
+                group,
+                consumer,
+                min_idle_time=min_idle_ms,
+                start_id=start_id,
+                count=count - len(claimed),
+            )
+            start_id, entries = response[0], response[1]
+            for message_id, fields in entries:
+                if fields:
+                    claimed.append((_decode_entry(fields), _decode_id(message_id)))
+            if _decode_id(start_id) == "0-0":
+                break
+        return claimed
+
+    async def record_coalesced(self, stream: str, consumer: str, *, batches: int, dropped: int) -> None:
+        """Add to the counts of batches ``consumer`` coalesced and events it dropped."""
+        fields = {f"{consumer}:batches": batches, f"{consumer}:dropped": dropped}
+        if self._redis:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for field_name, amount in fields.items():
+                    pipe.hincrby(_coalesce_key(stream), field_name, amount)
+                await pipe.execute()
+            return
+        counts = self._coalesced.setdefault(stream, {})
+        for field_name, amount in fields.items():
+            counts[field_name] = counts.get(field_name, 0) + amount
+
+    async def stream_stats(self, stream: str) -> Dict[str, Any]:
+        """Length of ``stream``, lag/pending counts for each consumer group and
+        the coalescing counts recorded by its consumers."""
+        if self._redis:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.xlen(stream)
+                pipe.hgetall(_coalesce_key(stream))
+                length, coalesced = await pipe.execute()
+            try:
+                groups = await self._redis.xinfo_groups(stream)
+            except ResponseError:
+                groups = []  # stream does not exist yet
+            return {
+                "stream": stream,
+                "length": length,
+                "groups": [
+                    {
+                        "name": _decode_id(group["name"]),
+                        "pending": group["pending"],
+                        "lag": group.get("lag"),
+                    }
+                    for group in groups
+                ],
+                "coalesced": _coalesce_counts(
+                    {_decode_id(name): int(value) for name, value in coalesced.items()}
+                ),
+            }
+        memory_stream = self._memory_stream(stream)
+        return {
+            "stream": stream,
+            "length": len(memory_stream),
+            "groups": [
+                {
+                    "name": group,
+                    "pending": len(memory_group.pending),
+                    "lag": memory_stream.last_seq - memory_group.cursor,
+                }
+                for group, memory_group in memory_stream.groups.items()
+            ],
+            "coalesced": _coalesce_counts(self._coalesced.get(stream, {})),
+        }
+
+    async def max_group_lag(self, stream: str) -> int:
+        """Entries the slowest consumer group of ``stream`` has yet to read.
+
+        Readers outside consumer groups are not tracked and never count.
+        """
+        stats = await self.stream_stats(stream)
+        return max((group["lag"] or 0 for group in stats["groups"]), default=0)
+
+    async def heartbeat(self, key: str, member: str, ttl_ms: int) -> List[str]:
+        """Mark ``member`` alive in the set ``key`` and return its live members, sorted.
+
+        Members whose last heartbeat is older than ``ttl_ms`` are dropped.
+        """
+        now_ms = int(time.time() * 1000)
+        if self._redis:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(key, {member: now_ms})
+                pipe.zremrangebyscore(key, "-inf", now_ms - ttl_ms)
+                pipe.zrange(key, 0, -1)
+                results = await pipe.execute()
+            return sorted(_decode_id(name) for name in results[-1])
+        if self._streams is None:
             raise RuntimeError("EventBus is not connected.")
+        members = self._members.setdefault(key, {})
+        members[member] = now_ms
+        for name, seen_ms in list(members.items()):
+            if seen_ms < now_ms - ttl_ms:
+                del members[name]
+        return sorted(members)
 
-    async def consume(self, stream: str, last_id: str = "$") -> Event:
+    async def leave(self, key: str, member: str) -> None:
+        """Remove ``member`` from ``key`` without waiting for its heartbeat to expire."""
         if self._redis:
-            messages = await self._redis.xread({stream: last_id}, count=1, block=1_000)
-            if not messages:
-                raise asyncio.TimeoutError
-            _, entries = messages[0]
-            message_id, fields = entries[0]
-            data = fields["payload"]
-            if isinstance(data, str):
-                data = data.encode("utf-8")
-            return Event.from_bytes(data), message_id
-        if self._queue:
-            event = await self._queue.get()
-            return event, ""
-        raise RuntimeError("EventBus is not connected.")
+            await self._redis.zrem(key, member)
+        else:
+            self._members.get(key, {}).pop(member, None)
+
+
+class PublishThrottle:
+    """Holds a producer back while the consumer groups of a stream lag too far behind.
+
+    ``wait`` returns immediately while the slowest group is at most
+    ``max_lag`` entries behind, and otherwise polls until it has caught up
+    or ``max_wait_ms`` has passed. Lag is looked up at most once per
+    ``check_interval_ms`` per stream so that a healthy producer pays
+    nothing per event.
+    """
+
+    def __init__(
+        self,
+        bus: EventBus,
+        *,
+        max_lag: int,
+        max_wait_ms: int = 1_000,
+        check_interval_ms: int = 100,
+    ):
+        self.bus = bus
+        self.max_lag = max_lag
+        self.max_wait_ms = max_wait_ms
+        self.check_interval_ms = check_interval_ms
+        self._next_check: Dict[str, float] = {}
+
+    async def wait(self, stream: str) -> float:
+        """Seconds spent waiting for the consumers of ``stream`` to catch up."""
+        started = time.monotonic()
+        if started < self._next_check.get(stream, 0.0):
+            return 0.0
+        interval = self.check_interval_ms / 1000
+        deadline = started + self.max_wait_ms / 1000
+        waited = 0.0
+        while await self.bus.max_group_lag(stream) > self.max_lag:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(interval, remaining))
+            waited = time.monotonic() - started
+        self._next_check[stream] = time.monotonic() + interval
+        return waited
+
+
+def _coalesce_key(stream: str) -> str:
+    return f"{stream}:coalesced"
+
+
+def _coalesce_counts(fields: Dict[str, int]) -> List[Dict[str, Any]]:
+    consumers = sorted({name.rpartition(":")[0] for name in fields})
+    return [
+        {
+            "name": consumer,
+            "batches": fields.get(f"{consumer}:batches", 0),
+            "dropped": fields.get(f"{consumer}:dropped", 0),
+        }
+        for consumer in consumers
+    ]
+
+
+def _decode_id(message_id: Any) -> str:
+    return message_id.decode("utf-8") if isinstance(message_id, bytes) else str(message_id)
+
+
+def _decode_entry(fields: Dict[Any, Any]) -> Event:
+    data = fields.get(b"payload", fields.get("payload"))
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return Event.from_bytes(data)
+
+
+def _decode_messages(messages: Any) -> List[Tuple[Event, str]]:
+    batch: List[Tuple[Event, str]] = []
+    for _, entries in messages or []:
+        for message_id, fields in entries:
+            batch.append((_decode_entry(fields), _decode_id(message_id)))
+    return batch
 
 
 def event_from_dict(data: Dict[str, Any]) -> Event:
-    return Event(type=data["type"], payload=data.get("payload", {}))
+    return Event(type=data["type"], payload=data.get("payload", {}), trace=data.get("trace") or {})
 
 
 def event_to_dict(event: Event) -> Dict[str, Any]:
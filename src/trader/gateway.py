@@ -0,0 +1,308 @@
+"""Shared REST access to exchanges for every service in a process.
+
+:class:`ExchangeGateway` owns one ccxt client per venue, all of them on a
+single pooled keep-alive HTTP session, so services running together share
+connections and markets instead of each building their own. Every HTTP
+request is charged ccxt's endpoint cost (weight) on a per-venue
+:class:`TokenBucket` in place of ccxt's own limiter, and waiting calls are
+served by :class:`Priority` so order submission is never stuck behind
+reconciliation or data polling. Identical reads that are already in flight
+at the same or a more urgent priority are sent once and their result
+handed to every caller.
+
+Services get a :class:`GatewayClient` bound to their priority from
+:meth:`ExchangeGateway.client` and call ccxt methods on it as usual.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import Settings
+from .logging import get_logger
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+logger = get_logger(__name__)
+
+
+class Priority(IntEnum):
+    """Request classes, most urgent first."""
+
+    ORDER = 0
+    RECONCILE = 1
+    DATA = 2
+
+
+#: Priority of the gateway call running in the current task, read by the ccxt throttle hook.
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("gateway_priority", default=Priority.DATA)
+
+
+def client_config(exchange_conf: Dict[str, Any]) -> Dict[str, Any]:
+    """ccxt constructor options for an ``exchanges`` entry of the config."""
+    return {
+        "apiKey": exchange_conf.get("api_key"),
+        "secret": exchange_conf.get("api_secret"),
+        "password": exchange_conf.get("password"),
+        "enableRateLimit": True,
+        # Reconciliation deliberately fetches all open orders in one call.
+        "options": {"warnOnFetchOpenOrdersWithoutSymbol": False},
+    }
+
+
+def _is_read(method: str) -> bool:
+    return method.startswith("fetch_") or method == "load_markets"
+
+
+class TokenBucket:
+    """Token bucket whose waiting callers are served by priority, then arrival.
+
+    ``rate`` tokens per second refill the bucket up to ``capacity``. A call
+    only takes tokens directly while nobody is waiting, so a burst of
+    low-priority calls cannot starve a later high-priority one. A call
+    costing more than ``capacity`` waits for a full bucket and leaves it in
+    debt for the calls after it.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._waiters: List[Tuple[int, int, float, asyncio.Future[None]]] = []
+        self._order = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        """Number of callers waiting for tokens."""
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: Priority = Priority.DATA, cost: float = 1.0) -> None:
+        self._refill()
+        if not self._waiters and self._tokens >= min(cost, self.capacity):
+            self._tokens -= cost
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._order), cost, future))
+        self._release()
+        await future
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _release(self) -> None:
+        """Grant tokens to waiters in order and arm a timer for the next one."""
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            _, _, cost, future = self._waiters[0]
+            if future.done():  # cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self._tokens < min(cost, self.capacity):
+                break
+            heapq.heappop(self._waiters)
+            self._tokens -= cost
+            future.set_result(None)
+        if self._waiters and self._timer is None:
+            delay = (min(self._waiters[0][2], self.capacity) - self._tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.0), self._release)
+
+
+class GatewayClient:
+    """A venue's shared client whose coroutine methods go through the gateway at one priority.
+
+    Other attributes (``has``, ``markets``, ``rateLimit`` …) are read from
+    the underlying ccxt client. Results of coalesced reads are shared
+    between callers and must not be mutated.
+    """
+
+    def __init__(self, gateway: "ExchangeGateway", venue: str, priority: Priority):
+        self._gateway = gateway
+        self.venue = venue
+        self.priority = priority
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._gateway.raw_client(self.venue), name)
+        if not asyncio.iscoroutinefunction(attribute):
+            return attribute
+        return functools.partial(self._gateway.request, self.venue, name, priority=self.priority)
+
+
+class ExchangeGateway:
+    """Pooled, rate-limited exchange clients shared by the services of one process.
+
+    ``clients`` supplies ready clients by venue name in place of ccxt ones
+    (the replay harness uses stubs); ``rate_limited=False`` turns the token
+    buckets off.
+    """
+
+    def __init__(
+        self,
+        exchanges: Iterable[Dict[str, Any]],
+        *,
+        pool_size: int = 100,
+        keepalive_seconds: float = 30.0,
+        clients: Optional[Dict[str, Any]] = None,
+        rate_limited: bool = True,
+    ):
+        self._configs = {conf["name"]: conf for conf in exchanges}
+        self.pool_size = pool_size
+        self.keepalive_seconds = keepalive_seconds
+        self.rate_limited = rate_limited
+        self._clients: Dict[str, Any] = dict(clients or {})
+        self._injected = set(self._clients)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._inflight: Dict[Tuple[Any, ...], Tuple[Priority, asyncio.Future[Any]]] = {}
+        self._session: Optional["aiohttp.ClientSession"] = None
+        #: Venue -> requests sent / reads answered by an identical in-flight request.
+        self.requests: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Settings, **kwargs: Any) -> "ExchangeGateway":
+        return cls(
+            settings.exchanges,
+            pool_size=settings.gateway.pool_size,
+            keepalive_seconds=settings.gateway.keepalive_seconds,
+            **kwargs,
+        )
+
+    @property
+    def venues(self) -> List[str]:
+        return sorted(set(self._configs) | self._injected)
+
+    async def open(self) -> None:
+        """Create the shared HTTP session and the ccxt clients; safe to call repeatedly.
+
+        aiohttp and ccxt are imported here rather than with the module, so
+        processes using injected clients only never load them.
+        """
+        if self._session is None and set(self._configs) - self._injected:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_seconds,
+                enable_cleanup_closed=True,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        for venue in self.venues:
+            self.raw_client(venue)
+
+    async def close(self) -> None:
+        for venue, client in self._clients.items():
+            if venue in self._injected:
+                continue
+            try:
+                await client.close()
+            except Exception:
+                pass
+        self._clients = {venue: client for venue, client in self._clients.items() if venue in self._injected}
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def client(self, venue: str, priority: Priority) -> GatewayClient:
+        if venue not in self._configs and venue not in self._injected:
+            raise KeyError(f"Unknown exchange {venue!r}")
+        return GatewayClient(self, venue, priority)
+
+    def raw_client(self, venue: str) -> Any:
+        """The underlying client of ``venue``, created on first use."""
+        client = self._clients.get(venue)
+        if client is not None:
+            return client
+        if self._session is None:
+            raise RuntimeError("ExchangeGateway is not open.")
+        import ccxt.async_support as ccxt_async  # type: ignore
+
+        conf = self._configs[venue]
+        module = conf.get("module", "ccxt.binanceusdm")
+        client_cls = getattr(ccxt_async, module.split(".")[-1])
+        client = client_cls({**client_config(conf), "enableRateLimit": self.rate_limited, "session": self._session})
+        # ccxt still computes each endpoint's cost; the token bucket replaces its per-client limiter.
+        client.throttle = functools.partial(self._throttle, venue)
+        if conf.get("sandbox") and hasattr(client, "set_sandbox_mode"):
+            client.set_sandbox_mode(True)
+        self._clients[venue] = client
+        logger.info(
+            "exchange_gateway.client_created",
+            exchange=venue,
+            module=module,
+            requests_per_second=round(self._bucket(venue).rate, 3) if self.rate_limited else None,
+        )
+        return client
+
+    def _bucket(self, venue: str) -> TokenBucket:
+        bucket = self._buckets.get(venue)
+        if bucket is None:
+            conf = self._configs.get(venue, {})
+            if conf.get("rate_limit"):
+                rate = float(conf["rate_limit"]) / 60  # configured per minute
+            else:
+                rate = 1000 / float(getattr(self.raw_client(venue), "rateLimit", 1000) or 1000)
+            burst = float(conf.get("rate_limit_burst") or max(1.0, rate))
+            bucket = self._buckets[venue] = TokenBucket(rate, burst)
+        return bucket
+
+    async def request(self, venue: str, method: str, *args: Any, priority: Priority, **kwargs: Any) -> Any:
+        """Call ``method`` on ``venue``'s client, coalescing identical in-flight reads.
+
+        A read only joins one sent at the same or a more urgent priority, so
+        an order or reconciliation caller never waits in the data queue.
+        """
+        if not _is_read(method):
+            return await self._send(venue, method, args, kwargs, priority)
+        key = (venue, method, repr(args), repr(sorted(kwargs.items())))
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] <= priority:
+            self.coalesced[venue] = self.coalesced.get(venue, 0) + 1
+            return await asyncio.shield(entry[1])
+        inflight = asyncio.ensure_future(self._send(venue, method, args, kwargs, priority))
+        # Later callers join the most urgent request for this read.
+        self._inflight[key] = (priority, inflight)
+        inflight.add_done_callback(functools.partial(self._forget, key))
+        return await asyncio.shield(inflight)
+
+    def _forget(self, key: Tuple[Any, ...], inflight: "asyncio.Future[Any]") -> None:
+        entry = self._inflight.get(key)
+        if entry is not None and entry[1] is inflight:
+            del self._inflight[key]
+        if not inflight.cancelled():
+            inflight.exception()  # retrieved here too in case every caller was cancelled
+
+    async def _send(
+        self,
+        venue: str,
+        method: str,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        priority: Priority,
+    ) -> Any:
+        client = self.raw_client(venue)
+        if self.rate_limited and venue in self._injected:
+            # Injected clients do not report endpoint costs: one token per call.
+            await self._bucket(venue).acquire(priority)
+        self.requests[venue] = self.requests.get(venue, 0) + 1
+        token = _priority.set(priority)
+        try:
+            return await getattr(client, method)(*args, **kwargs)
+        finally:
+            _priority.reset(token)
+
+    async def _throttle(self, venue: str, cost: Optional[float] = None) -> None:
+        """ccxt's throttle hook: charge one HTTP request's endpoint cost to the venue bucket."""
+        await self._bucket(venue).acquire(_priority.get(), 1.0 if cost is None else float(cost))
@@ -0,0 +1,187 @@
+"""In-memory open-risk ledger maintained from position update events."""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Mapping, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from .db import session_scope
+from .models import Position
+
+if TYPE_CHECKING:
+    from .persistence import PositionUpsert
+
+PositionKey = Tuple[str, str, str]
+
+
+@dataclass(slots=True, frozen=True)
+class PositionExposure:
+    exchange: str
+    symbol: str
+    strategy: str
+    quantity: float
+    entry_price: float
+    stop_price: float
+
+    @property
+    def key(self) -> PositionKey:
+        return (self.exchange, self.symbol, self.strategy)
+
+    @property
+    def risk(self) -> float:
+        return abs(self.entry_price - self.stop_price) * abs(self.quantity)
+
+    @property
+    def notional(self) -> float:
+        return abs(self.quantity) * self.entry_price
+
+    @classmethod
+    def from_position(cls, position: Position) -> "PositionExposure":
+        return cls(
+            exchange=position.exchange,
+            symbol=position.symbol,
+            strategy=position.strategy,
+            quantity=position.quantity,
+            entry_price=position.entry_price,
+            stop_price=position.stop_price,
+        )
+
+    @classmethod
+    def from_payload(cls, payload: Mapping[str, Any]) -> "PositionExposure":
+        return cls(
+            exchange=payload["exchange"],
+            symbol=payload["symbol"],
+            strategy=payload["strategy"],
+            quantity=float(payload["quantity"]),
+            entry_price=float(payload["entry_price"]),
+            stop_price=float(payload["stop_price"]),
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class LedgerChecksum:
+    positions: int
+    open_risk: float
+    gross_notional: float
+
+    def matches(self, other: "LedgerChecksum", rel_tol: float = 1e-9) -> bool:
+        return (
+            self.positions == other.positions
+            and math.isclose(self.open_risk, other.open_risk, rel_tol=rel_tol, abs_tol=1e-9)
+            and math.isclose(self.gross_notional, other.gross_notional, rel_tol=rel_tol, abs_tol=1e-9)
+        )
+
+
+class RiskLedger:
+    """Open positions with running portfolio totals.
+
+    Every query is O(1); applying a position snapshot adjusts the totals by
+    the difference to the previous snapshot for the same
+    (exchange, symbol, strategy).
+    """
+
+    def __init__(self, positions: Iterable[PositionExposure] = ()):
+        self._positions: Dict[PositionKey, PositionExposure] = {}
+        # (exchange, symbol) -> (notional, number of strategies holding it)
+        self._symbol_notional: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self.open_risk = 0.0
+        self.gross_notional = 0.0
+        for position in positions:
+            self.apply(position)
+
+    @classmethod
+    def from_database(cls, session_factory: sessionmaker[Session]) -> "RiskLedger":
+        return cls(load_open_exposures(session_factory))
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def apply(self, position: PositionExposure) -> None:
+        """Insert or replace the snapshot for ``position.key``."""
+        self.remove(position.key)
+        if position.quantity == 0:
+            return
+        self._positions[position.key] = position
+        self._adjust(position, 1.0)
+
+    def remove(self, key: PositionKey) -> None:
+        previous = self._positions.pop(key, None)
+        if previous is not None:
+            self._adjust(previous, -1.0)
+
+    def apply_event(self, event_type: str, payload: Mapping[str, Any]) -> bool:
+        """Apply a ``position_update`` event; returns False for other event types."""
+        if event_type != "position_update":
+            return False
+        exposure = PositionExposure.from_payload(payload)
+        if payload.get("closed"):
+            self.remove(exposure.key)
+        else:
+            self.apply(exposure)
+        return True
+
+    def portfolio_heat(self, equity: float) -> float:
+        return self.open_risk / equity if equity else math.inf
+
+    def leverage(self, equity: float) -> float:
+        return self.gross_notional / equity if equity else math.inf
+
+    def symbol_exposure(self, exchange: str, symbol: str) -> float:
+        return self._symbol_notional.get((exchange, symbol), (0.0, 0))[0]
+
+    def checksum(self) -> LedgerChecksum:
+        """Totals recomputed from the stored snapshots, not the running sums."""
+        return _checksum(self._positions.values())
+
+    def resync(self, checksum: LedgerChecksum | None = None) -> None:
+        """Reset the running totals to ``checksum`` to drop accumulated float error."""
+        checksum = checksum or self.checksum()
+        self.open_risk = checksum.open_risk
+        self.gross_notional = checksum.gross_notional
+
+    def _adjust(self, position: PositionExposure, sign: float) -> None:
+        self.open_risk += sign * position.risk
+        self.gross_notional += sign * position.notional
+        symbol_key = (position.exchange, position.symbol)
+        notional, holders = self._symbol_notional.get(symbol_key, (0.0, 0))
+        holders += 1 if sign > 0 else -1
+        if holders:
+            self._symbol_notional[symbol_key] = (notional + sign * position.notional, holders)
+        else:
+            self._symbol_notional.pop(symbol_key, None)
+
+
+def position_payload(position: "Position | PositionUpsert", *, closed: bool = False) -> Dict[str, Any]:
+    """Absolute ``position_update`` event payload for ``position``."""
+    return {
+        "exchange": position.exchange,
+        "symbol": position.symbol,
+        "strategy": position.strategy,
+        "quantity": position.quantity,
+        "entry_price": position.entry_price,
+        "stop_price": position.stop_price,
+        "closed": closed,
+    }
+
+
+def load_open_exposures(session_factory: sessionmaker[Session]) -> list[PositionExposure]:
+    with session_scope(session_factory) as session:
+        positions = session.query(Position).filter(Position.closed_at.is_(None)).all()
+        return [PositionExposure.from_position(position) for position in positions]
+
+
+def database_checksum(session_factory: sessionmaker[Session]) -> LedgerChecksum:
+    return _checksum(
+        exposure for exposure in load_open_exposures(session_factory) if exposure.quantity != 0
+    )
+
+
+def _checksum(positions: Iterable[PositionExposure]) -> LedgerChecksum:
+    count, open_risk, gross_notional = 0, 0.0, 0.0
+    for position in positions:
+        count += 1
+        open_risk += position.risk
+        gross_notional += position.notional
+    return LedgerChecksum(positions=count, open_risk=open_risk, gross_notional=gross_notional)
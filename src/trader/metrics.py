@@ -0,0 +1,112 @@
+"""Prometheus metrics for pipeline latency, ingest lag, event bus health and reconciliation."""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram
+
+
+#: Trace stages in pipeline order: DataService publish, StrategyService signal,
+#: RiskService approval, ExecutionService order submission, exchange ack.
+PIPELINE_STAGES = ("ingest", "strategy", "risk", "submit", "ack")
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1,
+    0.15, 0.25, 0.35, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0,
+)
+
+INGEST_LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+RECONCILIATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class PipelineMetrics:
+    """Per-stage latency histograms and stream gauges in one registry."""
+
+    def __init__(self, registry: Optional[CollectorRegistry] = None):
+        self.registry = registry or CollectorRegistry()
+        self.stage_latency = Histogram(
+            "trader_pipeline_stage_latency_seconds",
+            "Time between consecutive pipeline stages of one event chain.",
+            ["stage"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.end_to_end_latency = Histogram(
+            "trader_pipeline_end_to_end_latency_seconds",
+            "Time from market data ingest to exchange acknowledgement.",
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.ingest_lag = Histogram(
+            "trader_ingest_lag_seconds",
+            "Time from a candle closing until DataService observed it.",
+            ["exchange", "symbol"],
+            buckets=INGEST_LAG_BUCKETS,
+            registry=self.registry,
+        )
+        self.stream_length = Gauge(
+            "trader_stream_length",
+            "Entries currently held in an event stream.",
+            ["stream"],
+            registry=self.registry,
+        )
+        self.consumer_lag = Gauge(
+            "trader_stream_consumer_lag",
+            "Entries not yet delivered to a consumer group.",
+            ["stream", "group"],
+            registry=self.registry,
+        )
+        self.consumer_pending = Gauge(
+            "trader_stream_consumer_pending",
+            "Entries delivered to a consumer group but not acknowledged.",
+            ["stream", "group"],
+            registry=self.registry,
+        )
+        self.coalesced_batches = Gauge(
+            "trader_stream_coalesced_batches",
+            "Batches a lagging consumer coalesced to the newest event per key.",
+            ["stream", "consumer"],
+            registry=self.registry,
+        )
+        self.dropped_events = Gauge(
+            "trader_stream_dropped_events",
+            "Superseded events a lagging consumer skipped while coalescing.",
+            ["stream", "consumer"],
+            registry=self.registry,
+        )
+        self.reconciliation_cycle = Histogram(
+            "trader_reconciliation_cycle_seconds",
+            "Duration of one reconciliation cycle over every venue.",
+            buckets=RECONCILIATION_BUCKETS,
+            registry=self.registry,
+        )
+
+    def observe_trace(self, trace: Mapping[str, int]) -> None:
+        """Record the gap between each pair of consecutive stamped stages."""
+        previous: Optional[int] = None
+        previous_stage = ""
+        for stage in PIPELINE_STAGES:
+            stamped = trace.get(stage)
+            if stamped is None:
+                continue
+            if previous is not None:
+                self.stage_latency.labels(stage=f"{previous_stage}_to_{stage}").observe(
+                    max(0, stamped - previous) / 1e9
+                )
+            previous, previous_stage = stamped, stage
+        if "ingest" in trace and "ack" in trace:
+            self.end_to_end_latency.observe(max(0, trace["ack"] - trace["ingest"]) / 1e9)
+
+    def observe_streams(self, stats: Iterable[Mapping[str, Any]]) -> None:
+        for stream_stats in stats:
+            stream = stream_stats["stream"]
+            self.stream_length.labels(stream=stream).set(stream_stats["length"])
+            for group in stream_stats.get("groups", []):
+                labels: Dict[str, str] = {"stream": stream, "group": group["name"]}
+                if group.get("lag") is not None:
+                    self.consumer_lag.labels(**labels).set(group["lag"])
+                self.consumer_pending.labels(**labels).set(group["pending"])
+            for consumer in stream_stats.get("coalesced", []):
+                self.coalesced_batches.labels(stream=stream, consumer=consumer["name"]).set(consumer["batches"])
+                self.dropped_events.labels(stream=stream, consumer=consumer["name"]).set(consumer["dropped"])
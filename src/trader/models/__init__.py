@@ -1,5 +1,23 @@
-from .order import Order
+from .order import (
+    OPEN_ORDER_STATUSES,
+    TERMINAL_ORDER_STATUSES,
+    Order,
+    OrderSide,
+    OrderStatus,
+    OrderType,
+    orders_archive,
+)
 from .position import Position
 from .account import AccountState
 
-__all__ = ["Order", "Position", "AccountState"]
+__all__ = [
+    "OPEN_ORDER_STATUSES",
+    "TERMINAL_ORDER_STATUSES",
+    "Order",
+    "OrderSide",
+    "OrderStatus",
+    "OrderType",
+    "orders_archive",
+    "Position",
+    "AccountState",
+]
@@ -4,7 +4,7 @@ import enum
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, DateTime, Enum, Float, Integer, String, Text
+from sqlalchemy import JSON, Boolean, Column, DateTime, Enum, Float, Index, Integer, String, Table
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -33,7 +33,13 @@ class OrderStatus(str, enum.Enum):
     REJECTED = "rejected"
 
 
+OPEN_ORDER_STATUSES = (OrderStatus.NEW, OrderStatus.PENDING, OrderStatus.PARTIALLY_FILLED)
+TERMINAL_ORDER_STATUSES = (OrderStatus.FILLED, OrderStatus.CANCELED, OrderStatus.REJECTED)
+
+
 class Order(Base):
+    """An order submitted by this system; settled history moves to :data:`orders_archive`."""
+
     __tablename__ = "orders"
 
     id: Mapped[uuid.UUID] = mapped_column(
@@ -53,11 +59,36 @@ class Order(Base):
     stop_price: Mapped[float | None] = mapped_column(Float)
     reduce_only: Mapped[bool] = mapped_column(Boolean, default=True)
     time_in_force: Mapped[str | None] = mapped_column(String(16))
-    raw_request: Mapped[dict | None] = mapped_column(JSONB().with_variant(Text, "sqlite"))
-    raw_response: Mapped[dict | None] = mapped_column(JSONB().with_variant(Text, "sqlite"))
+    raw_request: Mapped[dict | None] = mapped_column(JSONB().with_variant(JSON, "sqlite"))
+    raw_response: Mapped[dict | None] = mapped_column(JSONB().with_variant(JSON, "sqlite"))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     def mark_status(self, status: OrderStatus) -> None:
         self.status = status
         self.updated_at = datetime.now(timezone.utc)
+
+
+Index("ix_orders_created_at", Order.created_at)
+Index("ix_orders_exchange_symbol_created_at", Order.exchange, Order.symbol, Order.created_at)
+
+
+#: Orders in a terminal status moved out of ``orders`` by :func:`trader.archive.archive_orders`.
+#: Same columns as ``orders``; on PostgreSQL it is range-partitioned by month of ``created_at``,
+#: which therefore joins the primary key, and ``client_order_id`` is indexed but not unique.
+orders_archive = Table(
+    "orders_archive",
+    Base.metadata,
+    *(
+        Column(
+            column.name,
+            column.type,
+            primary_key=column.name in ("id", "created_at"),
+            nullable=column.nullable and column.name != "created_at",
+        )
+        for column in Order.__table__.columns
+    ),
+    Index("ix_orders_archive_client_order_id", "client_order_id"),
+    Index("ix_orders_archive_exchange_symbol_created_at", "exchange", "symbol", "created_at"),
+    postgresql_partition_by="RANGE (created_at)",
+)
@@ -3,7 +3,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, Float, String
+from sqlalchemy import Boolean, Float, Index, String, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -12,6 +12,18 @@ from ..db import Base
 
 class Position(Base):
     __tablename__ = "positions"
+    __table_args__ = (
+        # Open positions are looked up by key on every fill and loaded whole
+        # by the ledger and reconciliation; closed history stays out of the index.
+        Index(
+            "ix_positions_open_key",
+            "exchange",
+            "symbol",
+            "strategy",
+            postgresql_where=text("closed_at IS NULL"),
+            sqlite_where=text("closed_at IS NULL"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -0,0 +1,426 @@
+"""Write-behind persistence for execution records.
+
+Callers enqueue order inserts, order status updates and position snapshots
+without waiting on the database; a background task flushes them in bulk
+statements once a batch fills up or the oldest queued record reaches
+``max_latency`` seconds. A bulk flush that still fails after
+``max_attempts`` is bisected so only the records that fail on their own
+are held back; those are appended to a local journal, together with later
+records for the same order or position so replaying stays in order.
+:meth:`WriteBehindWriter.close` drains the queue, spilling whatever is left
+to the journal after ``close_timeout`` seconds, and
+:meth:`WriteBehindWriter.replay_journal` writes the journal to the database
+on the next start.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import pickle
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .db import async_session_scope
+from .logging import get_logger
+from .models import Order, OrderStatus, Position
+from .utils import utc_now
+
+
+logger = get_logger(__name__)
+
+PositionKey = Tuple[str, str, str]
+
+
+@dataclass(slots=True)
+class OrderInsert:
+    values: Dict[str, Any]
+
+
+@dataclass(slots=True)
+class OrderUpdate:
+    """Latest exchange-reported state of an order; later updates supersede earlier ones."""
+
+    client_order_id: str
+    status: OrderStatus
+    filled_quantity: float
+    external_order_id: Optional[str] = None
+    recorded_at: datetime = field(default_factory=utc_now)
+
+
+@dataclass(slots=True)
+class PositionUpsert:
+    """Absolute open-position state; later snapshots for a key supersede earlier ones."""
+
+    exchange: str
+    symbol: str
+    strategy: str
+    quantity: float
+    entry_price: float
+    stop_price: float
+    reduce_only_stop_installed: bool = True
+    closed: bool = False
+    recorded_at: datetime = field(default_factory=utc_now)
+
+    @property
+    def key(self) -> PositionKey:
+        return (self.exchange, self.symbol, self.strategy)
+
+
+_CLOSE = object()
+
+
+class WriteBehindWriter:
+    """Batches order and position writes onto a background flush task."""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        *,
+        max_batch: int = 500,
+        max_latency: float = 0.05,
+        max_queue: int = 10_000,
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 10.0,
+        max_attempts: int = 5,
+        close_timeout: float = 30.0,
+        journal_path: str | Path | None = None,
+    ):
+        self._session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.close_timeout = close_timeout
+        self._queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task[None]] = None
+        self._closing = False
+        self._journal_path = Path(journal_path) if journal_path is not None else None
+        self._inflight: List[Any] = []
+        # Orders and positions with a record in the journal: their later records follow it there.
+        self._spilled_orders: Set[str] = set()
+        self._spilled_positions: Set[PositionKey] = set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="write-behind")
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def record_order(self, **values: Any) -> None:
+        """Queue an ``orders`` row. Only waits when the queue is full."""
+        await self._put(OrderInsert(values))
+
+    async def update_order(self, update: OrderUpdate) -> None:
+        """Queue a status/fill update of an order queued or stored earlier."""
+        await self._put(update)
+
+    async def upsert_position(self, snapshot: PositionUpsert) -> None:
+        await self._put(snapshot)
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """Flush everything queued so far and stop the background task.
+
+        After ``timeout`` seconds (``close_timeout`` by default) the task is
+        cancelled and the records not yet written are spilled to the journal.
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        task, self._task = self._task, None
+        try:
+            await asyncio.wait_for(self._drain(task), timeout if timeout is not None else self.close_timeout)
+        except asyncio.TimeoutError:
+            leftover = list(self._inflight)
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not _CLOSE:
+                    leftover.append(item)
+            self._inflight = []
+            self._spill(leftover, "close timed out")
+
+    async def _drain(self, task: asyncio.Task[None]) -> None:
+        await self._queue.put(_CLOSE)
+        await task
+
+    async def replay_journal(self) -> int:
+        """Write records journaled by an earlier run to the database; returns how many.
+
+        Call before :meth:`start`. Order inserts already in the database (the
+        earlier run may have stopped mid-flush) are skipped; records that
+        fail again go back to the journal.
+        """
+        if self._journal_path is None:
+            return 0
+        replaying = self._journal_path.with_name(self._journal_path.name + ".replay")
+        if self._journal_path.exists():
+            # Appended to a replay left by a crash, so records keep their order.
+            with replaying.open("ab") as target:
+                target.write(self._journal_path.read_bytes())
+                target.flush()
+                os.fsync(target.fileno())
+            self._journal_path.unlink()
+        if not replaying.exists():
+            return 0
+        records = _read_journal(replaying)
+        inserted = {item.values["client_order_id"] for item in records if isinstance(item, OrderInsert)}
+        if inserted:
+            async with async_session_scope(self._session_factory) as session:
+                result = await session.scalars(
+                    select(Order.client_order_id).where(Order.client_order_id.in_(inserted))
+                )
+                # Also skips an insert journaled twice (spilled again while closing).
+                seen = set(result)
+            kept = []
+            for item in records:
+                if isinstance(item, OrderInsert):
+                    if item.values["client_order_id"] in seen:
+                        logger.warning(
+                            "write_behind.journal_order_exists", client_order_id=item.values["client_order_id"]
+                        )
+                        continue
+                    seen.add(item.values["client_order_id"])
+                kept.append(item)
+            records = kept
+        for start in range(0, len(records), self.max_batch):
+            await self._flush_isolated(records[start:start + self.max_batch])
+        replaying.unlink()
+        logger.warning("write_behind.journal_replayed", records=len(records))
+        return len(records)
+
+    async def _put(self, item: Any) -> None:
+        if self._task is None or self._closing:
+            raise RuntimeError("WriteBehindWriter is not running.")
+        await self._queue.put(item)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            batch: List[Any] = []
+            if item is _CLOSE:
+                closing = True
+            else:
+                batch.append(item)
+            deadline = loop.time() + self.max_latency
+            while not closing and len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._inflight = batch
+                await self._flush_with_retry(batch)
+                self._inflight = []
+
+    async def _flush_with_retry(self, batch: List[Any]) -> None:
+        batch = self._divert_followers(batch)
+        if not batch:
+            return
+        delay = self.retry_delay
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                await self._flush(batch)
+                return
+            except Exception as exc:
+                if attempts >= self.max_attempts:
+                    logger.error(
+                        "write_behind.flush_abandoned",
+                        records=len(batch),
+                        attempts=attempts,
+                        error=str(exc),
+                    )
+                    await self._flush_isolated(batch)
+                    return
+                logger.error(
+                    "write_behind.flush_failed",
+                    records=len(batch),
+                    attempt=attempts,
+                    retry_in=delay,
+                    error=str(exc),
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    async def _flush_isolated(self, batch: List[Any]) -> None:
+        """Flush ``batch`` in halves until each failing record is spilled on its own."""
+        batch = self._divert_followers(batch)
+        if not batch:
+            return
+        try:
+            await self._flush(batch)
+            return
+        except Exception as exc:
+            if len(batch) == 1:
+                self._spill(batch, str(exc))
+                return
+        middle = len(batch) // 2
+        await self._flush_isolated(batch[:middle])
+        await self._flush_isolated(batch[middle:])
+
+    def _divert_followers(self, batch: List[Any]) -> List[Any]:
+        """Spill the records of ``batch`` that follow a journaled one; returns the rest."""
+        if not (self._spilled_orders or self._spilled_positions):
+            return batch
+        self._spill([item for item in batch if self._follows_spilled(item)], "follows a journaled record")
+        return [item for item in batch if not self._follows_spilled(item)]
+
+    def _follows_spilled(self, item: Any) -> bool:
+        if isinstance(item, OrderInsert):
+            return item.values["client_order_id"] in self._spilled_orders
+        if isinstance(item, OrderUpdate):
+            return item.client_order_id in self._spilled_orders
+        return isinstance(item, PositionUpsert) and item.key in self._spilled_positions
+
+    def _spill(self, records: List[Any], error: str) -> None:
+        """Append ``records`` to the journal, or log them if there is none."""
+        if not records:
+            return
+        for item in records:
+            if isinstance(item, OrderInsert):
+                self._spilled_orders.add(item.values["client_order_id"])
+            elif isinstance(item, OrderUpdate):
+                self._spilled_orders.add(item.client_order_id)
+            elif isinstance(item, PositionUpsert):
+                self._spilled_positions.add(item.key)
+        if self._journal_path is None:
+            logger.critical(
+                "write_behind.records_lost",
+                records=len(records),
+                error=error,
+                batch=[repr(item) for item in records],
+            )
+            return
+        self._journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._journal_path.open("ab") as journal:
+            for item in records:
+                pickle.dump(item, journal, protocol=pickle.HIGHEST_PROTOCOL)
+            journal.flush()
+            os.fsync(journal.fileno())
+        logger.critical(
+            "write_behind.records_journaled",
+            records=len(records),
+            journal=str(self._journal_path),
+            error=error,
+        )
+
+    async def _flush(self, batch: List[Any]) -> None:
+        orders = [item.values for item in batch if isinstance(item, OrderInsert)]
+        order_updates: Dict[str, OrderUpdate] = {}
+        positions: Dict[PositionKey, PositionUpsert] = {}
+        for item in batch:
+            if isinstance(item, OrderUpdate):
+                order_updates[item.client_order_id] = item
+            elif isinstance(item, PositionUpsert):
+                positions[item.key] = item
+
+        async with async_session_scope(self._session_factory) as session:
+            if orders:
+                await session.execute(insert(Order), orders)
+            if order_updates:
+                await self._flush_order_updates(session, list(order_updates.values()))
+            if positions:
+                await self._flush_positions(session, positions)
+        logger.debug(
+            "write_behind.flushed",
+            orders=len(orders),
+            order_updates=len(order_updates),
+            positions=len(positions),
+        )
+
+    @staticmethod
+    async def _flush_order_updates(session: AsyncSession, updates: List[OrderUpdate]) -> None:
+        table = Order.__table__
+        statement = (
+            update(table)
+            .where(table.c.client_order_id == bindparam("match_client_order_id"))
+            .values(
+                status=bindparam("status"),
+                filled_quantity=bindparam("filled_quantity"),
+                external_order_id=bindparam("external_order_id"),
+                updated_at=bindparam("updated_at"),
+            )
+        )
+        rows = [
+            {
+                "match_client_order_id": item.client_order_id,
+                "status": item.status,
+                "filled_quantity": item.filled_quantity,
+                "external_order_id": item.external_order_id,
+                "updated_at": item.recorded_at,
+            }
+            for item in updates
+        ]
+        await session.execute(statement, rows)
+
+    @staticmethod
+    async def _flush_positions(session: AsyncSession, positions: Dict[PositionKey, PositionUpsert]) -> None:
+        key_columns = tuple_(Position.exchange, Position.symbol, Position.strategy)
+        result = await session.execute(
+            select(Position.id, Position.exchange, Position.symbol, Position.strategy).where(
+                key_columns.in_(list(positions)),
+                Position.closed_at.is_(None),
+            )
+        )
+        existing = {(row.exchange, row.symbol, row.strategy): row.id for row in result}
+
+        updates, inserts = [], []
+        for key, snapshot in positions.items():
+            values = {
+                "quantity": snapshot.quantity,
+                "entry_price": snapshot.entry_price,
+                "stop_price": snapshot.stop_price,
+                "reduce_only_stop_installed": snapshot.reduce_only_stop_installed,
+                "updated_at": snapshot.recorded_at,
+                "closed_at": snapshot.recorded_at if snapshot.closed else None,
+            }
+            if key in existing:
+                updates.append({"id": existing[key], **values})
+            elif not snapshot.closed:
+                inserts.append(
+                    {
+                        "exchange": snapshot.exchange,
+                        "symbol": snapshot.symbol,
+                        "strategy": snapshot.strategy,
+                        "opened_at": snapshot.recorded_at,
+                        **values,
+                    }
+                )
+        if updates:
+            await session.execute(update(Position), updates)
+        if inserts:
+            await session.execute(insert(Position), inserts)
+
+
+def _read_journal(path: Path) -> List[Any]:
+    records: List[Any] = []
+    with path.open("rb") as journal:
+        while True:
+            try:
+                records.append(pickle.load(journal))
+            except EOFError:
+                break
+            except Exception as exc:
+                # A record torn by a crash while it was being appended.
+                logger.error(
+                    "write_behind.journal_truncated", journal=str(path), records=len(records), error=str(exc)
+                )
+                break
+    return records
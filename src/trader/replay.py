@@ -0,0 +1,469 @@
+"""Deterministic offline replay of market data through the trading pipeline.
+
+Recorded ``market_data`` events, or candles imported from OHLCV files, are
+fed through the real :class:`StrategyService`, :class:`RiskService` and
+:class:`ExecutionService` over an in-process :class:`EventBus`. Every venue is
+a :class:`StubExchange` and the database is a throwaway SQLite file, so a run
+needs neither network nor Redis. Each run yields a :class:`ReplayReport` with
+throughput, per-stage latency and signal/approval/order counts.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import itertools
+import json
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import Settings
+from .db import create_schema
+from .events import Event, EventBus
+from .gateway import ExchangeGateway
+from .logging import get_logger
+from .metrics import PIPELINE_STAGES
+from .services.base import BaseService
+from .services.execution_service import ExecutionService
+from .services.risk_service import RiskService
+from .services.strategy_service import StrategyService
+
+
+logger = get_logger(__name__)
+
+#: Pipeline stages first stamped on events of each collected stream, keyed by
+#: the ``RedisStreamsConfig`` field naming the stream.
+STAGE_STREAMS = {
+    "signals": ("strategy",),
+    "approved_signals": ("risk",),
+    "executions": ("submit", "ack"),
+}
+
+
+class StubExchange:
+    """Exchange client that fills every order immediately, without network I/O.
+
+    Stop orders (those with a ``stopPrice``) are accepted and left open.
+    """
+
+    def __init__(self, name: str, *, latency_ms: float = 0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.orders: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    async def create_order(
+        self,
+        symbol: str,
+        type: str,
+        side: str,
+        amount: float,
+        price: Optional[float] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        params = params or {}
+        resting = params.get("stopPrice") is not None
+        order = {
+            "id": f"{self.name}-{next(self._ids)}",
+            "clientOrderId": params.get("clientOrderId"),
+            "symbol": symbol,
+            "type": type,
+            "side": side,
+            "amount": amount,
+            "price": price,
+            "filled": 0.0 if resting else amount,
+            "status": "open" if resting else "closed",
+            "info": {"params": params},
+        }
+        self.orders.append(order)
+        self._by_id[order["id"]] = order
+        return order
+
+    async def fetch_order(self, id: str, symbol: Optional[str] = None, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        return self._by_id[id]
+
+    async def fetch_open_orders(self, symbol: Optional[str] = None, *args: Any, **kwargs: Any) -> List[Any]:
+        return [
+            order
+            for order in self.orders
+            if order["status"] == "open" and (symbol is None or order["symbol"] == symbol)
+        ]
+
+    async def close(self) -> None:
+        pass
+
+
+def read_events(path: str | Path) -> List[Event]:
+    """Load events written by :func:`write_events` (one JSON object per line)."""
+    events = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                data = json.loads(line)
+                events.append(Event(type=data["type"], payload=data["payload"]))
+    return events
+
+
+def write_events(path: str | Path, events: Iterable[Event]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as handle:
+        for event in events:
+            handle.write(_event_line(event))
+            count += 1
+    return count
+
+
+def _event_line(event: Event) -> str:
+    return json.dumps({"type": event.type, "payload": event.payload}, separators=(",", ":")) + "\n"
+
+
+def load_ohlcv(path: str | Path, *, exchange: str, symbol: str, timeframe: str) -> List[Event]:
+    """One ``market_data`` event per candle from a CSV or JSON OHLCV file.
+
+    CSV rows are ``timestamp,open,high,low,close,volume`` with an optional
+    header; JSON files hold a list of such rows (ccxt and Freqtrade format).
+    Timestamps are epoch milliseconds.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with open(path, encoding="utf-8") as handle:
+            rows: Iterable[Sequence[Any]] = json.load(handle)
+    else:
+        with open(path, newline="", encoding="utf-8") as handle:
+            rows = [row for row in csv.reader(handle) if row and _is_number(row[0])]
+    events = []
+    for row in rows:
+        candle = [int(float(row[0])), *(float(value) for value in row[1:6])]
+        events.append(
+            Event(
+                type="market_data",
+                payload={
+                    "exchange": exchange,
+                    "symbol": symbol,
+                    "timeframe": timeframe,
+                    "data": [candle],
+                    "timestamp": datetime.fromtimestamp(candle[0] / 1000, tz=timezone.utc)
+                    .replace(tzinfo=None)
+                    .isoformat(),
+                },
+            )
+        )
+    events.sort(key=_event_time_ms)
+    return events
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+async def record_market_data(
+    bus: EventBus,
+    stream: str,
+    path: str | Path,
+    *,
+    count: Optional[int] = None,
+    duration: Optional[float] = None,
+    from_start: bool = False,
+) -> int:
+    """Append events from ``stream`` to ``path`` until ``count`` or ``duration`` is reached.
+
+    Starts at the current end of the stream unless ``from_start`` is set.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration if duration is not None else None
+    last_id = "0-0" if from_start else await bus.tail_id(stream)
+    written = 0
+    with open(path, "w", encoding="utf-8") as handle:
+        while count is None or written < count:
+            if deadline is not None and loop.time() >= deadline:
+                break
+            batch = await bus.consume_batch(stream, last_id, count=256, block_ms=500)
+            for event, _ in batch[: None if count is None else count - written]:
+                handle.write(_event_line(event))
+                written += 1
+            if batch:
+                last_id = batch[-1][1]
+    logger.info("replay.recorded", stream=stream, events=written, path=str(path))
+    return written
+
+
+def _event_time_ms(event: Event) -> int:
+    data = event.payload.get("data") or [[0]]
+    return int(data[-1][0])
+
+
+def _seq(message_id: Optional[str]) -> int:
+    return int(message_id.partition("-")[0]) if message_id else 0
+
+
+@dataclass(slots=True)
+class ReplayReport:
+    events: int
+    seconds: float
+    signals: int
+    approvals: int
+    orders: int
+    #: ``"<stage>_to_<stage>"`` -> count and p50/p90/p99/max in milliseconds.
+    stage_latency_ms: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "seconds": self.seconds,
+            "events_per_second": self.events_per_second,
+            "signals": self.signals,
+            "approvals": self.approvals,
+            "orders": self.orders,
+            "stage_latency_ms": self.stage_latency_ms,
+        }
+
+    def format(self) -> str:
+        lines = [
+            f"events        {self.events:>10,}",
+            f"seconds       {self.seconds:>10.3f}",
+            f"events/sec    {self.events_per_second:>10,.0f}",
+            f"signals       {self.signals:>10,}",
+            f"approvals     {self.approvals:>10,}",
+            f"orders        {self.orders:>10,}",
+        ]
+        if self.stage_latency_ms:
+            lines.append(f"{'stage':<22} {'count':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+            for stage, stats in self.stage_latency_ms.items():
+                lines.append(
+                    f"{stage:<22} {int(stats['count']):>8,} {stats['p50']:>9.3f} "
+                    f"{stats['p90']:>9.3f} {stats['p99']:>9.3f} {stats['max']:>9.3f}"
+                )
+        return "\n".join(lines)
+
+
+class _StreamCollector:
+    """Follows the pipeline's output streams, counting events and keeping traces."""
+
+    def __init__(self, bus: EventBus, streams: Sequence[str]):
+        self.bus = bus
+        self.cursors: Dict[str, str] = {stream: "0-0" for stream in streams}
+        self.counts: Counter[str] = Counter()
+        self.traces: Dict[str, List[Dict[str, int]]] = {stream: [] for stream in streams}
+        self._stopping = False
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._follow(stream) for stream in self.cursors))
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    async def _follow(self, stream: str) -> None:
+        while not self._stopping:
+            batch = await self.bus.consume_batch(stream, self.cursors[stream], count=256, block_ms=50)
+            for event, _ in batch:
+                self.counts[event.type] += 1
+                if event.trace:
+                    self.traces[stream].append(event.trace)
+            if batch:
+                self.cursors[stream] = batch[-1][1]
+
+
+class ReplayHarness:
+    """Replays events through Strategy, Risk and Execution in one event loop.
+
+    ``speed=None`` publishes as fast as the strategy keeps up, holding at most
+    four consumer batches in flight; ``speed=N`` paces events at N times the
+    rate implied by their candle timestamps.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        *,
+        speed: Optional[float] = None,
+        exchange_latency_ms: float = 0.0,
+        database_url: Optional[str] = None,
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive")
+        self.settings = settings
+        self.speed = speed
+        self.exchange_latency_ms = exchange_latency_ms
+        self.database_url = database_url
+
+    def _replay_settings(self, workdir: str) -> Settings:
+        settings = self.settings.model_copy(deep=True)
+        settings.app.dry_run = False  # orders go to the stub exchanges
+        settings.redis.enabled = False
+        settings.redis.consumer_groups.enabled = False
+        settings.redis.consumer_groups.block_ms = 50
+        settings.sharding.enabled = False
+        # Every event is processed, however far behind a stage falls.
+        settings.redis.backpressure.coalesce_lag_ms = 0
+        settings.redis.backpressure.producer_max_lag = 0
+        settings.execution.order_updates = "poll"  # stubs have no private streams
+        settings.candle_store.enabled = False  # warm state would make runs depend on local files
+        settings.database.engine = "sqlite"
+        settings.database.url = self.database_url or f"sqlite:///{Path(workdir) / 'replay.db'}"
+        return settings
+
+    async def run(self, events: Sequence[Event]) -> ReplayReport:
+        with tempfile.TemporaryDirectory(prefix="trader-replay-") as workdir:
+            return await self._run(self._replay_settings(workdir), events)
+
+    async def _run(self, settings: Settings, events: Sequence[Event]) -> ReplayReport:
+        create_schema(settings)
+        streams = settings.redis.streams
+        # Large enough that nothing is trimmed before every reader has seen it.
+        bus = EventBus(
+            codec=settings.redis.codec,
+            memory_maxlen=max(10_000, len(events) * (len(settings.strategies) + 1)),
+        )
+        await bus.connect()
+
+        venues = {conf["name"] for conf in settings.exchanges}
+        venues.update(event.payload.get("exchange") for event in events)
+        venues.discard(None)
+        clients = {venue: StubExchange(venue, latency_ms=self.exchange_latency_ms) for venue in venues}
+        # Stub round trips are simulated by latency_ms; venue rate limits would only slow the replay.
+        gateway = ExchangeGateway.from_settings(settings, clients=clients, rate_limited=False)
+        strategy = StrategyService(settings, bus=bus)
+        risk = RiskService(settings, bus=bus)
+        execution = ExecutionService(settings, bus=bus, gateway=gateway)
+        services: List[BaseService] = [strategy, risk, execution]
+        # Upstream first: once every hop has caught up with its input in
+        # one pass, nothing is left in flight.
+        hops: List[Tuple[BaseService, str]] = [
+            (strategy, streams.market_data),
+            (risk, streams.signals),
+            (execution, streams.approved_signals),
+            (risk, streams.executions),
+        ]
+        collector = _StreamCollector(bus, [getattr(streams, name) for name in STAGE_STREAMS])
+
+        tasks = [asyncio.create_task(service.start(), name=f"replay-{service.name}") for service in services]
+        collector_task = asyncio.create_task(collector.run(), name="replay-collector")
+        try:
+            while any(service.last_handled_id(stream) is None for service, stream in hops):
+                _raise_if_exited(tasks)
+                await asyncio.sleep(0.01)
+            started = time.perf_counter()
+            await self._publish(bus, streams.market_data, events, strategy, tasks)
+            while not await _drained(bus, hops, collector):
+                _raise_if_exited(tasks)
+                await asyncio.sleep(0.001)
+            seconds = time.perf_counter() - started
+        finally:
+            collector.stop()
+            for service in services:
+                await service.stop()
+            await asyncio.gather(*tasks, collector_task, return_exceptions=True)
+            await gateway.close()
+            await bus.disconnect()
+
+        report = ReplayReport(
+            events=len(events),
+            seconds=seconds,
+            signals=collector.counts["signal"],
+            approvals=collector.counts["approved_signal"],
+            orders=collector.counts["order_submitted"],
+            stage_latency_ms=_stage_latency(
+                {name: collector.traces[getattr(streams, name)] for name in STAGE_STREAMS}
+            ),
+        )
+        logger.info("replay.complete", **report.as_dict())
+        return report
+
+    async def _publish(
+        self,
+        bus: EventBus,
+        stream: str,
+        events: Sequence[Event],
+        strategy: StrategyService,
+        tasks: Sequence[asyncio.Task[None]],
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        window = 4 * self.settings.redis.consumer_groups.batch_size
+        started = loop.time()
+        first_ms = _event_time_ms(events[0]) if events else 0
+        for event in events:
+            if self.speed is not None:
+                delay = (_event_time_ms(event) - first_ms) / 1000 / self.speed - (loop.time() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # Stamp a copy so the same input can be replayed again.
+            await bus.publish(stream, event.derive(event.type, event.payload).stamp("ingest"))
+            published = _seq(await bus.tail_id(stream))
+            while published - _seq(strategy.last_handled_id(stream)) > window:
+                _raise_if_exited(tasks)
+                await asyncio.sleep(0)
+
+
+async def _drained(
+    bus: EventBus,
+    hops: Sequence[Tuple[BaseService, str]],
+    collector: _StreamCollector,
+) -> bool:
+    for service, stream in hops:
+        if service.last_handled_id(stream) != await bus.tail_id(stream):
+            return False
+    for stream, cursor in collector.cursors.items():
+        if cursor != await bus.tail_id(stream):
+            return False
+    return True
+
+
+def _raise_if_exited(tasks: Sequence[asyncio.Task[None]]) -> None:
+    for task in tasks:
+        if task.done():
+            task.result()
+            raise RuntimeError(f"{task.get_name()} exited before the replay finished")
+
+
+def _stage_latency(traces_by_stream: Dict[str, List[Dict[str, int]]]) -> Dict[str, Dict[str, float]]:
+    gaps: Dict[str, List[float]] = {}
+    for name, traces in traces_by_stream.items():
+        for trace in traces:
+            for stage in STAGE_STREAMS[name]:
+                if stage not in trace:
+                    continue
+                previous = _previous_stage(trace, stage)
+                if previous is not None:
+                    gaps.setdefault(f"{previous}_to_{stage}", []).append(
+                        (trace[stage] - trace[previous]) / 1e6
+                    )
+            if name == "executions" and "ingest" in trace and "ack" in trace:
+                gaps.setdefault("end_to_end", []).append((trace["ack"] - trace["ingest"]) / 1e6)
+
+    report: Dict[str, Dict[str, float]] = {}
+    for stage, values in gaps.items():
+        samples = np.asarray(values)
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        report[stage] = {
+            "count": float(samples.size),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": float(samples.max()),
+        }
+    return report
+
+
+def _previous_stage(trace: Dict[str, int], stage: str) -> Optional[str]:
+    index = PIPELINE_STAGES.index(stage)
+    for previous in reversed(PIPELINE_STAGES[:index]):
+        if previous in trace:
+            return previous
+    return None
@@ -2,40 +2,82 @@ from __future__ import annotations
 
 import abc
 import asyncio
-from typing import Optional
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from ..config import Settings
-from ..events import EventBus
+from ..events import CoalesceKey, CoalesceMerge, Event, EventBus, coalesce_events
 from ..logging import get_logger
 
 
 logger = get_logger(__name__)
 
+EventHandler = Callable[[Event], Awaitable[None]]
+BatchEventHandler = Callable[[List[Event]], Awaitable[None]]
+Dispatcher = Callable[[str, List[Tuple[Event, str]], Any], Awaitable[List[str]]]
+
 
 class BaseService(abc.ABC):
     """Shared lifecycle helpers for asynchronous services."""
 
+    #: Short service name, also used as the Redis consumer group name.
+    name: str = "service"
+
     def __init__(
         self,
         settings: Settings,
         *,
         redis_url: Optional[str] = None,
+        bus: Optional[EventBus] = None,
     ):
         self.settings = settings
         self.redis_url = redis_url or settings.redis.url
-        self._bus = EventBus(redis_url=self.redis_url if settings.redis.enabled else None)
+        # A bus passed in is shared with other services; whoever created it
+        # is responsible for disconnecting it.
+        self._owns_bus = bus is None
+        self._bus = bus or EventBus(
+            redis_url=self.redis_url if settings.redis.enabled else None,
+            codec=settings.redis.codec,
+            stream_maxlen=settings.redis.backpressure.stream_maxlen,
+        )
         self._stopping = asyncio.Event()
+        self._last_ids: Dict[str, str] = {}
+        group_conf = settings.redis.consumer_groups
+        self.consumer_name = group_conf.consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+        #: ``time.perf_counter()`` when the launch began; the launcher may set it earlier than construction.
+        self.launched_at = time.perf_counter()
+        #: Seconds spent per startup phase: ``import`` (set by the launcher),
+        #: ``connect`` (:meth:`setup`) and ``ready`` (launch until :meth:`run`).
+        self.startup_phases: Dict[str, float] = {}
 
     async def setup(self) -> None:
         await self._bus.connect()
         logger.info("%s.setup_complete", self.__class__.__name__)
 
     async def start(self) -> None:
+        connecting = time.perf_counter()
         await self.setup()
+        ready = time.perf_counter()
+        self.startup_phases["connect"] = ready - connecting
+        self.startup_phases["ready"] = ready - self.launched_at
+        logger.info(
+            "service.startup",
+            service=self.name,
+            **{f"{phase}_ms": round(seconds * 1000, 1) for phase, seconds in self.startup_phases.items()},
+        )
         try:
             await self.run()
         finally:
-            await self._bus.disconnect()
+            try:
+                await self.teardown()
+            finally:
+                if self._owns_bus:
+                    await self._bus.disconnect()
+
+    async def teardown(self) -> None:
+        """Release service resources once ``run`` has returned or failed."""
 
     async def stop(self) -> None:
         self._stopping.set()
@@ -44,6 +86,21 @@ class BaseService(abc.ABC):
     def is_stopping(self) -> bool:
         return self._stopping.is_set()
 
+    async def sleep(self, seconds: float) -> None:
+        """Sleep for ``seconds``, waking early once the service is stopping."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def last_handled_id(self, stream: str) -> Optional[str]:
+        """Id of the last ``stream`` entry this service finished handling.
+
+        Only tracked for streams read without a consumer group; ``None``
+        until the service has started reading ``stream``.
+        """
+        return self._last_ids.get(stream)
+
     @property
     def bus(self) -> EventBus:
         return self._bus
@@ -51,3 +108,201 @@ class BaseService(abc.ABC):
     @abc.abstractmethod
     async def run(self) -> None:
         ...
+
+    async def consume_stream(
+        self,
+        stream: str,
+        handler: EventHandler | BatchEventHandler,
+        *,
+        start_id: str = "0-0",
+        broadcast: bool = False,
+        batched: bool = False,
+        group: Optional[bool] = None,
+        stop: Optional[asyncio.Event] = None,
+        coalesce: Optional[CoalesceKey] = None,
+        merge: Optional[CoalesceMerge] = None,
+    ) -> None:
+        """Dispatch batches from ``stream`` to ``handler`` until the service stops.
+
+        Uses a consumer group named after the service when
+        ``redis.consumer_groups.enabled`` is set, otherwise plain batched
+        ``XREAD`` with an in-memory cursor starting at ``start_id``.
+        ``broadcast`` streams are always read with ``XREAD`` so every replica
+        of the service sees every event. ``group`` forces either mode
+        regardless of configuration. With ``batched`` the handler is called
+        once per batch with the list of events instead of per event. Setting
+        ``stop`` ends consumption of this stream after the current batch.
+
+        With a ``coalesce`` key, a batch whose oldest event is older than
+        ``redis.backpressure.coalesce_lag_ms`` keeps only the newest event
+        per key (see :func:`coalesce_events`), and reads grow to
+        ``coalesce_batch_size`` until the service has caught up.
+        """
+        group_conf = self.settings.redis.consumer_groups
+        dispatch: Dispatcher = self._dispatch_batch if batched else self._dispatch
+        stop = stop or self._stopping
+        use_group = group if group is not None else group_conf.enabled and not broadcast
+        if use_group:
+            await self._consume_group(stream, handler, dispatch, stop, coalesce, merge)
+            return
+        if stream not in self._last_ids:
+            self._last_ids[stream] = await self.bus.tail_id(stream) if start_id == "$" else start_id
+        last_id = self._last_ids[stream]
+        count = group_conf.batch_size
+        while not (self.is_stopping or stop.is_set()):
+            batch = await self.bus.consume_batch(
+                stream,
+                last_id,
+                count=count,
+                block_ms=group_conf.block_ms,
+            )
+            next_id = batch[-1][1] if batch else None
+            batch, _, count = await self._coalesce(stream, batch, coalesce, merge)
+            await dispatch(stream, batch, handler)
+            if next_id:
+                last_id = self._last_ids[stream] = next_id
+
+    async def _consume_group(
+        self,
+        stream: str,
+        handler: Any,
+        dispatch: Dispatcher,
+        stop: asyncio.Event,
+        coalesce: Optional[CoalesceKey] = None,
+        merge: Optional[CoalesceMerge] = None,
+    ) -> None:
+        group_conf = self.settings.redis.consumer_groups
+        group = self.name
+        await self.bus.ensure_group(stream, group)
+
+        # Entries delivered to this consumer before a restart come first.
+        while not (self.is_stopping or stop.is_set()):
+            pending = await self.bus.consume_group(
+                stream, group, self.consumer_name, count=group_conf.batch_size, pending=True
+            )
+            if not pending:
+                break
+            handled = await dispatch(stream, pending, handler)
+            await self.bus.ack(stream, group, handled)
+            if len(handled) < len(pending):
+                break
+
+        next_reclaim = time.monotonic()
+        count = group_conf.batch_size
+        while not (self.is_stopping or stop.is_set()):
+            if time.monotonic() >= next_reclaim:
+                next_reclaim = time.monotonic() + group_conf.reclaim_interval_seconds
+                claimed = await self.bus.reclaim(
+                    stream,
+                    group,
+                    self.consumer_name,
+                    min_idle_ms=group_conf.reclaim_idle_ms,
+                    count=group_conf.batch_size,
+                )
+                if claimed:
+                    logger.warning(
+                        "%s.reclaimed_pending",
+                        self.__class__.__name__,
+                        stream=stream,
+                        count=len(claimed),
+                    )
+                    await self.bus.ack(stream, group, await dispatch(stream, claimed, handler))
+
+            batch = await self.bus.consume_group(
+                stream,
+                group,
+                self.consumer_name,
+                count=count,
+                block_ms=group_conf.block_ms,
+            )
+            batch, folded, count = await self._coalesce(stream, batch, coalesce, merge)
+            handled = await dispatch(stream, batch, handler)
+            for message_id in list(handled):
+                handled.extend(folded.get(message_id, ()))
+            await self.bus.ack(stream, group, handled)
+
+    async def _coalesce(
+        self,
+        stream: str,
+        batch: List[Tuple[Event, str]],
+        coalesce: Optional[CoalesceKey],
+        merge: Optional[CoalesceMerge],
+    ) -> Tuple[List[Tuple[Event, str]], Dict[str, List[str]], int]:
+        """Coalesce ``batch`` if this service is lagging behind ``stream``.
+
+        Returns the entries to dispatch, the ids folded into each of them and
+        how many entries to read next.
+        """
+        group_conf = self.settings.redis.consumer_groups
+        backpressure = self.settings.redis.backpressure
+        if coalesce is None or not backpressure.coalesce_lag_ms or not batch:
+            return batch, {}, group_conf.batch_size
+        stamped_ns = batch[0][0].stamped_ns
+        age_ms = (time.time_ns() - stamped_ns) / 1e6 if stamped_ns is not None else 0.0
+        if age_ms <= backpressure.coalesce_lag_ms:
+            return batch, {}, group_conf.batch_size
+
+        kept, folded = coalesce_events(batch, coalesce, merge)
+        dropped = len(batch) - len(kept)
+        if dropped:
+            await self.bus.record_coalesced(stream, self.name, batches=1, dropped=dropped)
+            logger.info(
+                "%s.coalesced",
+                self.__class__.__name__,
+                stream=stream,
+                events=len(batch),
+                kept=len(kept),
+                lag_ms=round(age_ms, 1),
+            )
+        return kept, folded, backpressure.coalesce_batch_size
+
+    async def _dispatch(
+        self,
+        stream: str,
+        batch: List[Tuple[Event, str]],
+        handler: EventHandler,
+    ) -> List[str]:
+        """Run ``handler`` over ``batch`` and return the ids that were handled.
+
+        A failing event is logged and left unacknowledged so it can be
+        reclaimed, instead of taking the whole service down.
+        """
+        handled: List[str] = []
+        for event, message_id in batch:
+            try:
+                await handler(event)
+            except Exception as exc:
+                logger.error(
+                    "%s.handler_failed",
+                    self.__class__.__name__,
+                    stream=stream,
+                    message_id=message_id,
+                    event_type=event.type,
+                    error=str(exc),
+                )
+                continue
+            handled.append(message_id)
+        return handled
+
+    async def _dispatch_batch(
+        self,
+        stream: str,
+        batch: List[Tuple[Event, str]],
+        handler: BatchEventHandler,
+    ) -> List[str]:
+        """Run ``handler`` over the whole of ``batch``; all ids or none are handled."""
+        if not batch:
+            return []
+        try:
+            await handler([event for event, _ in batch])
+        except Exception as exc:
+            logger.error(
+                "%s.handler_failed",
+                self.__class__.__name__,
+                stream=stream,
+                first_message_id=batch[0][1],
+                events=len(batch),
+                error=str(exc),
+            )
+            return []
+        return [message_id for _, message_id in batch]
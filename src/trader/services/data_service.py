@@ -1,83 +1,191 @@
 from __future__ import annotations
 
 import asyncio
+import time
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import ccxt.async_support as ccxt_async  # type: ignore
+import ccxt.pro as ccxt_pro  # type: ignore
 
+from ..candles import CandleStore
 from ..config import Settings
-from ..events import Event
+from ..events import Event, EventBus, PublishThrottle
+from ..gateway import ExchangeGateway, Priority, client_config
 from ..logging import get_logger
+from ..sharding import partition_for, partition_stream
 from .base import BaseService
 
 
 logger = get_logger(__name__)
 
+INGEST_MODES = ("auto", "stream", "poll")
+
 
 class DataService(BaseService):
-    """Fetches market data from configured exchanges and publishes to Redis Streams."""
+    """Fetches market data from configured exchanges and publishes to Redis Streams.
+
+    Exchanges whose ccxt.pro client supports ``watch_ohlcv`` (or
+    ``watch_trades``) are streamed over WebSocket; the rest are polled over
+    REST with all symbols of a venue fetched concurrently. Only candles that
+    are new or changed since the last publish are emitted.
+
+    Published candles are also written to the :class:`CandleStore`, which
+    StrategyService hydrates from at startup. When the store is behind the
+    exchange, the missing history is fetched over REST before live ingest
+    starts. REST calls go through the :class:`ExchangeGateway` at data
+    priority. The lag between a candle closing and its observation here is
+    published per symbol as an ``ingest_lag`` event.
+    """
 
-    def __init__(self, settings: Settings, poll_interval: float = 60.0):
-        super().__init__(settings)
+    name = "data"
+
+    def __init__(
+        self,
+        settings: Settings,
+        poll_interval: float = 60.0,
+        *,
+        bus: Optional[EventBus] = None,
+        gateway: Optional[ExchangeGateway] = None,
+    ):
+        super().__init__(settings, bus=bus)
         self.poll_interval = poll_interval
+        self._owns_gateway = gateway is None
+        self._gateway = gateway or ExchangeGateway.from_settings(settings)
         self._clients: Dict[str, Any] = {}
+        self._stream_clients: Dict[str, Any] = {}
+        self._last_candles: Dict[Tuple[str, str], List[float]] = {}
+        #: Milliseconds between a candle closing and this service observing it.
+        self.ingest_lag_ms: Dict[Tuple[str, str], float] = {}
+        store_conf = settings.candle_store
+        self._store = CandleStore(store_conf.path) if store_conf.enabled else None
+        backpressure = settings.redis.backpressure
+        self._throttle = (
+            PublishThrottle(
+                self.bus,
+                max_lag=backpressure.producer_max_lag,
+                max_wait_ms=backpressure.producer_max_wait_ms,
+            )
+            if backpressure.producer_max_lag
+            else None
+        )
 
     async def setup(self) -> None:
         await super().setup()
+        await self._gateway.open()
         for exchange_conf in self.settings.exchanges:
             module = exchange_conf.get("module", "ccxt.binanceusdm")
-            client_cls = getattr(ccxt_async, module.split(".")[-1])
-            client = client_cls(
-                {
-                    "apiKey": exchange_conf.get("api_key"),
-                    "secret": exchange_conf.get("api_secret"),
-                    "enableRateLimit": True,
-                }
-            )
-            if exchange_conf.get("sandbox"):
-                if hasattr(client, "set_sandbox_mode"):
-                    client.set_sandbox_mode(True)
-            self._clients[exchange_conf["name"]] = client
+            cls_name = module.split(".")[-1]
+            self._clients[exchange_conf["name"]] = self._gateway.client(exchange_conf["name"], Priority.DATA)
+
+            mode = exchange_conf.get("ingest_mode", "auto")
+            if mode not in INGEST_MODES:
+                raise ValueError(f"ingest_mode must be one of {INGEST_MODES}, got {mode!r}")
+            stream_client = None
+            if mode != "poll" and hasattr(ccxt_pro, cls_name):
+                stream_client = getattr(ccxt_pro, cls_name)(client_config(exchange_conf))
+                if exchange_conf.get("sandbox") and hasattr(stream_client, "set_sandbox_mode"):
+                    stream_client.set_sandbox_mode(True)
+                if not (stream_client.has.get("watchOHLCV") or stream_client.has.get("watchTrades")):
+                    await stream_client.close()
+                    stream_client = None
+            if stream_client is not None:
+                self._stream_clients[exchange_conf["name"]] = stream_client
+            elif mode == "stream":
+                raise ValueError(f"Exchange {exchange_conf['name']} does not support WebSocket OHLCV or trades.")
             logger.info(
                 "data_service.exchange_initialized",
                 exchange=exchange_conf["name"],
                 module=module,
+                ingest="stream" if stream_client is not None else "poll",
             )
 
     async def run(self) -> None:
-        while not self.is_stopping:
-            await self._poll_once()
-            await asyncio.sleep(self.poll_interval)
-
-    async def _poll_once(self) -> None:
-        streams = self.settings.redis.streams
+        if self._store is not None:
+            await asyncio.gather(
+                *(self._backfill_exchange(exchange_conf) for exchange_conf in self.settings.exchanges)
+            )
+        tasks = []
         for exchange_conf in self.settings.exchanges:
             exchange_name = exchange_conf["name"]
-            symbols = exchange_conf.get("symbols", [])
-            client = self._clients.get(exchange_name)
-            if not client:
-                continue
-            for symbol in symbols:
+            if exchange_name in self._stream_clients:
+                tasks.extend(
+                    self._watch_symbol(exchange_conf, symbol) for symbol in exchange_conf.get("symbols", [])
+                )
+            elif exchange_name in self._clients:
+                tasks.append(self._poll_exchange(exchange_conf))
+        await asyncio.gather(*tasks)
+
+    async def _backfill_exchange(self, exchange_conf: Dict[str, Any]) -> None:
+        limit = asyncio.Semaphore(int(exchange_conf.get("max_concurrency", 5)))
+        await asyncio.gather(
+            *(self._backfill(exchange_conf, symbol, limit) for symbol in exchange_conf.get("symbols", []))
+        )
+
+    async def _backfill(self, exchange_conf: Dict[str, Any], symbol: str, limit: asyncio.Semaphore) -> None:
+        """Fetch REST history for closed candles the store is missing."""
+        assert self._store is not None
+        exchange_name = exchange_conf["name"]
+        client = self._clients.get(exchange_name)
+        if not client:
+            return
+        store_conf = self.settings.candle_store
+        timeframe = exchange_conf.get("timeframe", "1m")
+        timeframe_ms = ccxt_async.Exchange.parse_timeframe(timeframe) * 1000
+        now_ms = int(time.time() * 1000)
+        last = self._store.last_timestamp(exchange_name, symbol, timeframe)
+        if last is not None and now_ms - last < 2 * timeframe_ms:
+            return  # only the forming candle is missing; live ingest covers it
+        # The last stored candle may have been stored while still forming.
+        since = last if last is not None else now_ms - store_conf.warmup_candles * timeframe_ms
+        fetched = 0
+        while not self.is_stopping:
+            async with limit:
                 try:
-                    ohlcv = await client.fetch_ohlcv(symbol, timeframe="1m", limit=2)
-                    event = Event(
-                        type="market_data",
-                        payload={
-                            "exchange": exchange_name,
-                            "symbol": symbol,
-                            "timeframe": "1m",
-                            "data": ohlcv,
-                            "timestamp": datetime.utcnow().isoformat(),
-                        },
+                    ohlcv = await client.fetch_ohlcv(
+                        symbol, timeframe=timeframe, since=since, limit=store_conf.backfill_page_size
                     )
-                    await self.bus.publish(streams.market_data, event)
-                    logger.info(
-                        "data_service.published",
+                except Exception as exc:
+                    logger.error(
+                        "data_service.backfill_failed",
                         exchange=exchange_name,
                         symbol=symbol,
-                        points=len(ohlcv),
+                        since=since,
+                        error=str(exc),
                     )
+                    return
+            if not ohlcv:
+                break
+            await self._publish_candles(exchange_name, symbol, timeframe, ohlcv)
+            fetched += len(ohlcv)
+            if ohlcv[-1][0] <= since or ohlcv[-1][0] >= now_ms - timeframe_ms:
+                break
+            since = ohlcv[-1][0]
+        logger.info(
+            "data_service.backfilled",
+            exchange=exchange_name,
+            symbol=symbol,
+            timeframe=timeframe,
+            candles=fetched,
+        )
+
+    async def _poll_exchange(self, exchange_conf: Dict[str, Any]) -> None:
+        limit = asyncio.Semaphore(int(exchange_conf.get("max_concurrency", 5)))
+        while not self.is_stopping:
+            await self._poll_once(exchange_conf, limit)
+            await self.sleep(self.poll_interval)
+
+    async def _poll_once(self, exchange_conf: Dict[str, Any], limit: asyncio.Semaphore) -> None:
+        exchange_name = exchange_conf["name"]
+        client = self._clients.get(exchange_name)
+        if not client:
+            return
+        timeframe = exchange_conf.get("timeframe", "1m")
+
+        async def fetch(symbol: str) -> None:
+            async with limit:
+                try:
+                    ohlcv = await client.fetch_ohlcv(symbol, timeframe=timeframe, limit=2)
                 except Exception as exc:
                     logger.error(
                         "data_service.fetch_failed",
@@ -85,10 +193,150 @@ class DataService(BaseService):
                         symbol=symbol,
                         error=str(exc),
                     )
+                    return
+            await self._publish_candles(exchange_name, symbol, timeframe, ohlcv)
+
+        await asyncio.gather(*(fetch(symbol) for symbol in exchange_conf.get("symbols", [])))
+
+    async def _watch_symbol(self, exchange_conf: Dict[str, Any], symbol: str) -> None:
+        exchange_name = exchange_conf["name"]
+        client = self._stream_clients[exchange_name]
+        timeframe = exchange_conf.get("timeframe", "1m")
+        backoff = 1.0
+        while not self.is_stopping:
+            try:
+                if client.has.get("watchOHLCV"):
+                    ohlcv = await client.watch_ohlcv(symbol, timeframe, limit=2)
+                else:
+                    trades = await client.watch_trades(symbol, limit=1_000)
+                    ohlcv = [candle[:6] for candle in client.build_ohlcvc(trades, timeframe)]
+                backoff = 1.0
+            except Exception as exc:
+                logger.error(
+                    "data_service.watch_failed",
+                    exchange=exchange_name,
+                    symbol=symbol,
+                    error=str(exc),
+                    retry_in=backoff,
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.poll_interval)
+                continue
+            await self._publish_candles(exchange_name, symbol, timeframe, ohlcv[-2:])
+
+    def _changed_candles(self, key: Tuple[str, str], ohlcv: Sequence[Sequence[float]]) -> List[List[float]]:
+        """Return candles that are new or differ from the last published one."""
+        last = self._last_candles.get(key)
+        changed = []
+        for candle in ohlcv:
+            candle = list(candle)
+            if last is not None and (candle[0] < last[0] or candle == last):
+                continue
+            changed.append(candle)
+            last = candle
+        return changed
+
+    async def _publish_candles(
+        self,
+        exchange_name: str,
+        symbol: str,
+        timeframe: str,
+        ohlcv: Sequence[Sequence[float]],
+    ) -> None:
+        key = (exchange_name, symbol)
+        previous = self._last_candles.get(key)
+        changed = self._changed_candles(key, ohlcv)
+        if not changed:
+            return
+        closed = previous is not None and changed[-1][0] > previous[0]
+        if closed:
+            # A newer candle proves the previous one has closed.
+            close_time_ms = previous[0] + ccxt_async.Exchange.parse_timeframe(timeframe) * 1000
+            self.ingest_lag_ms[key] = max(0.0, time.time() * 1000 - close_time_ms)
+
+        if self._store is not None:
+            try:
+                self._store.append(exchange_name, symbol, timeframe, changed)
+            except OSError as exc:
+                logger.error(
+                    "data_service.store_failed",
+                    exchange=exchange_name,
+                    symbol=symbol,
+                    error=str(exc),
+                )
+
+        event = Event(
+            type="market_data",
+            payload={
+                "exchange": exchange_name,
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "data": changed,
+                "timestamp": datetime.utcnow().isoformat(),
+            },
+        ).stamp("ingest")
+        stream = self.settings.redis.streams.market_data
+        sharding = self.settings.sharding
+        if sharding.enabled:
+            stream = partition_stream(stream, partition_for(exchange_name, symbol, sharding.partitions))
+        try:
+            if self._throttle is not None:
+                waited = await self._throttle.wait(stream)
+                if waited:
+                    logger.warning(
+                        "data_service.throttled",
+                        exchange=exchange_name,
+                        symbol=symbol,
+                        waited_ms=round(waited * 1000, 1),
+                    )
+            await self.bus.publish(stream, event)
+        except Exception as exc:
+            logger.error(
+                "data_service.publish_failed",
+                exchange=exchange_name,
+                symbol=symbol,
+                error=str(exc),
+            )
+            return
+        self._last_candles[key] = changed[-1]
+        logger.info(
+            "data_service.published",
+            exchange=exchange_name,
+            symbol=symbol,
+            points=len(changed),
+            ingest_lag_ms=self.ingest_lag_ms.get(key),
+        )
+        if closed:
+            await self._publish_ingest_lag(exchange_name, symbol, timeframe, self.ingest_lag_ms[key])
+
+    async def _publish_ingest_lag(self, exchange_name: str, symbol: str, timeframe: str, lag_ms: float) -> None:
+        # MonitorService exports the lag as trader_ingest_lag_seconds.
+        event = Event(
+            type="ingest_lag",
+            payload={
+                "exchange": exchange_name,
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "lag_seconds": lag_ms / 1000,
+            },
+        )
+        try:
+            await self.bus.publish(self.settings.redis.streams.ingest, event)
+        except Exception as exc:
+            logger.error(
+                "data_service.ingest_lag_publish_failed",
+                exchange=exchange_name,
+                symbol=symbol,
+                error=str(exc),
+            )
+
+    async def teardown(self) -> None:
+        if self._owns_gateway:
+            await self._gateway.close()
 
     async def stop(self) -> None:
         await super().stop()
-        for client in self._clients.values():
+        for client in self._stream_clients.values():
             try:
                 await client.close()
             except Exception:
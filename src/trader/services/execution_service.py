@@ -1,63 +1,190 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import ccxt.async_support as ccxt_async  # type: ignore
+from sqlalchemy import select
 
 from ..config import Settings
-from ..db import create_session_factory, session_scope
-from ..events import Event
+from ..db import async_session_scope, create_async_session_factory
+from ..events import Event, EventBus
+from ..gateway import ExchangeGateway, Priority, client_config
+from ..ledger import position_payload
 from ..logging import get_logger
-from ..models import Order, OrderSide, OrderStatus, OrderType, Position
-from ..utils import make_client_order_id, utc_now
+from ..models import TERMINAL_ORDER_STATUSES, OrderSide, OrderStatus, OrderType, Position
+from ..persistence import OrderUpdate, PositionUpsert, WriteBehindWriter
+from ..utils import make_client_order_id
 from .base import BaseService
 
 
 logger = get_logger(__name__)
 
+#: Trades of orders not (yet) tracked kept per venue, for reports that beat the create_order response.
+_UNMATCHED_TRADES = 1_000
+
+
+def order_status(report: Dict[str, Any]) -> OrderStatus:
+    """Map a ccxt order structure to an :class:`OrderStatus`."""
+    status = report.get("status")
+    if status == "closed":
+        return OrderStatus.FILLED
+    if status in ("canceled", "cancelled", "expired"):
+        return OrderStatus.CANCELED
+    if status == "rejected":
+        return OrderStatus.REJECTED
+    return OrderStatus.PARTIALLY_FILLED if float(report.get("filled") or 0.0) > 0 else OrderStatus.PENDING
+
+
+@dataclass(slots=True)
+class _LiveOrder:
+    """An order submitted by this service that has not reached a terminal status."""
+
+    client_order_id: str
+    exchange: str
+    symbol: str
+    strategy: str
+    side: OrderSide
+    quantity: float
+    price: Optional[float]
+    #: Distance of the stop to install per fill; None for the stops themselves.
+    stop_distance: Optional[float]
+    external_order_id: Optional[str] = None
+    status: OrderStatus = OrderStatus.PENDING
+    filled: float = 0.0
+    average: Optional[float] = None
+    #: False until the order row is queued; reports arriving earlier wait in ``early_report``.
+    recorded: bool = False
+    early_report: Optional[Dict[str, Any]] = None
+    trade_ids: Set[str] = field(default_factory=set)
+    trade_filled: float = 0.0
+    trade_cost: float = 0.0
+
 
 class ExecutionService(BaseService):
-    """Submits exchange orders with idempotent IDs and installs server-side stops."""
+    """Submits exchange orders with idempotent IDs and installs server-side stops.
 
-    def __init__(self, settings: Settings):
-        super().__init__(settings)
-        self._last_id = "0-0"
-        self._session_factory = create_session_factory(settings)
+    Order and position records go through a :class:`WriteBehindWriter`, so
+    the submit path never waits on the database; open positions are kept in
+    memory and persisted as snapshots; positions that reconciliation closes
+    are dropped from memory. Orders go through the
+    :class:`ExchangeGateway` at the highest priority.
+
+    Submitted orders are tracked until they are filled, canceled or
+    rejected. Exchange reports come from the ccxt.pro private streams
+    (``watch_orders``, else ``watch_my_trades``) where the venue has them,
+    and from REST ``fetch_order`` polling otherwise or while a stream is
+    down. Each change of status or filled quantity updates the order
+    record and is published as an ``order_update`` event, and a reduce-only
+    stop is installed for every quantity actually filled.
+    """
+
+    name = "execution"
+
+    def __init__(
+        self,
+        settings: Settings,
+        *,
+        bus: Optional[EventBus] = None,
+        gateway: Optional[ExchangeGateway] = None,
+    ):
+        super().__init__(settings, bus=bus)
+        self._owns_gateway = gateway is None
+        self._gateway = gateway or ExchangeGateway.from_settings(settings)
         self._clients: Dict[str, Any] = {}
+        self._poll_clients: Dict[str, Any] = {}
+        self._stream_clients: Dict[str, Any] = {}
+        self._writer: Optional[WriteBehindWriter] = None
+        self._positions: Dict[Tuple[str, str, str], PositionUpsert] = {}
+        self._orders: Dict[str, _LiveOrder] = {}
+        self._external_ids: Dict[Tuple[str, str], str] = {}
+        self._unmatched_trades: Dict[str, "OrderedDict[str, List[Dict[str, Any]]]"] = {}
 
     async def setup(self) -> None:
         await super().setup()
-        for exchange_conf in self.settings.exchanges:
-            module = exchange_conf.get("module", "ccxt.binanceusdm")
-            cls_name = module.split(".")[-1]
-            client_cls = getattr(ccxt_async, cls_name)
-            client = client_cls(
-                {
-                    "apiKey": exchange_conf.get("api_key"),
-                    "secret": exchange_conf.get("api_secret"),
-                    "enableRateLimit": True,
-                }
-            )
-            if exchange_conf.get("sandbox"):
-                if hasattr(client, "set_sandbox_mode"):
-                    client.set_sandbox_mode(True)
-            self._clients[exchange_conf["name"]] = client
+        session_factory = create_async_session_factory(self.settings)
+        self._writer = WriteBehindWriter(
+            session_factory,
+            max_batch=self.settings.database.write_batch_size,
+            max_latency=self.settings.database.write_max_latency_ms / 1000,
+            max_attempts=self.settings.database.write_max_attempts,
+            close_timeout=self.settings.database.write_close_timeout_seconds,
+            journal_path=self.settings.database.write_journal_path,
+        )
+        # Records the previous run could not write land before positions are loaded.
+        await self._writer.replay_journal()
+        async with async_session_scope(session_factory) as session:
+            result = await session.scalars(select(Position).where(Position.closed_at.is_(None)))
+            for position in result:
+                snapshot = PositionUpsert(
+                    exchange=position.exchange,
+                    symbol=position.symbol,
+                    strategy=position.strategy,
+                    quantity=position.quantity,
+                    entry_price=position.entry_price,
+                    stop_price=position.stop_price,
+                    reduce_only_stop_installed=position.reduce_only_stop_installed,
+                )
+                self._positions[snapshot.key] = snapshot
+        self._writer.start()
+        await self._gateway.open()
+        configs = {conf["name"]: conf for conf in self.settings.exchanges}
+        mode = self.settings.execution.order_updates
+        for venue in self._gateway.venues:
+            self._clients[venue] = self._gateway.client(venue, Priority.ORDER)
+            self._poll_clients[venue] = self._gateway.client(venue, Priority.RECONCILE)
+            stream_client = None
+            if venue in configs and mode != "poll" and not self.settings.app.dry_run:
+                stream_client = await self._private_stream_client(configs[venue])
+                if stream_client is None and mode == "stream":
+                    raise ValueError(f"Exchange {venue} does not support WebSocket order or trade updates.")
+            if stream_client is not None:
+                self._stream_clients[venue] = stream_client
             logger.info(
                 "execution_service.exchange_initialized",
-                exchange=exchange_conf["name"],
-                module=module,
+                exchange=venue,
+                order_updates="stream" if stream_client is not None else "poll",
             )
 
+    @staticmethod
+    async def _private_stream_client(exchange_conf: Dict[str, Any]) -> Any:
+        import ccxt.pro as ccxt_pro  # type: ignore  # deferred: only live trading streams
+
+        cls_name = exchange_conf.get("module", "ccxt.binanceusdm").split(".")[-1]
+        if not hasattr(ccxt_pro, cls_name):
+            return None
+        client = getattr(ccxt_pro, cls_name)(client_config(exchange_conf))
+        if exchange_conf.get("sandbox") and hasattr(client, "set_sandbox_mode"):
+            client.set_sandbox_mode(True)
+        if not (client.has.get("watchOrders") or client.has.get("watchMyTrades")):
+            await client.close()
+            return None
+        return client
+
     async def run(self) -> None:
-        stream = self.settings.redis.streams.approved_signals
-        while not self.is_stopping:
-            try:
-                event, message_id = await self.bus.consume(stream, self._last_id)
-                self._last_id = message_id
-                await self._handle_signal(event)
-            except asyncio.TimeoutError:
-                continue
+        streams = self.settings.redis.streams
+        tasks = [
+            self.consume_stream(streams.approved_signals, self._handle_signal),
+            self.consume_stream(streams.reconciliations, self._handle_reconciliation, start_id="$", broadcast=True),
+        ]
+        if not self.settings.app.dry_run:
+            tasks.extend(self._track_orders(venue) for venue in self._clients)
+        await asyncio.gather(*tasks)
+
+    async def _handle_reconciliation(self, event: Event) -> None:
+        """Forget a position that reconciliation closed, so the next fill opens a fresh one."""
+        payload = event.payload
+        if event.type != "position_update" or not payload.get("closed"):
+            return
+        key = (payload.get("exchange"), payload.get("symbol"), payload.get("strategy"))
+        if self._positions.pop(key, None) is not None:
+            logger.info(
+                "execution_service.position_closed_by_reconciliation",
+                exchange=key[0],
+                symbol=key[1],
+                strategy=key[2],
+            )
 
     async def _handle_signal(self, event: Event) -> None:
         payload = event.payload
@@ -92,8 +219,11 @@ class ExecutionService(BaseService):
                 "clientOrderId": client_order_id,
             },
         }
+        # Stamp a copy: the in-memory bus hands the same object to every consumer.
+        tracked = event.derive(event.type, payload).stamp("submit")
         if self.settings.app.dry_run:
             logger.info("execution_service.dry_run_order", order=order_request)
+            tracked.stamp("ack")
             await self._record_order(
                 client_order_id=client_order_id,
                 exchange=exchange_name,
@@ -107,10 +237,24 @@ class ExecutionService(BaseService):
                 raw_response={"status": "dry_run"},
                 status=OrderStatus.NEW,
             )
+            await self._publish_order_submitted(tracked, order_request, OrderStatus.NEW)
             return
 
+        order = _LiveOrder(
+            client_order_id=client_order_id,
+            exchange=exchange_name,
+            symbol=symbol,
+            strategy=strategy,
+            side=side,
+            quantity=position_size,
+            price=price,
+            stop_distance=stop_distance,
+        )
+        # Tracked before submission: a private stream can report the order before create_order returns.
+        self._orders[client_order_id] = order
         try:
             response = await client.create_order(**order_request)
+            tracked.stamp("ack")
             await self._record_order(
                 client_order_id=client_order_id,
                 exchange=exchange_name,
@@ -124,17 +268,11 @@ class ExecutionService(BaseService):
                 raw_response=response,
                 status=OrderStatus.PENDING,
             )
-            await self._install_stop(
-                client=client,
-                strategy=strategy,
-                exchange=exchange_name,
-                symbol=symbol,
-                side=side,
-                entry_price=price,
-                stop_distance=stop_distance,
-                position_size=position_size,
-            )
+            await self._publish_order_submitted(tracked, order_request, OrderStatus.PENDING)
+            await self._order_recorded(order, response)
         except Exception as exc:
+            if not order.recorded:
+                self._forget_order(order)
             logger.error(
                 "execution_service.order_failed",
                 exchange=exchange_name,
@@ -142,26 +280,235 @@ class ExecutionService(BaseService):
                 error=str(exc),
             )
 
-    async def _install_stop(
+    async def _publish_order_submitted(
         self,
-        client: Any,
-        *,
-        strategy: str,
-        exchange: str,
-        symbol: str,
-        side: OrderSide,
-        entry_price: float,
-        stop_distance: float,
-        position_size: float,
+        signal: Event,
+        order_request: Dict[str, Any],
+        status: OrderStatus,
     ) -> None:
+        payload = {
+            "client_order_id": order_request["params"]["clientOrderId"],
+            "exchange": signal.payload.get("exchange"),
+            "strategy": signal.payload.get("strategy"),
+            "symbol": order_request["symbol"],
+            "side": order_request["side"],
+            "quantity": order_request["amount"],
+            "price": order_request["price"],
+            "status": status.value,
+            "dry_run": self.settings.app.dry_run,
+        }
+        await self.bus.publish(
+            self.settings.redis.streams.executions,
+            signal.derive("order_submitted", payload),
+        )
+
+    async def _order_recorded(self, order: _LiveOrder, response: Dict[str, Any]) -> None:
+        """Apply the create_order response and any report that arrived before it."""
+        order.recorded = True
+        self._note_external_id(order, response.get("id"))
+        early, order.early_report = order.early_report, None
+        await self._apply_report(order, response)
+        if early is not None:
+            await self._apply_report(order, early)
+        for trade in self._unmatched_trades.get(order.exchange, {}).pop(str(order.external_order_id), []):
+            await self._apply_trade(order, trade)
+
+    async def _track_orders(self, venue: str) -> None:
+        """Follow the venue's order reports until the service stops."""
+        client = self._stream_clients.get(venue)
+        interval = self.settings.execution.order_poll_interval_seconds
+        if client is None:
+            while not self.is_stopping:
+                await self._poll_orders(venue)
+                await self.sleep(interval)
+            return
+        backoff = 1.0
+        while not self.is_stopping:
+            try:
+                if client.has.get("watchOrders"):
+                    reports = await client.watch_orders()
+                    for report in reports:
+                        await self._handle_report(venue, report)
+                else:
+                    for trade in await client.watch_my_trades():
+                        await self._handle_trade(venue, trade)
+                backoff = 1.0
+            except Exception as exc:
+                if self.is_stopping:
+                    return
+                logger.error(
+                    "execution_service.order_stream_failed",
+                    exchange=venue,
+                    error=str(exc),
+                    retry_in=backoff,
+                )
+                # Reports sent while the stream is down are not replayed on reconnect.
+                await self._poll_orders(venue)
+                await self.sleep(backoff)
+                backoff = min(backoff * 2, max(interval, 30.0))
+
+    async def _poll_orders(self, venue: str) -> None:
+        client = self._poll_clients[venue]
+        orders = [
+            order
+            for order in self._orders.values()
+            if order.exchange == venue and order.recorded and order.external_order_id
+        ]
+
+        async def poll(order: _LiveOrder) -> None:
+            try:
+                report = await client.fetch_order(order.external_order_id, order.symbol)
+            except Exception as exc:
+                logger.warning(
+                    "execution_service.order_poll_failed",
+                    exchange=venue,
+                    client_order_id=order.client_order_id,
+                    error=str(exc),
+                )
+                return
+            await self._apply_report(order, report)
+
+        await asyncio.gather(*(poll(order) for order in orders))
+
+    def _find_order(self, venue: str, client_order_id: Optional[str], order_id: Any) -> Optional[_LiveOrder]:
+        if client_order_id and client_order_id in self._orders:
+            return self._orders[client_order_id]
+        if order_id is not None:
+            tracked = self._external_ids.get((venue, str(order_id)))
+            if tracked is not None:
+                return self._orders.get(tracked)
+        return None
+
+    async def _handle_report(self, venue: str, report: Dict[str, Any]) -> None:
+        order = self._find_order(venue, report.get("clientOrderId"), report.get("id"))
+        if order is None:
+            return  # placed outside this service or already terminal
+        if not order.recorded:
+            order.early_report = report
+            return
+        await self._apply_report(order, report)
+
+    async def _handle_trade(self, venue: str, trade: Dict[str, Any]) -> None:
+        order = self._find_order(venue, None, trade.get("order"))
+        if order is None or not order.recorded:
+            # Possibly an order whose create_order response has not arrived yet.
+            unmatched = self._unmatched_trades.setdefault(venue, OrderedDict())
+            unmatched.setdefault(str(trade.get("order")), []).append(trade)
+            while len(unmatched) > _UNMATCHED_TRADES:
+                unmatched.popitem(last=False)
+            return
+        await self._apply_trade(order, trade)
+
+    async def _apply_trade(self, order: _LiveOrder, trade: Dict[str, Any]) -> None:
+        """Fold one own trade into the order as a cumulative order report."""
+        trade_id = str(trade.get("id"))
+        if trade_id in order.trade_ids:
+            return
+        order.trade_ids.add(trade_id)
+        amount = float(trade.get("amount") or 0.0)
+        order.trade_filled += amount
+        order.trade_cost += float(trade.get("cost") or amount * float(trade.get("price") or 0.0))
+        filled = min(order.trade_filled, order.quantity)
+        await self._apply_report(
+            order,
+            {
+                "id": order.external_order_id,
+                "filled": filled,
+                "average": order.trade_cost / order.trade_filled if order.trade_filled else None,
+                "status": "closed" if filled >= order.quantity * (1 - 1e-9) else "open",
+            },
+        )
+
+    async def _apply_report(self, order: _LiveOrder, report: Dict[str, Any]) -> None:
+        """Record a cumulative exchange report of ``order`` and act on newly filled quantity.
+
+        Reports may arrive twice or out of order from the stream and from
+        polling; ones that do not advance the filled quantity or status are
+        ignored.
+        """
+        assert self._writer is not None
+        filled = float(report.get("filled") or 0.0)
+        status = order_status(report)
+        if filled < order.filled:
+            return
+        if filled == order.filled and (status == order.status or order.status in TERMINAL_ORDER_STATUSES):
+            return
+        delta = filled - order.filled
+        average = report.get("average") or report.get("price") or order.price
+        fill_price = average
+        if delta > 0 and average and order.filled and order.average:
+            # Price of this fill alone, from the change in cumulative cost.
+            fill_price = (filled * float(average) - order.filled * order.average) / delta
+        order.filled, order.status = filled, status
+        order.average = float(average) if average else order.average
+        self._note_external_id(order, report.get("id"))
+        if status in TERMINAL_ORDER_STATUSES:
+            self._forget_order(order)
+        await self._writer.update_order(
+            OrderUpdate(
+                client_order_id=order.client_order_id,
+                status=status,
+                filled_quantity=filled,
+                external_order_id=order.external_order_id,
+            )
+        )
+        await self.bus.publish(
+            self.settings.redis.streams.executions,
+            Event(
+                type="order_update",
+                payload={
+                    "client_order_id": order.client_order_id,
+                    "exchange": order.exchange,
+                    "strategy": order.strategy,
+                    "symbol": order.symbol,
+                    "side": order.side.value,
+                    "quantity": order.quantity,
+                    "filled_quantity": filled,
+                    "filled_delta": delta,
+                    "average_price": order.average,
+                    "status": status.value,
+                    "stop": order.stop_distance is None,
+                },
+            ),
+        )
+        logger.info(
+            "execution_service.order_update",
+            exchange=order.exchange,
+            client_order_id=order.client_order_id,
+            status=status.value,
+            filled=filled,
+        )
+        if delta <= 0:
+            return
+        if order.stop_distance is None:
+            await self._stop_filled(order, delta)
+        elif fill_price:
+            await self._install_stop(order, entry_price=float(fill_price), quantity=delta)
+
+    def _note_external_id(self, order: _LiveOrder, order_id: Any) -> None:
+        if order_id is None or order.external_order_id is not None:
+            return
+        order.external_order_id = str(order_id)
+        if order.client_order_id in self._orders:
+            self._external_ids[(order.exchange, order.external_order_id)] = order.client_order_id
+
+    def _forget_order(self, order: _LiveOrder) -> None:
+        self._orders.pop(order.client_order_id, None)
+        if order.external_order_id is not None:
+            self._external_ids.pop((order.exchange, order.external_order_id), None)
+
+    async def _install_stop(self, order: _LiveOrder, *, entry_price: float, quantity: float) -> None:
+        """Install a reduce-only stop for ``quantity`` just filled on entry ``order``."""
+        assert order.stop_distance is not None
+        side = order.side
         stop_side = OrderSide.SELL if side == OrderSide.BUY else OrderSide.BUY
-        stop_price = entry_price - stop_distance if side == OrderSide.BUY else entry_price + stop_distance
-        client_order_id = make_client_order_id(strategy, symbol, stop_side.value)
+        stop_price = entry_price - order.stop_distance if side == OrderSide.BUY else entry_price + order.stop_distance
+        client_order_id = make_client_order_id(order.strategy, order.symbol, stop_side.value)
         stop_request = {
-            "symbol": symbol,
+            "symbol": order.symbol,
             "type": OrderType.STOP_MARKET.value,
             "side": stop_side.value,
-            "amount": position_size,
+            "amount": quantity,
             "price": None,
             "params": {
                 "clientOrderId": client_order_id,
@@ -169,33 +516,78 @@ class ExecutionService(BaseService):
                 "stopPrice": stop_price,
             },
         }
-        if self.settings.app.dry_run:
-            logger.info("execution_service.dry_run_stop", order=stop_request)
-            return
+        stop = _LiveOrder(
+            client_order_id=client_order_id,
+            exchange=order.exchange,
+            symbol=order.symbol,
+            strategy=order.strategy,
+            side=stop_side,
+            quantity=quantity,
+            price=None,
+            stop_distance=None,
+        )
+        self._orders[client_order_id] = stop
         try:
-            response = await client.create_order(**stop_request)
+            response = await self._clients[order.exchange].create_order(**stop_request)
             logger.info(
                 "execution_service.stop_installed",
-                exchange=exchange,
-                symbol=symbol,
+                exchange=order.exchange,
+                symbol=order.symbol,
                 stop_price=stop_price,
+                quantity=quantity,
             )
-            await self._update_position(
-                symbol=symbol,
-                exchange=exchange,
-                strategy=strategy,
-                quantity=position_size if side == OrderSide.BUY else -position_size,
+            await self._record_order(
+                client_order_id=client_order_id,
+                exchange=order.exchange,
+                strategy=order.strategy,
+                symbol=order.symbol,
+                side=stop_side,
+                order_type=OrderType.STOP_MARKET,
+                price=None,
+                stop_price=stop_price,
+                quantity=quantity,
+                raw_request=stop_request,
+                raw_response=response,
+                status=OrderStatus.PENDING,
+            )
+            snapshot = await self._update_position(
+                symbol=order.symbol,
+                exchange=order.exchange,
+                strategy=order.strategy,
+                quantity=quantity if side == OrderSide.BUY else -quantity,
                 entry_price=entry_price,
                 stop_price=stop_price,
             )
+            await self.bus.publish(
+                self.settings.redis.streams.executions,
+                Event(type="position_update", payload=snapshot),
+            )
+            await self._order_recorded(stop, response)
         except Exception as exc:
+            if not stop.recorded:
+                self._forget_order(stop)
             logger.error(
                 "execution_service.stop_install_failed",
-                exchange=exchange,
-                symbol=symbol,
+                exchange=order.exchange,
+                symbol=order.symbol,
                 error=str(exc),
             )
 
+    async def _stop_filled(self, stop: _LiveOrder, quantity: float) -> None:
+        """Reduce the position by ``quantity`` filled on one of its stops."""
+        if (stop.exchange, stop.symbol, stop.strategy) not in self._positions:
+            return
+        snapshot = await self._update_position(
+            symbol=stop.symbol,
+            exchange=stop.exchange,
+            strategy=stop.strategy,
+            quantity=quantity if stop.side == OrderSide.BUY else -quantity,
+        )
+        await self.bus.publish(
+            self.settings.redis.streams.executions,
+            Event(type="position_update", payload=snapshot),
+        )
+
     async def _record_order(
         self,
         *,
@@ -210,22 +602,25 @@ class ExecutionService(BaseService):
         raw_request: Dict[str, Any],
         raw_response: Dict[str, Any],
         status: OrderStatus,
+        stop_price: float | None = None,
     ) -> None:
-        with session_scope(self._session_factory) as session:
-            order = Order(
-                client_order_id=client_order_id,
-                strategy=strategy,
-                symbol=symbol,
-                exchange=exchange,
-                side=side,
-                type=order_type,
-                price=price,
-                quantity=quantity,
-                raw_request=raw_request,
-                raw_response=raw_response,
-                status=status,
-            )
-            session.add(order)
+        assert self._writer is not None
+        external_order_id = raw_response.get("id")
+        await self._writer.record_order(
+            client_order_id=client_order_id,
+            external_order_id=None if external_order_id is None else str(external_order_id),
+            strategy=strategy,
+            symbol=symbol,
+            exchange=exchange,
+            side=side,
+            type=order_type,
+            price=price,
+            stop_price=stop_price,
+            quantity=quantity,
+            raw_request=raw_request,
+            raw_response=raw_response,
+            status=status,
+        )
 
     async def _update_position(
         self,
@@ -234,37 +629,53 @@ class ExecutionService(BaseService):
         exchange: str,
         strategy: str,
         quantity: float,
-        entry_price: float,
-        stop_price: float,
-    ) -> None:
-        with session_scope(self._session_factory) as session:
-            position = (
-                session.query(Position)
-                .filter_by(symbol=symbol, exchange=exchange, strategy=strategy)
-                .one_or_none()
-            )
-            if position:
-                position.quantity += quantity
-                position.entry_price = entry_price
-                position.stop_price = stop_price
-                position.mark_stop_installed()
-            else:
-                position = Position(
-                    symbol=symbol,
-                    exchange=exchange,
-                    strategy=strategy,
-                    quantity=quantity,
-                    entry_price=entry_price,
-                    stop_price=stop_price,
-                    reduce_only_stop_installed=True,
-                    opened_at=utc_now(),
-                )
-                session.add(position)
+        entry_price: Optional[float] = None,
+        stop_price: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Apply a signed fill to the open position and return its ``position_update`` payload.
+
+        Fills that add to the position average ``entry_price`` into it; a
+        fill that leaves nothing open closes the position.
+        """
+        assert self._writer is not None
+        key = (exchange, symbol, strategy)
+        current = self._positions.get(key)
+        held = current.quantity if current else 0.0
+        total = held + quantity
+        if current is None or entry_price is None:
+            average = entry_price if current is None else current.entry_price
+        elif held * quantity > 0:
+            average = (abs(held) * current.entry_price + abs(quantity) * entry_price) / abs(total)
+        else:
+            average = entry_price
+        closed = current is not None and abs(total) <= abs(held) * 1e-9
+        snapshot = PositionUpsert(
+            exchange=exchange,
+            symbol=symbol,
+            strategy=strategy,
+            quantity=0.0 if closed else total,
+            entry_price=average if average is not None else 0.0,
+            stop_price=stop_price if stop_price is not None else (current.stop_price if current else 0.0),
+            closed=closed,
+        )
+        if closed:
+            self._positions.pop(key, None)
+        else:
+            self._positions[key] = snapshot
+        await self._writer.upsert_position(snapshot)
+        return position_payload(snapshot, closed=closed)
 
     async def stop(self) -> None:
         await super().stop()
-        for client in self._clients.values():
+        for client in self._stream_clients.values():
             try:
                 await client.close()
             except Exception:
                 pass
+
+    async def teardown(self) -> None:
+        if self._writer is not None:
+            await self._writer.close()
+            logger.info("execution_service.write_behind_flushed")
+        if self._owns_gateway:
+            await self._gateway.close()
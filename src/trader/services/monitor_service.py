@@ -2,15 +2,18 @@ from __future__ import annotations
 
 import asyncio
 from datetime import datetime, timezone
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from fastapi import FastAPI
-from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, Gauge, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from starlette.responses import Response
 from uvicorn import Config, Server
 
 from ..config import Settings
+from ..events import Event, EventBus
 from ..logging import get_logger
+from ..metrics import PipelineMetrics
+from ..sharding import partition_stream
 from ..utils import ensure_ntp_sync
 from .base import BaseService
 
@@ -19,12 +22,21 @@ logger = get_logger(__name__)
 
 
 class MonitorService(BaseService):
-    """Exposes liveness/readiness endpoints and Prometheus metrics."""
+    """Exposes liveness/readiness endpoints and Prometheus metrics.
 
-    def __init__(self, settings: Settings):
-        super().__init__(settings)
-        self._registry = CollectorRegistry()
-        self._gauges: Dict[str, Gauge] = {}
+    Pipeline stage latencies come from the trace carried by
+    ``order_submitted`` events on the executions stream, reconciliation
+    cycle durations from ``reconciliation_cycle`` events on the
+    reconciliations stream and per-symbol ingest lag from ``ingest_lag``
+    events on the ingest stream; stream length and consumer-group lag are
+    sampled from the bus.
+    """
+
+    name = "monitor"
+
+    def __init__(self, settings: Settings, *, bus: Optional[EventBus] = None):
+        super().__init__(settings, bus=bus)
+        self.metrics = PipelineMetrics()
         self._server: Server | None = None
 
     async def setup(self) -> None:
@@ -40,8 +52,57 @@ class MonitorService(BaseService):
         await asyncio.gather(
             self._server.serve(),
             self._monitor_ntp(),
+            self.consume_stream(
+                self.settings.redis.streams.executions,
+                self._handle_execution_event,
+                start_id="$",
+                broadcast=True,
+            ),
+            self.consume_stream(
+                self.settings.redis.streams.reconciliations,
+                self._handle_reconciliation_event,
+                start_id="$",
+                broadcast=True,
+            ),
+            self.consume_stream(
+                self.settings.redis.streams.ingest,
+                self._handle_ingest_event,
+                start_id="$",
+                broadcast=True,
+            ),
+            self._sample_streams(),
         )
 
+    async def _handle_execution_event(self, event: Event) -> None:
+        if event.type == "order_submitted":
+            self.metrics.observe_trace(event.trace)
+
+    async def _handle_reconciliation_event(self, event: Event) -> None:
+        if event.type == "reconciliation_cycle":
+            self.metrics.reconciliation_cycle.observe(event.payload["duration_seconds"])
+
+    async def _handle_ingest_event(self, event: Event) -> None:
+        if event.type == "ingest_lag":
+            payload = event.payload
+            self.metrics.ingest_lag.labels(exchange=payload["exchange"], symbol=payload["symbol"]).observe(
+                payload["lag_seconds"]
+            )
+
+    async def _sample_streams(self) -> None:
+        interval = self.settings.monitoring.prometheus.get("stream_stats_interval_seconds", 15)
+        streams = list(self.settings.redis.streams.model_dump().values())
+        sharding = self.settings.sharding
+        if sharding.enabled:
+            market_stream = self.settings.redis.streams.market_data
+            streams += [partition_stream(market_stream, partition) for partition in range(sharding.partitions)]
+        while not self.is_stopping:
+            try:
+                stats = [await self.bus.stream_stats(stream) for stream in streams]
+                self.metrics.observe_streams(stats)
+            except Exception as exc:
+                logger.error("monitor_service.stream_stats_failed", error=str(exc))
+            await self.sleep(interval)
+
     def _create_app(self) -> FastAPI:
         app = FastAPI(title="Trader Monitor")
 
@@ -55,7 +116,7 @@ class MonitorService(BaseService):
 
         @app.get("/metrics")
         async def metrics() -> Response:
-            data = generate_latest(self._registry)
+            data = generate_latest(self.metrics.registry)
             return Response(content=data, media_type=CONTENT_TYPE_LATEST)
 
         return app
@@ -65,4 +126,4 @@ class MonitorService(BaseService):
         max_skew = self.settings.monitoring.health_check.get("max_clock_skew_seconds", 1.0)
         while not self.is_stopping:
             await ensure_ntp_sync(max_skew)
-            await asyncio.sleep(interval)
+            await self.sleep(interval)
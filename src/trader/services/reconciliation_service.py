@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, List
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import ccxt.async_support as ccxt_async  # type: ignore
 
 from ..config import Settings
 from ..db import create_session_factory, session_scope
-from ..events import Event
+from ..events import Event, EventBus
+from ..gateway import ExchangeGateway, Priority
+from ..ledger import position_payload
 from ..logging import get_logger
-from ..models import Order, Position
+from ..models import Position
+from ..utils import utc_now
 from .base import BaseService
 
 
@@ -17,56 +22,139 @@ logger = get_logger(__name__)
 
 
 class ReconciliationService(BaseService):
-    """Continuously verifies that local state matches exchange reality."""
+    """Continuously verifies that local state matches exchange reality.
 
-    def __init__(self, settings: Settings):
-        super().__init__(settings)
+    Each cycle issues one positions snapshot and one open-orders snapshot per
+    venue and reconciles venues concurrently. Requests go through the
+    :class:`ExchangeGateway` behind order submission but ahead of data polling.
+    Each cycle's duration is published as a ``reconciliation_cycle`` event.
+    """
+
+    name = "reconciliation"
+
+    def __init__(
+        self,
+        settings: Settings,
+        *,
+        bus: Optional[EventBus] = None,
+        gateway: Optional[ExchangeGateway] = None,
+    ):
+        super().__init__(settings, bus=bus)
+        self._owns_gateway = gateway is None
+        self._gateway = gateway or ExchangeGateway.from_settings(settings)
         self._session_factory = create_session_factory(settings)
         self._interval = settings.reconciliation.interval_seconds
         self._clients: Dict[str, Any] = {}
+        self._per_symbol_orders: Set[str] = set()
+        self._order_cursor: Dict[str, int] = {}
+        self.last_cycle_seconds: float | None = None
 
     async def setup(self) -> None:
         await super().setup()
-        for exchange_conf in self.settings.exchanges:
-            module = exchange_conf.get("module", "ccxt.binanceusdm")
-            cls_name = module.split(".")[-1]
-            client_cls = getattr(ccxt_async, cls_name)
-            client = client_cls(
-                {
-                    "apiKey": exchange_conf.get("api_key"),
-                    "secret": exchange_conf.get("api_secret"),
-                    "enableRateLimit": True,
-                }
-            )
-            if exchange_conf.get("sandbox"):
-                if hasattr(client, "set_sandbox_mode"):
-                    client.set_sandbox_mode(True)
-            self._clients[exchange_conf["name"]] = client
+        await self._gateway.open()
+        for venue in self._gateway.venues:
+            self._clients[venue] = self._gateway.client(venue, Priority.RECONCILE)
 
     async def run(self) -> None:
         while not self.is_stopping:
             await self._reconcile_once()
-            await asyncio.sleep(self._interval)
+            await self.sleep(self._interval)
 
     async def _reconcile_once(self) -> None:
+        started = time.perf_counter()
         with session_scope(self._session_factory) as session:
-            positions: List[Position] = session.query(Position).all()
+            positions: List[Position] = session.query(Position).filter(Position.closed_at.is_(None)).all()
+            session.expunge_all()
+
+        by_venue: Dict[str, List[Position]] = defaultdict(list)
+        for position in positions:
+            if position.exchange in self._clients:
+                by_venue[position.exchange].append(position)
+
+        requests = await asyncio.gather(
+            *(self._reconcile_venue(venue, venue_positions) for venue, venue_positions in by_venue.items())
+        )
+        self.last_cycle_seconds = time.perf_counter() - started
+        summary = {
+            "duration_seconds": self.last_cycle_seconds,
+            "venues": len(by_venue),
+            "positions": sum(len(p) for p in by_venue.values()),
+            "requests": dict(zip(by_venue, requests)),
+        }
+        # MonitorService exports the duration as trader_reconciliation_cycle_seconds.
+        await self.bus.publish(
+            self.settings.redis.streams.reconciliations,
+            Event(type="reconciliation_cycle", payload=summary),
+        )
+        logger.info(
+            "reconciliation.cycle_complete",
+            **{**summary, "duration_seconds": round(self.last_cycle_seconds, 3)},
+        )
+
+    async def _reconcile_venue(self, venue: str, positions: List[Position]) -> int:
+        """Reconcile every open position on ``venue``; returns the requests spent."""
+        client = self._clients[venue]
+        budget = self.settings.reconciliation.max_requests_per_venue
+        symbols = sorted({position.symbol for position in positions})
+        try:
+            exchange_positions = await client.fetch_positions(symbols)
+            open_orders, order_requests, covered = await self._fetch_open_orders(
+                venue, client, symbols, budget - 1
+            )
+        except Exception as exc:
+            logger.error("reconciliation.exchange_fetch_failed", exchange=venue, error=str(exc))
+            return 1
+
+        positions_by_symbol = {p.get("symbol"): p for p in exchange_positions}
+        orders_by_symbol: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for order in open_orders:
+            orders_by_symbol[order.get("symbol")].append(order)
 
         for position in positions:
-            client = self._clients.get(position.exchange)
-            if not client:
+            if position.symbol not in covered:
                 continue
+            matching = positions_by_symbol.get(position.symbol)
+            await self._verify_position(
+                position,
+                [matching] if matching else [],
+                orders_by_symbol.get(position.symbol, []),
+            )
+        return 1 + order_requests
+
+    async def _fetch_open_orders(
+        self,
+        venue: str,
+        client: Any,
+        symbols: List[str],
+        budget: int,
+    ) -> Tuple[List[Dict[str, Any]], int, Set[str]]:
+        """Fetch open orders with one call, or per symbol if the venue requires it.
+
+        Per-symbol fetches are capped at ``budget`` requests per cycle; the
+        symbols left over are picked up first on the next cycle.
+        """
+        spent = 0
+        if venue not in self._per_symbol_orders:
             try:
-                exchange_positions = await client.fetch_positions([position.symbol])
-                open_orders = await client.fetch_open_orders(symbol=position.symbol)
-                await self._verify_position(position, exchange_positions, open_orders)
-            except Exception as exc:
-                logger.error(
-                    "reconciliation.exchange_fetch_failed",
-                    exchange=position.exchange,
-                    symbol=position.symbol,
-                    error=str(exc),
-                )
+                return await client.fetch_open_orders(), 1, set(symbols)
+            except ccxt_async.ArgumentsRequired:
+                self._per_symbol_orders.add(venue)
+                spent, budget = 1, budget - 1
+                logger.info("reconciliation.per_symbol_open_orders", exchange=venue)
+
+        start = self._order_cursor.get(venue, 0) % max(len(symbols), 1)
+        rotated = symbols[start:] + symbols[:start]
+        batch = rotated[:max(budget, 0)]
+        self._order_cursor[venue] = start + len(batch)
+        if len(batch) < len(symbols):
+            logger.warning(
+                "reconciliation.request_budget_exhausted",
+                exchange=venue,
+                checked=len(batch),
+                deferred=len(symbols) - len(batch),
+            )
+        results = await asyncio.gather(*(client.fetch_open_orders(symbol=symbol) for symbol in batch))
+        return [order for orders in results for order in orders], spent + len(batch), set(batch)
 
     async def _verify_position(
         self,
@@ -82,12 +170,18 @@ class ReconciliationService(BaseService):
                 exchange=local.exchange,
             )
             return
-        qty = matching.get("contracts") or matching.get("positionAmt") or matching.get("size")
+        qty = next(
+            (matching[field] for field in ("contracts", "positionAmt", "size") if matching.get(field) is not None),
+            None,
+        )
         if qty is not None and abs(float(qty)) == 0:
             logger.critical(
                 "reconciliation.position_closed_but_local_open",
                 symbol=local.symbol,
             )
+            if self.settings.reconciliation.auto_repair:
+                await self._close_local_position(local)
+            return
         if not self._has_reduce_only_stop(local, open_orders):
             logger.critical(
                 "reconciliation.stop_missing",
@@ -103,6 +197,19 @@ class ReconciliationService(BaseService):
                 return True
         return False
 
+    async def _close_local_position(self, local: Position) -> None:
+        with session_scope(self._session_factory) as session:
+            position = session.get(Position, local.id)
+            if position is None or position.closed_at is not None:
+                return
+            position.closed_at = utc_now()
+            payload = position_payload(position, closed=True)
+        await self.bus.publish(
+            self.settings.redis.streams.reconciliations,
+            Event(type="position_update", payload=payload),
+        )
+        logger.warning("reconciliation.closed_local_position", payload=payload)
+
     async def _publish_stop_repair(self, position: Position) -> None:
         streams = self.settings.redis.streams.reconciliations
         payload = {
@@ -121,10 +228,6 @@ class ReconciliationService(BaseService):
         )
         logger.warning("reconciliation.requested_stop_repair", payload=payload)
 
-    async def stop(self) -> None:
-        await super().stop()
-        for client in self._clients.values():
-            try:
-                await client.close()
-            except Exception:
-                pass
+    async def teardown(self) -> None:
+        if self._owns_gateway:
+            await self._gateway.close()
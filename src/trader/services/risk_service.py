@@ -1,14 +1,16 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Dict
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
 
 from ..config import Settings
-from ..db import create_session_factory, session_scope
-from ..events import Event
+from ..db import create_session_factory
+from ..events import Event, EventBus
+from ..ledger import RiskLedger, database_checksum
 from ..logging import get_logger
-from ..models import Position
-from ..utils.risk import PortfolioState, apply_circuit_breakers
+from ..utils.risk import PortfolioState, RiskLimits, apply_circuit_breakers, enforce_portfolio_limits
 from .base import BaseService
 
 
@@ -16,83 +18,173 @@ logger = get_logger(__name__)
 
 
 class RiskService(BaseService):
-    """Applies portfolio-level risk checks and publishes approved signals."""
+    """Applies portfolio-level risk checks and publishes approved signals.
+
+    Open risk comes from an in-memory :class:`RiskLedger` loaded from the
+    database at startup and kept current from ``position_update`` events on
+    the executions and reconciliations streams. A lagging service only
+    checks the newest backlogged signal of each strategy and symbol.
+
+    Position writes reach the database behind the event stream, so a
+    single checksum mismatch is expected while writes are in flight; the
+    ledger is only reloaded from the database once
+    ``ledger_rebuild_after_mismatches`` consecutive checks disagree.
+    """
 
-    def __init__(self, settings: Settings):
-        super().__init__(settings)
-        self._last_id = "0-0"
+    name = "risk"
+
+    def __init__(self, settings: Settings, *, bus: Optional[EventBus] = None):
+        super().__init__(settings, bus=bus)
         self._session_factory = create_session_factory(settings)
         self._equity = 100000.0  # Placeholder until account service feeds real value
+        self._ledger = RiskLedger()
+        self._ledger_mismatches = 0
+        self._risk_settings = settings.risk.model_dump()
+        self._risk_limits = RiskLimits.from_settings(self._risk_settings)
+
+    async def setup(self) -> None:
+        await super().setup()
+        self._ledger = await asyncio.to_thread(RiskLedger.from_database, self._session_factory)
+        logger.info(
+            "risk_service.ledger_loaded",
+            positions=len(self._ledger),
+            open_risk=self._ledger.open_risk,
+        )
+
+    @property
+    def ledger(self) -> RiskLedger:
+        return self._ledger
 
     async def run(self) -> None:
-        signal_stream = self.settings.redis.streams.signals
-        approved_stream = self.settings.redis.streams.approved_signals
+        streams = self.settings.redis.streams
+
+        await asyncio.gather(
+            self.consume_stream(
+                streams.signals,
+                lambda events: self._handle_signals(events, streams.approved_signals),
+                batched=True,
+                coalesce=_signal_key,
+            ),
+            self.consume_stream(streams.executions, self._handle_position_event, start_id="$", broadcast=True),
+            self.consume_stream(streams.reconciliations, self._handle_position_event, start_id="$", broadcast=True),
+            self._verify_ledger_periodically(),
+        )
 
-        while not self.is_stopping:
-            try:
-                event, message_id = await self.bus.consume(signal_stream, self._last_id)
-                self._last_id = message_id
-                await self._handle_signal(event, approved_stream)
-            except asyncio.TimeoutError:
-                continue
+    async def _handle_position_event(self, event: Event) -> None:
+        self._ledger.apply_event(event.type, event.payload)
 
-    async def _handle_signal(self, event: Event, approved_stream: str) -> None:
-        risk_payload = event.payload.get("risk", {})
-        if not risk_payload:
-            logger.warning("risk_service.missing_risk_payload", signal=event.payload)
+    async def _verify_ledger_periodically(self) -> None:
+        interval = self.settings.risk.ledger_checksum_interval_seconds
+        while not self.is_stopping:
+            await self.sleep(interval)
+            if not self.is_stopping:
+                await self._verify_ledger()
+
+    async def _verify_ledger(self) -> None:
+        expected = await asyncio.to_thread(database_checksum, self._session_factory)
+        actual = self._ledger.checksum()
+        if actual.matches(expected):
+            self._ledger_mismatches = 0
+            self._ledger.resync(actual)
             return
-
-        stop_distance = risk_payload.get("stop_distance")
-        position_size = risk_payload.get("position_size")
-        if not stop_distance or not position_size:
-            logger.warning("risk_service.incomplete_risk_payload", signal=event.payload)
+        self._ledger_mismatches += 1
+        rebuild = self._ledger_mismatches >= self.settings.risk.ledger_rebuild_after_mismatches
+        logger.warning(
+            "risk_service.ledger_drift",
+            ledger_positions=actual.positions,
+            db_positions=expected.positions,
+            ledger_open_risk=actual.open_risk,
+            db_open_risk=expected.open_risk,
+            consecutive=self._ledger_mismatches,
+            rebuild=rebuild,
+        )
+        if rebuild:
+            self._ledger_mismatches = 0
+            self._ledger = await asyncio.to_thread(RiskLedger.from_database, self._session_factory)
+
+    async def _handle_signals(self, events: List[Event], approved_stream: str) -> None:
+        """Check a batch of signals against the risk budgets in one vectorised pass.
+
+        Signals are accepted in descending confidence until the first one that
+        would exceed portfolio heat or leverage, so a burst of signals cannot
+        each pass on its own and overshoot together.
+        """
+        candidates: List[Event] = []
+        for event in events:
+            risk_payload = event.payload.get("risk", {})
+            if not risk_payload:
+                logger.warning("risk_service.missing_risk_payload", signal=event.payload)
+                continue
+            if not (risk_payload.get("stop_distance") and risk_payload.get("position_size") and event.payload.get("price")):
+                logger.warning("risk_service.incomplete_risk_payload", signal=event.payload)
+                continue
+            candidates.append(event)
+        if not candidates:
             return
 
-        open_risk = self._calculate_open_risk()
         equity = self._equity
-        daily_loss = 0.0  # TODO: integrate with PnL service
-        drawdown = 0.0    # TODO: integrate with PnL service
-
         state = PortfolioState(
             equity=equity,
-            open_risk=open_risk + stop_distance * position_size,
-            daily_loss=daily_loss,
-            cumulative_drawdown=drawdown,
+            open_risk=self._ledger.open_risk,
+            daily_loss=0.0,  # TODO: integrate with PnL service
+            cumulative_drawdown=0.0,  # TODO: integrate with PnL service
         )
-        risk_settings = self.settings.risk.model_dump()
-        if apply_circuit_breakers(state, risk_settings):
-            logger.error("risk_service.signal_rejected_circuit_breaker", signal=event.payload)
+        if apply_circuit_breakers(state, self._risk_settings):
+            for event in candidates:
+                logger.error("risk_service.signal_rejected_circuit_breaker", signal=event.payload)
             return
 
-        leverage_limit = risk_settings.get("max_leverage", 1.0)
-        notional = position_size
-        if notional / equity > leverage_limit:
-            logger.warning(
-                "risk_service.signal_rejected_leverage",
-                notional=notional,
-                equity=equity,
+        stop_distances = np.array([event.payload["risk"]["stop_distance"] for event in candidates], dtype=float)
+        position_sizes = np.array([event.payload["risk"]["position_size"] for event in candidates], dtype=float)
+        prices = np.array([event.payload["price"] for event in candidates], dtype=float)
+        notionals = position_sizes * prices
+        accepted = enforce_portfolio_limits(
+            stop_distances * position_sizes,
+            notionals,
+            equity=equity,
+            open_risk=self._ledger.open_risk,
+            gross_notional=self._ledger.gross_notional,
+            limits=self._risk_limits,
+            priority=[event.payload.get("confidence", 0.0) for event in candidates],
+        )
+
+        approved = []
+        for event, is_accepted, notional in zip(candidates, accepted, notionals):
+            if not is_accepted:
+                logger.warning(
+                    "risk_service.signal_rejected_limits",
+                    strategy=event.payload.get("strategy"),
+                    symbol=event.payload.get("symbol"),
+                    notional=float(notional),
+                    open_risk=self._ledger.open_risk,
+                    gross_notional=self._ledger.gross_notional,
+                    equity=equity,
+                )
+                continue
+            approved.append(
+                event.derive(
+                    "approved_signal",
+                    {
+                        **event.payload,
+                        "risk_approved": True,
+                    },
+                ).stamp("risk")
             )
+        if not approved:
             return
+        await self.bus.publish_many(approved_stream, approved)
+        for event in approved:
+            logger.info(
+                "risk_service.signal_approved",
+                strategy=event.payload.get("strategy"),
+                symbol=event.payload.get("symbol"),
+                portfolio_heat=self._ledger.portfolio_heat(equity),
+                symbol_exposure=self._ledger.symbol_exposure(
+                    event.payload.get("exchange", ""), event.payload.get("symbol", "")
+                ),
+            )
 
-        approved_event = Event(
-            type="approved_signal",
-            payload={
-                **event.payload,
-                "risk_approved": True,
-            },
-        )
-        await self.bus.publish(approved_stream, approved_event)
-        logger.info(
-            "risk_service.signal_approved",
-            strategy=event.payload.get("strategy"),
-            symbol=event.payload.get("symbol"),
-        )
 
-    def _calculate_open_risk(self) -> float:
-        with session_scope(self._session_factory) as session:
-            positions = session.query(Position).all()
-            open_risk = 0.0
-            for pos in positions:
-                stop_distance = abs(pos.entry_price - pos.stop_price)
-                open_risk += stop_distance * abs(pos.quantity)
-            return open_risk
+def _signal_key(event: Event) -> Tuple[Any, Any, Any]:
+    payload = event.payload
+    return payload.get("strategy"), payload.get("exchange"), payload.get("symbol")
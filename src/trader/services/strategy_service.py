@@ -1,131 +1,368 @@
 from __future__ import annotations
 
 import asyncio
-from collections import defaultdict, deque
-from typing import Deque, Dict, Tuple
+import functools
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import numpy as np
 
-from ..config import Settings, StrategyConfig
-from ..events import Event
+from ..candles import CandleStore, as_candles
+from ..config import Settings
+from ..events import Event, EventBus
 from ..logging import get_logger
-from ..utils import calculate_position_size
-from .base import BaseService
+from ..sharding import partition_for, partition_owners, partition_stream
+from ..strategies import ACTIONS, Decisions, Strategy, UniverseWindow, load_strategy
+from ..universe import CLOSE, SymbolKey, UniverseBuffer
+from ..utils.risk import EwmaCovariance, RiskLimits, size_positions
+from .base import BaseService, EventHandler
 
 
 logger = get_logger(__name__)
 
 
 class StrategyService(BaseService):
-    """Consumes market data, generates trading signals, and publishes to Redis."""
+    """Consumes market data, generates trading signals, and publishes to Redis.
 
-    def __init__(self, settings: Settings):
-        super().__init__(settings)
-        self.price_history: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=500))
-        self.strategy_configs = {cfg.name: cfg for cfg in settings.strategies if cfg.enabled}
-        self._last_id = "0-0"
+    Strategies are plugins loaded from ``StrategyConfig.module`` (see
+    :mod:`trader.strategies`). Candles of every symbol go into one
+    :class:`UniverseBuffer`; when a bar closes, each strategy evaluates all
+    symbols of that timeframe in a single call, once every symbol has
+    reported the close or ``strategy_engine.bar_close_grace_seconds`` has
+    passed.
+
+    The buffer is hydrated from the :class:`CandleStore` at startup, so
+    signals can fire on the first bar close after a restart. With
+    ``sharding.enabled`` each worker consumes only the market data
+    partitions the hash ring assigns it (see :mod:`trader.sharding`). When
+    the service lags behind the market data stream, backlogged updates of a
+    symbol are merged into its newest one and evaluated once. Asset
+    volatility for position sizing comes from an EWMA estimator fed with
+    the same candles.
+    """
+
+    name = "strategy"
+
+    def __init__(self, settings: Settings, *, bus: Optional[EventBus] = None):
+        super().__init__(settings, bus=bus)
+        self.strategies: List[Strategy] = [load_strategy(cfg) for cfg in settings.strategies if cfg.enabled]
+        self._lookback = max([strategy.lookback for strategy in self.strategies], default=1)
+        self.universe = UniverseBuffer(capacity=max(500, self._lookback + 2))
+        self.risk_limits = RiskLimits.from_settings(settings.risk.model_dump())
+        self.volatility = EwmaCovariance(self.risk_limits.ewma_halflife_days)
+        store_conf = settings.candle_store
+        self._candle_store = CandleStore(store_conf.path) if store_conf.enabled else None
+        self._timeframes: Dict[SymbolKey, str] = {}
+        self._latest_events: Dict[SymbolKey, Event] = {}
+        self._bar_closes: Dict[str, _BarClose] = {}
+        #: Timeframe -> open time of the last bar evaluated.
+        self._evaluated: Dict[str, int] = {}
+
+    async def setup(self) -> None:
+        await super().setup()
+        # Sharded workers hydrate each partition when they take it over.
+        if self.strategies and not self.settings.sharding.enabled:
+            self._hydrate(self._configured_series())
+
+    def _configured_series(self, partition: Optional[int] = None) -> List[Tuple[str, str, str]]:
+        """Configured ``(exchange, symbol, timeframe)`` series, optionally of one partition."""
+        partitions = self.settings.sharding.partitions
+        series = []
+        for exchange_conf in self.settings.exchanges:
+            exchange = exchange_conf["name"]
+            timeframe = exchange_conf.get("timeframe", "1m")
+            for symbol in exchange_conf.get("symbols", []):
+                if partition is None or partition_for(exchange, symbol, partitions) == partition:
+                    series.append((exchange, symbol, timeframe))
+        return series
+
+    def _hydrate(self, series: List[Tuple[str, str, str]]) -> None:
+        if self._candle_store is None:
+            return
+        started = time.perf_counter()
+        hydrated = candles = 0
+        for exchange, symbol, timeframe in series:
+            records = self._candle_store.read(exchange, symbol, timeframe, limit=self.universe.capacity)
+            if not len(records):
+                continue
+            key = (exchange, symbol)
+            for candle in as_candles(records):
+                self.universe.update(key, candle)
+                self.volatility.update(key, candle[0], candle[4])
+            self._timeframes[key] = timeframe
+            hydrated += 1
+            candles += len(records)
+        logger.info(
+            "strategy_service.hydrated",
+            series=hydrated,
+            candles=candles,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 3),
+        )
 
     async def run(self) -> None:
         market_stream = self.settings.redis.streams.market_data
         signal_stream = self.settings.redis.streams.signals
 
-        if not self.strategy_configs:
+        if not self.strategies:
             logger.warning("strategy_service.no_strategies_enabled")
             return
 
-        while not self.is_stopping:
-            try:
-                event, message_id = await self.bus.consume(market_stream, self._last_id)
-                self._last_id = message_id
-                await self._handle_market_event(event, signal_stream)
-            except asyncio.TimeoutError:
-                continue
+        handler = functools.partial(self._handle_market_event, signal_stream=signal_stream)
+        if self.settings.sharding.enabled:
+            consume = self._run_sharded(market_stream, handler)
+        else:
+            consume = self.consume_stream(market_stream, handler, coalesce=_market_key, merge=_merge_market_events)
+        await asyncio.gather(consume, self._evaluate_overdue(signal_stream))
+
+    async def _run_sharded(self, market_stream: str, handler: EventHandler) -> None:
+        """Consume the market data partitions this worker owns, rebalancing as workers come and go.
+
+        A partition is taken over only once it has been assigned to this
+        worker on two consecutive heartbeats, by which time its previous
+        owner has seen the same membership and stopped reading it. Owners
+        read a partition through one consumer group, so the new owner resumes
+        where the old one stopped and per-symbol order is preserved.
+        """
+        conf = self.settings.sharding
+        members_key = f"{market_stream}.members"
+        ttl_ms = int(conf.member_ttl_seconds * 1000)
+        owned: Dict[int, Tuple[asyncio.Task[None], asyncio.Event]] = {}
+        assigned_before: Set[int] = set()
+        try:
+            while not self.is_stopping:
+                for partition, (task, _) in list(owned.items()):
+                    if task.done():
+                        del owned[partition]
+                        if not task.cancelled() and task.exception() is not None:
+                            logger.error(
+                                "strategy_service.partition_failed",
+                                partition=partition,
+                                error=str(task.exception()),
+                            )
+
+                members = await self.bus.heartbeat(members_key, self.consumer_name, ttl_ms)
+                owners = partition_owners(members, conf.partitions, virtual_nodes=conf.virtual_nodes)
+                assigned = {partition for partition, owner in owners.items() if owner == self.consumer_name}
+                released = set(owned) - assigned
+                acquired = (assigned & assigned_before) - set(owned)
+
+                for partition in released:
+                    task, stop = owned.pop(partition)
+                    stop.set()
+                    await asyncio.gather(task, return_exceptions=True)
+                    self._forget_partition(partition)
+                for partition in acquired:
+                    self._hydrate(self._configured_series(partition))
+                    stop = asyncio.Event()
+                    task = asyncio.create_task(
+                        self.consume_stream(
+                            partition_stream(market_stream, partition),
+                            handler,
+                            group=True,
+                            stop=stop,
+                            coalesce=_market_key,
+                            merge=_merge_market_events,
+                        ),
+                        name=f"strategy-partition-{partition}",
+                    )
+                    owned[partition] = (task, stop)
+                if released or acquired:
+                    logger.info(
+                        "strategy_service.rebalanced",
+                        members=len(members),
+                        owned=len(owned),
+                        acquired=sorted(acquired),
+                        released=sorted(released),
+                    )
+                assigned_before = assigned
+                await self.sleep(conf.heartbeat_interval_seconds)
+        finally:
+            for _, stop in owned.values():
+                stop.set()
+            await asyncio.gather(*(task for task, _ in owned.values()), return_exceptions=True)
+            await self.bus.leave(members_key, self.consumer_name)
+
+    def _forget_partition(self, partition: int) -> None:
+        """Drop the candles of a partition another worker now owns."""
+        partitions = self.settings.sharding.partitions
+        for key in self.universe.keys():
+            if partition_for(*key, partitions) == partition:
+                self.universe.discard(key)
+                self._timeframes.pop(key, None)
+                self._latest_events.pop(key, None)
+                for pending in self._bar_closes.values():
+                    pending.waiting.discard(key)
 
     async def _handle_market_event(self, event: Event, signal_stream: str) -> None:
+        """Apply the event's candles and evaluate the universe once its bar has closed everywhere."""
         exchange = event.payload.get("exchange")
         symbol = event.payload.get("symbol")
         data = event.payload.get("data", [])
         if not data:
             return
-        close_price = data[-1][4]
-
         key = (exchange, symbol)
-        history = self.price_history[key]
-        history.append(close_price)
-
-        for strategy_name, strategy in self.strategy_configs.items():
-            decision = self._evaluate_trend_strategy(strategy, history)
-            if decision:
-                payload = {
-                    "strategy": strategy_name,
-                    "exchange": exchange,
-                    "symbol": symbol,
-                    "decision": decision["action"],
-                    "confidence": decision["confidence"],
-                    "price": close_price,
-                    "risk": decision["risk"],
-                }
-                await self.bus.publish(signal_stream, Event(type="signal", payload=payload))
-                logger.info(
-                    "strategy_service.signal_published",
-                    strategy=strategy_name,
-                    symbol=symbol,
-                    exchange=exchange,
-                    action=decision["action"],
+        timeframe = event.payload.get("timeframe", "1m")
+        for candle in data:
+            self.universe.update(key, candle)
+            self.volatility.update(key, candle[0], candle[4])
+        self._timeframes[key] = timeframe
+        self._latest_events[key] = event
+
+        closed = self.universe.closed_timestamp(key)
+        if closed is None or closed <= self._evaluated.get(timeframe, -1):
+            return
+        pending = self._bar_closes.get(timeframe)
+        if pending is None:
+            # Symbols that missed the previous close are not waited for again
+            # until they catch up, so one silent feed delays at most one bar.
+            previous = self._evaluated.get(timeframe, -1)
+            waiting = set()
+            for member in self._members(timeframe):
+                member_closed = self.universe.closed_timestamp(member)
+                if member_closed is not None and previous <= member_closed < closed:
+                    waiting.add(member)
+            deadline = time.monotonic() + self.settings.strategy_engine.bar_close_grace_seconds
+            pending = self._bar_closes[timeframe] = _BarClose(closed, waiting, deadline)
+        elif closed >= pending.bar_timestamp:
+            pending.waiting.discard(key)
+        if not pending.waiting:
+            await self._evaluate(timeframe, signal_stream)
+
+    async def _evaluate_overdue(self, signal_stream: str) -> None:
+        """Evaluate bar closes that some symbols failed to report within the grace period."""
+        grace = self.settings.strategy_engine.bar_close_grace_seconds
+        while not self.is_stopping:
+            await self.sleep(min(1.0, grace))
+            now = time.monotonic()
+            for timeframe, pending in list(self._bar_closes.items()):
+                if now < pending.deadline or self._bar_closes.get(timeframe) is not pending:
+                    continue
+                logger.warning(
+                    "strategy_service.bar_close_incomplete",
+                    timeframe=timeframe,
+                    bar_timestamp=pending.bar_timestamp,
+                    missing=len(pending.waiting),
                 )
+                await self._evaluate(timeframe, signal_stream)
+
+    def _members(self, timeframe: str) -> List[SymbolKey]:
+        return [key for key, member_timeframe in self._timeframes.items() if member_timeframe == timeframe]
+
+    async def _evaluate(self, timeframe: str, signal_stream: str) -> None:
+        """Run every strategy over the symbols of ``timeframe`` that closed the pending bar."""
+        pending = self._bar_closes.pop(timeframe)
+        self._evaluated[timeframe] = pending.bar_timestamp
+        keys = [
+            key
+            for key in self._members(timeframe)
+            if (self.universe.closed_timestamp(key) or -1) >= pending.bar_timestamp
+        ]
+        if not keys:
+            return
+        ohlcv, counts = self.universe.window(keys, self._lookback)
 
-    def _evaluate_trend_strategy(
+        for strategy in self.strategies:
+            lookback = strategy.lookback
+            window = UniverseWindow(
+                keys=keys,
+                ohlcv=ohlcv if lookback == self._lookback else np.ascontiguousarray(ohlcv[:, -lookback:]),
+                counts=np.minimum(counts, lookback),
+                timeframe=timeframe,
+                bar_timestamp=pending.bar_timestamp,
+            )
+            try:
+                decisions = strategy.evaluate(window)
+            except Exception as exc:
+                logger.error("strategy_service.strategy_failed", strategy=strategy.name, error=str(exc))
+                continue
+            active = np.flatnonzero(decisions.action)
+            if not len(active):
+                continue
+            await self._publish_signals(strategy, window, decisions, active, signal_stream)
+
+    async def _publish_signals(
         self,
-        strategy: StrategyConfig,
-        history: Deque[float],
-    ) -> Dict[str, float] | None:
-        params = strategy.parameters
-        fast_period = int(params.get("fast_ma_period", 50))
-        slow_period = int(params.get("slow_ma_period", 200))
-        atr_period = int(params.get("atr_period", 14))
-
-        if len(history) < max(fast_period, slow_period, atr_period) + 1:
-            return None
-
-        prices = np.array(history, dtype=float)
-        fast_ma = prices[-fast_period:].mean()
-        slow_ma = prices[-slow_period:].mean()
-        atr = self._calculate_atr(prices, atr_period)
-
-        if np.isnan(atr) or atr <= 0:
-            return None
-
-        action = None
-        if fast_ma > slow_ma * 1.001:
-            action = "buy"
-        elif fast_ma < slow_ma * 0.999:
-            action = "sell"
-
-        if not action:
-            return None
-
-        stop_distance = atr * float(params.get("atr_multiplier", 2.0))
-        risk_settings = self.settings.risk.model_dump()
-        position_size = calculate_position_size(
-            equity=100000.0,  # Placeholder equity; replace with account data service feed
-            stop_distance=stop_distance,
-            settings=risk_settings,
-            asset_vol=params.get("asset_volatility"),
+        strategy: Strategy,
+        window: UniverseWindow,
+        decisions: Decisions,
+        active: np.ndarray,
+        signal_stream: str,
+    ) -> None:
+        keys = [window.keys[index] for index in active]
+        stop_distances = decisions.stop_distance[active]
+        sizes = self._size_positions(strategy, keys, stop_distances)
+        signals = []
+        for index, key, stop_distance, position_size in zip(active, keys, stop_distances, sizes):
+            exchange, symbol = key
+            payload = {
+                "strategy": strategy.name,
+                "exchange": exchange,
+                "symbol": symbol,
+                "decision": ACTIONS[int(decisions.action[index])],
+                "confidence": float(decisions.confidence[index]),
+                "price": float(window.ohlcv[index, -1, CLOSE]),
+                "risk": {
+                    "stop_distance": float(stop_distance),
+                    "position_size": float(position_size),
+                },
+            }
+            # Symbols only known from the candle store have no event whose trace to carry.
+            source = self._latest_events.get(key)
+            signal = source.derive("signal", payload) if source is not None else Event(type="signal", payload=payload)
+            signals.append(signal.stamp("strategy"))
+        await self.bus.publish_many(signal_stream, signals)
+        for signal in signals:
+            logger.info(
+                "strategy_service.signal_published",
+                strategy=strategy.name,
+                symbol=signal.payload["symbol"],
+                exchange=signal.payload["exchange"],
+                action=signal.payload["decision"],
+            )
+
+    def _size_positions(
+        self,
+        strategy: Strategy,
+        keys: List[SymbolKey],
+        stop_distances: np.ndarray,
+    ) -> np.ndarray:
+        """Size one strategy's signals across symbols in a single vectorised call.
+
+        The EWMA estimate is used once it is warm; until then the strategy's
+        static ``asset_volatility`` parameter (if any) stands in for it.
+        """
+        estimated = self.volatility.volatility(keys)
+        fallback = float(strategy.parameters.get("asset_volatility") or math.nan)
+        return size_positions(
+            100000.0,  # Placeholder equity; replace with account data service feed
+            stop_distances,
+            self.risk_limits,
+            np.where(np.isnan(estimated), fallback, estimated),
         )
 
-        return {
-            "action": action,
-            "confidence": 0.6,
-            "risk": {
-                "stop_distance": stop_distance,
-                "position_size": position_size,
-            },
-        }
-
-    @staticmethod
-    def _calculate_atr(prices: np.ndarray, period: int) -> float:
-        if len(prices) <= period:
-            return float("nan")
-        returns = np.abs(np.diff(prices))
-        atr = returns[-period:].mean()
-        return float(atr)
+
+@dataclass(slots=True)
+class _BarClose:
+    """A bar close of one timeframe waiting for the rest of the universe to report it."""
+
+    bar_timestamp: int
+    waiting: Set[SymbolKey]
+    deadline: float
+
+
+def _market_key(event: Event) -> Tuple[Any, Any, Any]:
+    payload = event.payload
+    return payload.get("exchange"), payload.get("symbol"), payload.get("timeframe")
+
+
+def _merge_market_events(older: Event, newer: Event) -> Event:
+    """``newer`` carrying the candles of both events, the newer version of each bar winning.
+
+    Keeps bars that closed while the service was lagging in the indicator
+    windows even though their own events are skipped.
+    """
+    candles = {candle[0]: candle for candle in older.payload.get("data", [])}
+    candles.update((candle[0], candle) for candle in newer.payload.get("data", []))
+    return newer.derive(newer.type, {**newer.payload, "data": [candles[ts] for ts in sorted(candles)]})
@@ -0,0 +1,93 @@
+"""Partitioning of market data across sharded StrategyService workers.
+
+Every ``(exchange, symbol)`` maps to one of a fixed number of partitions by
+a stable hash, and DataService writes each partition to its own stream, so
+all events of a symbol stay in one ordered stream. Partitions, not symbols,
+are placed on a :class:`HashRing` of live workers: when a worker joins or
+leaves, only the partitions adjacent to its virtual nodes move, and the
+producer never needs to know who the workers are.
+"""
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+
+def stable_hash(value: str) -> int:
+    """64-bit hash that is identical across processes and hosts (unlike ``hash``)."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def partition_for(exchange: str, symbol: str, partitions: int) -> int:
+    return stable_hash(f"{exchange}:{symbol}") % partitions
+
+
+def partition_stream(stream: str, partition: int) -> str:
+    return f"{stream}.{partition}"
+
+
+class HashRing:
+    """Consistent-hash ring placing keys on members through virtual nodes."""
+
+    def __init__(self, members: Iterable[str] = (), *, virtual_nodes: int = 64):
+        if virtual_nodes < 1:
+            raise ValueError("virtual_nodes must be at least 1")
+        self.virtual_nodes = virtual_nodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._members: Dict[str, List[int]] = {}
+        for member in members:
+            self.add(member)
+
+    @property
+    def members(self) -> List[str]:
+        return sorted(self._members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def add(self, member: str) -> None:
+        if member in self._members:
+            return
+        points = [stable_hash(f"{member}#{replica}") for replica in range(self.virtual_nodes)]
+        self._members[member] = points
+        for point in points:
+            index = bisect.bisect_left(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, member)
+
+    def remove(self, member: str) -> None:
+        points = self._members.pop(member, None)
+        if points is None:
+            return
+        keep = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != member]
+        self._points = [point for point, _ in keep]
+        self._owners = [owner for _, owner in keep]
+
+    def owner(self, key: str) -> Optional[str]:
+        """Member owning ``key``: the first virtual node clockwise from its hash."""
+        if not self._points:
+            return None
+        index = bisect.bisect_right(self._points, stable_hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def assignments(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        """``member -> keys`` for every member, including members that own nothing."""
+        owned: Dict[str, List[str]] = {member: [] for member in self._members}
+        for key in keys:
+            member = self.owner(key)
+            if member is not None:
+                owned[member].append(key)
+        return owned
+
+
+def partition_owners(members: Iterable[str], partitions: int, *, virtual_nodes: int = 64) -> Dict[int, str]:
+    """Owner of every partition given the live ``members``; empty without members."""
+    ring = HashRing(sorted(members), virtual_nodes=virtual_nodes)
+    owners: Dict[int, str] = {}
+    for partition in range(partitions):
+        owner = ring.owner(f"partition:{partition}")
+        if owner is not None:
+            owners[partition] = owner
+    return owners
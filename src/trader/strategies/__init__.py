@@ -0,0 +1,12 @@
+from .base import ACTIONS, BUY, HOLD, SELL, Decisions, Strategy, UniverseWindow, load_strategy
+
+__all__ = [
+    "ACTIONS",
+    "BUY",
+    "HOLD",
+    "SELL",
+    "Decisions",
+    "Strategy",
+    "UniverseWindow",
+    "load_strategy",
+]
@@ -0,0 +1,96 @@
+"""Interface between StrategyService and strategy plugins.
+
+A plugin is a module named by ``StrategyConfig.module`` that defines
+``create(config)`` returning a :class:`Strategy`. Once per bar close the
+service hands every strategy a :class:`UniverseWindow` holding the recent
+candles of all symbols as one matrix, and the strategy returns
+:class:`Decisions` for the whole universe from a single vectorised call.
+"""
+from __future__ import annotations
+
+import abc
+import importlib
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from ..config import StrategyConfig
+from ..universe import SymbolKey
+
+
+HOLD, BUY, SELL = 0, 1, -1
+
+ACTIONS = {BUY: "buy", SELL: "sell"}
+
+
+@dataclass(slots=True)
+class UniverseWindow:
+    """The last ``lookback`` closed candles of every symbol of one timeframe.
+
+    ``ohlcv[i]`` is the ``(lookback, 6)`` window of ``keys[i]``, oldest
+    first and NaN-padded on the left when ``counts[i] < lookback``. Columns
+    follow :mod:`trader.universe` (``TIMESTAMP`` … ``VOLUME``).
+    """
+
+    keys: List[SymbolKey]
+    ohlcv: np.ndarray
+    counts: np.ndarray
+    timeframe: str
+    #: Open time of the bar that just closed, in milliseconds.
+    bar_timestamp: int
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+@dataclass(slots=True)
+class Decisions:
+    """One decision per symbol of a :class:`UniverseWindow`.
+
+    ``action`` holds :data:`BUY`, :data:`SELL` or :data:`HOLD`;
+    ``confidence`` and ``stop_distance`` are only read where the action is
+    not :data:`HOLD`.
+    """
+
+    action: np.ndarray
+    confidence: np.ndarray
+    stop_distance: np.ndarray
+
+    @classmethod
+    def hold(cls, size: int) -> "Decisions":
+        return cls(
+            action=np.zeros(size, dtype=np.int8),
+            confidence=np.zeros(size),
+            stop_distance=np.full(size, np.nan),
+        )
+
+
+class Strategy(abc.ABC):
+    """A strategy evaluated over the whole universe at once."""
+
+    def __init__(self, config: StrategyConfig):
+        self.config = config
+        self.name = config.name
+        self.parameters = config.parameters
+
+    @property
+    @abc.abstractmethod
+    def lookback(self) -> int:
+        """Closed candles per symbol that :meth:`evaluate` needs."""
+
+    @abc.abstractmethod
+    def evaluate(self, universe: UniverseWindow) -> Decisions:
+        ...
+
+
+def load_strategy(config: StrategyConfig) -> Strategy:
+    """Import ``config.module`` and build its strategy with ``create(config)``."""
+    module = importlib.import_module(config.module)
+    create = getattr(module, "create", None)
+    if create is None:
+        raise ValueError(f"Strategy module {config.module!r} does not define create(config)")
+    strategy = create(config)
+    if not isinstance(strategy, Strategy):
+        raise TypeError(f"{config.module}.create returned {type(strategy).__name__}, not a Strategy")
+    return strategy
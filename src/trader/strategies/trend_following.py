@@ -0,0 +1,56 @@
+"""Moving-average crossover with an ATR stop."""
+from __future__ import annotations
+
+import numpy as np
+
+from ..config import StrategyConfig
+from ..universe import CLOSE, HIGH, LOW
+from .base import BUY, SELL, Decisions, Strategy, UniverseWindow
+
+
+class TrendFollowing(Strategy):
+    """Buy while the fast SMA is 0.1% above the slow SMA, sell while it is 0.1% below.
+
+    The stop distance is ``atr_multiplier`` times the ATR, the simple mean
+    of the true range over ``atr_period`` candles.
+    """
+
+    def __init__(self, config: StrategyConfig):
+        super().__init__(config)
+        params = self.parameters
+        self.fast_period = int(params.get("fast_ma_period", 50))
+        self.slow_period = int(params.get("slow_ma_period", 200))
+        self.atr_period = int(params.get("atr_period", 14))
+        self.atr_multiplier = float(params.get("atr_multiplier", 2.0))
+        self.confidence = float(params.get("confidence", 0.6))
+
+    @property
+    def lookback(self) -> int:
+        return max(self.fast_period, self.slow_period, self.atr_period) + 1
+
+    def evaluate(self, universe: UniverseWindow) -> Decisions:
+        decisions = Decisions.hold(len(universe))
+        ohlcv = universe.ohlcv
+        closes = ohlcv[:, :, CLOSE]
+        fast_ma = closes[:, -self.fast_period :].mean(axis=1)
+        slow_ma = closes[:, -self.slow_period :].mean(axis=1)
+
+        previous_close = closes[:, -self.atr_period - 1 : -1]
+        high = ohlcv[:, -self.atr_period :, HIGH]
+        low = ohlcv[:, -self.atr_period :, LOW]
+        true_range = np.maximum(high - low, np.maximum(np.abs(high - previous_close), np.abs(low - previous_close)))
+        atr = true_range.mean(axis=1)
+
+        ready = (universe.counts >= self.lookback) & (atr > 0)
+        buy = ready & (fast_ma > slow_ma * 1.001)
+        sell = ready & (fast_ma < slow_ma * 0.999)
+        decisions.action[buy] = BUY
+        decisions.action[sell] = SELL
+        active = buy | sell
+        decisions.confidence[active] = self.confidence
+        decisions.stop_distance[active] = atr[active] * self.atr_multiplier
+        return decisions
+
+
+def create(config: StrategyConfig) -> TrendFollowing:
+    return TrendFollowing(config)
@@ -0,0 +1,131 @@
+"""Candle windows for a whole universe of symbols in one array.
+
+:class:`UniverseBuffer` keeps a ring buffer of the latest candles per
+``(exchange, symbol)`` as rows of one ``(symbols, capacity, 6)`` array, so
+the last ``lookback`` candles of every symbol can be gathered into a
+contiguous ``(symbols, lookback, 6)`` matrix with a single fancy-indexing
+operation instead of one copy per symbol.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+TIMESTAMP, OPEN, HIGH, LOW, CLOSE, VOLUME = range(6)
+
+SymbolKey = Tuple[str, str]
+
+
+class UniverseBuffer:
+    """Per-symbol candle ring buffers stored side by side.
+
+    A candle with the timestamp of the latest one revises it in place (the
+    exchange reports the forming candle repeatedly), an older one is ignored
+    and a newer one is appended. The latest candle of a
+    symbol is taken to be forming until a newer one arrives.
+    """
+
+    def __init__(self, capacity: int = 500, *, initial_symbols: int = 16):
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        self.capacity = capacity
+        self._data = np.full((max(1, initial_symbols), capacity, 6), np.nan)
+        self._counts = np.zeros(max(1, initial_symbols), dtype=np.int64)
+        self._rows: Dict[SymbolKey, int] = {}
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def keys(self) -> List[SymbolKey]:
+        return list(self._rows)
+
+    def count(self, key: SymbolKey) -> int:
+        """Candles seen for ``key`` (not capped at capacity)."""
+        row = self._rows.get(key)
+        return 0 if row is None else int(self._counts[row])
+
+    def closed_timestamp(self, key: SymbolKey) -> Optional[int]:
+        """Timestamp of the latest closed candle of ``key``: the one before the forming candle."""
+        row = self._rows.get(key)
+        if row is None or self._counts[row] < 2:
+            return None
+        return int(self._data[row, (self._counts[row] - 2) % self.capacity, TIMESTAMP])
+
+    def update(self, key: SymbolKey, candle: Sequence[float]) -> bool:
+        """Apply one ``[timestamp, open, high, low, close, volume]`` candle.
+
+        Returns True when the candle starts a new bar, i.e. closes the previous one.
+        """
+        row = self._row(key)
+        count = int(self._counts[row])
+        if count:
+            last_slot = (count - 1) % self.capacity
+            last_timestamp = self._data[row, last_slot, TIMESTAMP]
+            if candle[TIMESTAMP] == last_timestamp:
+                self._data[row, last_slot] = candle[:6]
+                return False
+            if candle[TIMESTAMP] < last_timestamp:
+                return False
+        self._data[row, count % self.capacity] = candle[:6]
+        self._counts[row] = count + 1
+        return count > 0
+
+    def discard(self, key: SymbolKey) -> None:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._data[row] = np.nan
+        self._counts[row] = 0
+        self._free.append(row)
+
+    def window(
+        self,
+        keys: Sequence[SymbolKey],
+        lookback: int,
+        *,
+        closed: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """The last ``lookback`` candles of each of ``keys`` as one matrix.
+
+        Returns a contiguous ``(len(keys), lookback, 6)`` array in
+        chronological order along the second axis, right-aligned and
+        NaN-padded on the left for symbols with shorter history, plus the
+        number of real candles in each row. With ``closed`` the forming
+        candle of each symbol is left out.
+        """
+        if lookback < 1 or lookback > self.capacity - int(closed):
+            raise ValueError(f"lookback must be between 1 and {self.capacity - int(closed)}")
+        rows = np.array([self._rows[key] for key in keys], dtype=np.int64)
+        ends = self._counts[rows] - int(closed)
+        ends = np.maximum(ends, 0)
+        positions = ends[:, None] - lookback + np.arange(lookback)
+        matrix = self._data[rows[:, None], positions % self.capacity]
+        matrix[positions < 0] = np.nan
+        return matrix, np.minimum(ends, lookback)
+
+    def _row(self, key: SymbolKey) -> int:
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._rows)
+            if row == len(self._counts):
+                self._grow()
+        self._rows[key] = row
+        return row
+
+    def _grow(self) -> None:
+        size = len(self._counts)
+        data = np.full((size * 2, self.capacity, 6), np.nan)
+        data[:size] = self._data
+        counts = np.zeros(size * 2, dtype=np.int64)
+        counts[:size] = self._counts
+        self._data, self._counts = data, counts
@@ -1,9 +1,13 @@
 from .order_ids import make_client_order_id
 from .time import utc_now, ensure_ntp_sync
 from .risk import (
+    EwmaCovariance,
+    RiskLimits,
     calculate_position_size,
     calculate_volatility_targeted_position_value,
     apply_circuit_breakers,
+    enforce_portfolio_limits,
+    size_positions,
 )
 
 __all__ = [
@@ -13,4 +17,8 @@ __all__ = [
     "calculate_position_size",
     "calculate_volatility_targeted_position_value",
     "apply_circuit_breakers",
+    "EwmaCovariance",
+    "RiskLimits",
+    "enforce_portfolio_limits",
+    "size_positions",
 ]
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import math
 from dataclasses import dataclass
-from typing import Dict
+from typing import Any, Dict, Hashable, Mapping, Sequence
 
 import numpy as np
+from numpy.typing import ArrayLike
 
 from ..logging import get_logger
 
@@ -64,3 +66,210 @@ def apply_circuit_breakers(state: PortfolioState, config: Dict[str, float]) -> b
         logger.error("circuit_breaker.portfolio_heat", open_risk=state.open_risk)
         return True
     return False
+
+
+@dataclass(frozen=True, slots=True)
+class RiskLimits:
+    """Risk settings resolved once, for code that sizes signals in a hot loop."""
+
+    max_risk_per_trade: float = 0.02
+    max_portfolio_heat: float = 0.06
+    max_leverage: float = 1.0
+    #: ``None`` when volatility targeting is disabled.
+    target_portfolio_vol: float | None = None
+    ewma_halflife_days: float = 30.0
+
+    @classmethod
+    def from_settings(cls, settings: Mapping[str, Any]) -> "RiskLimits":
+        vol_targeting = settings.get("volatility_targeting") or {}
+        return cls(
+            max_risk_per_trade=float(settings.get("max_risk_per_trade", 0.02)),
+            max_portfolio_heat=float(settings.get("max_portfolio_heat", 0.06)),
+            max_leverage=float(settings.get("max_leverage", 1.0)),
+            target_portfolio_vol=(
+                float(vol_targeting["target_portfolio_vol"]) if vol_targeting.get("enabled") else None
+            ),
+            ewma_halflife_days=float(vol_targeting.get("ewma_halflife_days", 30.0)),
+        )
+
+
+def size_positions(
+    equity: float,
+    stop_distances: ArrayLike,
+    limits: RiskLimits,
+    asset_vols: ArrayLike | None = None,
+) -> np.ndarray:
+    """Vectorised :func:`calculate_position_size` over many candidate signals.
+
+    ``asset_vols`` entries that are missing (``nan``) or not positive leave
+    that signal capped by per-trade risk only.
+    """
+    stops = np.asarray(stop_distances, dtype=float)
+    if np.any(~(stops > 0)):
+        raise ValueError("stop_distance must be positive")
+    sizes = equity * limits.max_risk_per_trade / stops
+    if limits.target_portfolio_vol is not None and asset_vols is not None:
+        vols = np.broadcast_to(np.asarray(asset_vols, dtype=float), stops.shape)
+        usable = vols > 0  # False for nan as well
+        vol_sizes = equity * limits.target_portfolio_vol / np.where(usable, vols, 1.0) / stops
+        sizes = np.where(usable, np.minimum(sizes, vol_sizes), sizes)
+    return sizes
+
+
+def enforce_portfolio_limits(
+    risks: ArrayLike,
+    notionals: ArrayLike,
+    *,
+    equity: float,
+    open_risk: float,
+    gross_notional: float,
+    limits: RiskLimits,
+    priority: ArrayLike | None = None,
+) -> np.ndarray:
+    """Mask of candidates that fit the heat and leverage budgets together.
+
+    Candidates are taken in descending ``priority`` (input order on ties)
+    and accepted until the first one that would push cumulative open risk
+    past ``max_portfolio_heat`` or gross notional past ``max_leverage``;
+    everything after it is rejected as well.
+    """
+    risks = np.asarray(risks, dtype=float)
+    notionals = np.asarray(notionals, dtype=float)
+    order = (
+        np.argsort(-np.asarray(priority, dtype=float), kind="stable")
+        if priority is not None
+        else np.arange(risks.size)
+    )
+    fits = (open_risk + np.cumsum(risks[order]) <= limits.max_portfolio_heat * equity) & (
+        gross_notional + np.cumsum(notionals[order]) <= limits.max_leverage * equity
+    )
+    accepted = np.zeros(risks.size, dtype=bool)
+    accepted[order] = np.logical_and.accumulate(fits)
+    return accepted
+
+
+_MS_PER_DAY = 86_400_000.0
+_DAYS_PER_YEAR = 365.0
+
+
+class EwmaCovariance:
+    """Time-decayed EWMA variance and covariance of log returns per key.
+
+    Feed every candle close with :meth:`update`. Returns are taken between
+    closed bars only: a close repeated for the newest timestamp revises that
+    bar, and its return is recorded once a newer bar arrives. Each return
+    is scaled to annual units by its bar length and weighted with
+    ``0.5 ** (elapsed_days / halflife_days)``, so mixed timeframes and
+    missing bars decay correctly. Two keys' covariance is updated whenever
+    both close a bar with the same timestamp. Estimates are bias-corrected
+    for the weight accumulated so far and ``nan`` until ``min_observations``
+    returns were seen.
+    """
+
+    def __init__(self, halflife_days: float, *, min_observations: int = 20, capacity: int = 16):
+        if halflife_days <= 0:
+            raise ValueError("halflife_days must be positive")
+        self.halflife_days = halflife_days
+        self.min_observations = min_observations
+        self._index: Dict[Hashable, int] = {}
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity: int) -> None:
+        """(Re)allocate per-key arrays for ``capacity`` keys, keeping current values."""
+        size = len(self._index)
+
+        def grow(name: str, fill: float, dtype: Any = float, square: bool = False) -> None:
+            shape = (capacity, capacity) if square else (capacity,)
+            grown = np.full(shape, fill, dtype=dtype)
+            current = getattr(self, name, None)
+            if current is not None:
+                kept = (slice(0, size),) * len(shape)
+                grown[kept] = current[kept]
+            setattr(self, name, grown)
+
+        grow("_bar_ts", -1, np.int64)  # newest bar, may still be forming
+        grow("_bar_close", np.nan)
+        grow("_prev_ts", -1, np.int64)  # bar before it, closed
+        grow("_prev_close", np.nan)
+        grow("_return_ts", -1, np.int64)  # bar the latest return closed on
+        grow("_scaled_return", 0.0)
+        grow("_observations", 0, np.int64)
+        grow("_cov", 0.0, square=True)
+        grow("_weight", 0.0, square=True)
+
+    def _slot(self, key: Hashable) -> int:
+        slot = self._index.get(key)
+        if slot is None:
+            slot = len(self._index)
+            if slot == self._bar_ts.size:
+                self._allocate(2 * slot)
+            self._index[key] = slot
+        return slot
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def update(self, key: Hashable, timestamp_ms: int, close: float) -> None:
+        if not close > 0:
+            return
+        i = self._slot(key)
+        bar_ts = self._bar_ts[i]
+        if timestamp_ms == bar_ts:
+            self._bar_close[i] = close
+            return
+        if timestamp_ms < bar_ts:
+            return
+        if bar_ts >= 0 and self._prev_ts[i] >= 0:
+            self._record_return(i, int(bar_ts))
+        if bar_ts >= 0:
+            self._prev_ts[i], self._prev_close[i] = bar_ts, self._bar_close[i]
+        self._bar_ts[i], self._bar_close[i] = timestamp_ms, close
+
+    def _record_return(self, i: int, bar_ts: int) -> None:
+        elapsed_days = (bar_ts - self._prev_ts[i]) / _MS_PER_DAY
+        scaled = math.log(self._bar_close[i] / self._prev_close[i]) / math.sqrt(elapsed_days / _DAYS_PER_YEAR)
+        decay = 0.5 ** (elapsed_days / self.halflife_days)
+
+        # Keys whose latest return closed on the same bar, including this one.
+        peers = np.flatnonzero(self._return_ts[: len(self._index)] == bar_ts)
+        self._return_ts[i] = bar_ts
+        self._scaled_return[i] = scaled
+        peers = np.append(peers[peers != i], i)
+        products = scaled * self._scaled_return[peers]
+        self._cov[i, peers] = decay * self._cov[i, peers] + (1.0 - decay) * products
+        self._weight[i, peers] = decay * self._weight[i, peers] + (1.0 - decay)
+        self._cov[peers, i] = self._cov[i, peers]
+        self._weight[peers, i] = self._weight[i, peers]
+        self._observations[i] += 1
+
+    def volatility(self, keys: Sequence[Hashable]) -> np.ndarray:
+        """Annualised volatility per key, ``nan`` while not yet estimated."""
+        slots = self._slots(keys)
+        vols = np.full(len(keys), np.nan)
+        known = slots >= 0
+        index = slots[known]
+        weight = self._weight[index, index]
+        ready = (self._observations[index] >= self.min_observations) & (weight > 0)
+        values = np.full(index.size, np.nan)
+        values[ready] = np.sqrt(self._cov[index[ready], index[ready]] / weight[ready])
+        vols[known] = values
+        return vols
+
+    def covariance(self, keys: Sequence[Hashable]) -> np.ndarray:
+        """Annualised covariance matrix for ``keys`` with ``nan`` for unestimated entries."""
+        slots = self._slots(keys)
+        matrix = np.full((len(keys), len(keys)), np.nan)
+        known = np.flatnonzero(slots >= 0)
+        if known.size:
+            index = slots[known]
+            weight = self._weight[np.ix_(index, index)]
+            ready = self._observations[index] >= self.min_observations
+            with np.errstate(divide="ignore", invalid="ignore"):
+                block = np.where(weight > 0, self._cov[np.ix_(index, index)] / weight, np.nan)
+            block[~ready, :] = np.nan
+            block[:, ~ready] = np.nan
+            matrix[np.ix_(known, known)] = block
+        return matrix
+
+    def _slots(self, keys: Sequence[Hashable]) -> np.ndarray:
+        return np.array([self._index.get(key, -1) for key in keys], dtype=np.int64)
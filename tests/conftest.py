@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from trader.config import Settings, get_settings  # noqa: E402
+
+
+_CREDENTIALS = (
+    "ALPACA_API_KEY",
+    "ALPACA_API_SECRET",
+    "BINANCE_API_KEY",
+    "BINANCE_API_SECRET",
+    "TELEGRAM_BOT_TOKEN",
+    "TELEGRAM_CHAT_ID",
+)
+
+
+@pytest.fixture
+def settings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Settings:
+    """Offline settings: in-memory bus, throwaway SQLite database, one stub venue."""
+    for name in _CREDENTIALS:
+        monkeypatch.setenv(name, "test")
+    settings = get_settings(str(ROOT / "config" / "config.example.yaml")).model_copy(deep=True)
+    settings.app.dry_run = False
+    settings.redis.enabled = False
+    settings.redis.consumer_groups.enabled = False
+    settings.sharding.enabled = False
+    settings.candle_store.enabled = False
+    settings.database.engine = "sqlite"
+    settings.database.url = f"sqlite:///{tmp_path / 'trader.db'}"
+    settings.database.write_journal_path = str(tmp_path / "write_behind.journal")
+    settings.execution.order_updates = "poll"
+    settings.exchanges = [
+        {"name": "binance", "module": "ccxt.binanceusdm", "symbols": ["BTC/USDT"], "timeframe": "1m"}
+    ]
+    return settings
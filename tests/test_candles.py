@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from trader.candles import CANDLE_DTYPE, CandleSeries, CandleStore, as_candles
+
+MINUTE_MS = 60_000
+
+
+def _candle(bar: int, close: float) -> list:
+    return [bar * MINUTE_MS, close - 1.0, close + 1.0, close - 2.0, close, 10.0 * bar]
+
+
+def _closes(series: CandleSeries) -> list:
+    return series.read()["close"].tolist()
+
+
+def test_append_and_read_back(tmp_path: Path) -> None:
+    store = CandleStore(tmp_path)
+
+    written = store.append("binance", "BTC/USDT:USDT", "1m", [_candle(0, 100.0), _candle(1, 101.0)])
+    written += store.append("binance", "BTC/USDT:USDT", "1m", [_candle(2, 102.0)])
+
+    path = tmp_path / "binance" / "BTC_USDT_USDT" / "1m.ohlcv"
+    assert written == 3
+    assert path.stat().st_size == 3 * CANDLE_DTYPE.itemsize
+    np.testing.assert_array_equal(
+        as_candles(store.read("binance", "BTC/USDT:USDT", "1m")),
+        [_candle(0, 100.0), _candle(1, 101.0), _candle(2, 102.0)],
+    )
+    assert store.read("binance", "BTC/USDT:USDT", "1m", limit=2)["timestamp"].tolist() == [MINUTE_MS, 2 * MINUTE_MS]
+    # A fresh store picks the series up from disk.
+    reopened = CandleStore(tmp_path).series("binance", "BTC/USDT:USDT", "1m")
+    assert len(reopened) == 3 and reopened.last_timestamp == 2 * MINUTE_MS
+
+
+def test_forming_candle_revises_last_record_in_place(tmp_path: Path) -> None:
+    series = CandleSeries(tmp_path / "1m.ohlcv")
+    series.append([_candle(0, 100.0), _candle(1, 101.0)])
+
+    # Same timestamp as the last record: replaced, not appended.
+    assert series.append([_candle(1, 101.5)]) == 1
+    assert len(series) == 2
+    assert (tmp_path / "1m.ohlcv").stat().st_size == 2 * CANDLE_DTYPE.itemsize
+    assert _closes(series) == [100.0, 101.5]
+
+    # Older candles are ignored; within a batch the latest report of a bar wins.
+    assert series.append([_candle(0, 99.0), _candle(1, 101.7), _candle(2, 102.0), _candle(2, 102.5)]) == 2
+    assert _closes(series) == [100.0, 101.7, 102.5]
+    assert series.append([_candle(0, 99.0)]) == 0
+    assert CandleSeries(tmp_path / "1m.ohlcv").last_timestamp == 2 * MINUTE_MS
+
+
+def test_torn_trailing_record_is_ignored_and_truncated(tmp_path: Path) -> None:
+    path = tmp_path / "1m.ohlcv"
+    CandleSeries(path).append([_candle(0, 100.0), _candle(1, 101.0)])
+    # An interrupted append left half of a third record behind.
+    torn = np.array([tuple(_candle(2, 102.0))], dtype=CANDLE_DTYPE).tobytes()
+    with open(path, "ab") as handle:
+        handle.write(torn[: CANDLE_DTYPE.itemsize // 2])
+
+    series = CandleSeries(path)
+    assert len(series) == 2
+    assert series.last_timestamp == MINUTE_MS
+    assert _closes(series) == [100.0, 101.0]
+
+    assert series.append([_candle(2, 102.0)]) == 1
+    assert path.stat().st_size == 3 * CANDLE_DTYPE.itemsize
+    np.testing.assert_array_equal(as_candles(series.read()), [_candle(0, 100.0), _candle(1, 101.0), _candle(2, 102.0)])
+
+
+def test_revision_after_torn_record_overwrites_last_complete_record(tmp_path: Path) -> None:
+    path = tmp_path / "1m.ohlcv"
+    CandleSeries(path).append([_candle(0, 100.0), _candle(1, 101.0)])
+    with open(path, "ab") as handle:
+        handle.write(b"\x00" * 5)
+
+    series = CandleSeries(path)
+    assert series.append([_candle(1, 101.5)]) == 1
+
+    assert path.stat().st_size == 2 * CANDLE_DTYPE.itemsize
+    assert _closes(CandleSeries(path)) == [100.0, 101.5]
+
+
+def test_empty_series_reads_nothing(tmp_path: Path) -> None:
+    series = CandleSeries(tmp_path / "missing" / "1m.ohlcv")
+
+    assert len(series) == 0 and series.last_timestamp is None
+    assert series.read().dtype == CANDLE_DTYPE and series.read().size == 0
+    assert series.append([]) == 0
+    assert not series.path.exists()
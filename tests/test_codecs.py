@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import msgpack
+
+from trader.codecs import MSGPACK_VERSION, decode, get_codec
+
+
+def test_msgpack_round_trip_keeps_trace() -> None:
+    codec = get_codec("msgpack")
+    encoded = codec.encode("signal", {"symbol": "BTC/USDT"}, {"strategy": 123})
+    assert decode(encoded) == ("signal", {"symbol": "BTC/USDT"}, {"strategy": 123})
+
+
+def test_msgpack_decodes_body_without_trace() -> None:
+    legacy = bytes((MSGPACK_VERSION,)) + msgpack.packb(("signal", {"symbol": "BTC/USDT"}), use_bin_type=True)
+    assert decode(legacy) == ("signal", {"symbol": "BTC/USDT"}, {})
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from trader.config import Settings
+from trader.events import EventBus
+from trader.gateway import ExchangeGateway
+from trader.replay import StubExchange
+from trader.services.data_service import DataService
+from trader.services.monitor_service import MonitorService
+
+MINUTE_MS = 60_000
+
+
+def test_ingest_lag_is_exported_by_monitor_per_symbol(settings: Settings) -> None:
+    stream = settings.redis.streams.ingest
+    # The 1m candle that opened 63s ago closed 3s ago.
+    opened = int(time.time() * 1000) - MINUTE_MS - 3_000
+
+    async def scenario() -> tuple:
+        bus = EventBus(codec=settings.redis.codec)
+        await bus.connect()
+        gateway = ExchangeGateway.from_settings(
+            settings, clients={"binance": StubExchange("binance")}, rate_limited=False
+        )
+        data = DataService(settings, bus=bus, gateway=gateway)
+        monitor = MonitorService(settings, bus=bus)
+        forming = [opened, 1.0, 2.0, 0.5, 1.5, 10.0]
+        await data._publish_candles("binance", "BTC/USDT", "1m", [forming])
+        await data._publish_candles("binance", "BTC/USDT", "1m", [[*forming[:4], 1.6, 11.0]])  # still forming
+        await data._publish_candles("binance", "BTC/USDT", "1m", [[opened + MINUTE_MS, 1.6, 1.7, 1.5, 1.6, 1.0]])
+        events = await bus.consume_batch(stream, "0-0", block_ms=0)
+        for event, _ in events:
+            await monitor._handle_ingest_event(event)
+        await gateway.close()
+        await bus.disconnect()
+        return [event for event, _ in events], monitor
+
+    events, monitor = asyncio.run(scenario())
+
+    # Only the candle that closed is reported.
+    assert len(events) == 1
+    assert events[0].type == "ingest_lag"
+    assert 2.5 < events[0].payload["lag_seconds"] < 30
+    registry = monitor.metrics.registry
+    labels = {"exchange": "binance", "symbol": "BTC/USDT"}
+    assert registry.get_sample_value("trader_ingest_lag_seconds_count", labels) == 1
+    assert registry.get_sample_value("trader_ingest_lag_seconds_sum", labels) == events[0].payload["lag_seconds"]
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from sqlalchemy import inspect, text
+
+from trader.config import Settings
+from trader.db import OBSOLETE_INDEXES, create_engine_from_settings, create_schema
+
+
+def test_create_schema_drops_obsolete_indexes(settings: Settings) -> None:
+    create_schema(settings)
+    engine = create_engine_from_settings(settings)
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE INDEX ix_orders_open ON orders (exchange, symbol)"))
+        create_schema(settings)
+        names = {index["name"] for index in inspect(engine).get_indexes("orders")}
+    finally:
+        engine.dispose()
+    assert "ix_orders_created_at" in names
+    assert not names & set(OBSOLETE_INDEXES)
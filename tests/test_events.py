@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from trader.config import Settings
+from trader.events import Event, EventBus, PublishThrottle, coalesce_events
+from trader.services.base import BaseService
+from trader.services.strategy_service import _market_key, _merge_market_events
+
+
+def _candle(symbol: str, *bars: tuple) -> Event:
+    return Event(
+        type="market_data",
+        payload={"exchange": "binance", "symbol": symbol, "timeframe": "1m", "data": [list(bar) for bar in bars]},
+    )
+
+
+def _batch(*events: Event) -> list:
+    return [(event, f"{seq}-0") for seq, event in enumerate(events, start=1)]
+
+
+class _Service(BaseService):
+    name = "test"
+
+    async def run(self) -> None:
+        ...
+
+
+def _ticks(n: int) -> list:
+    return [Event(type="tick", payload={"n": i}) for i in range(n)]
+
+
+async def _group_bus(events: int) -> EventBus:
+    bus = EventBus()
+    await bus.connect()
+    await bus.ensure_group("orders", "execution")
+    await bus.publish_many("orders", _ticks(events))
+    return bus
+
+
+def test_coalesce_keeps_newest_event_per_key_in_order() -> None:
+    batch = _batch(
+        _candle("BTC/USDT", (1, 1.0)),
+        _candle("ETH/USDT", (1, 10.0)),
+        Event(type="heartbeat", payload={}),
+        _candle("BTC/USDT", (2, 2.0)),
+        _candle("BTC/USDT", (3, 3.0)),
+    )
+
+    kept, folded = coalesce_events(batch, lambda event: event.payload.get("symbol"))
+
+    # Unkeyed events always survive; survivors keep their relative order.
+    assert [message_id for _, message_id in kept] == ["2-0", "3-0", "5-0"]
+    assert kept[2][0].payload["data"] == [[3, 3.0]]
+    # Superseded ids must be acknowledged together with the event replacing them.
+    assert folded == {"5-0": ["1-0", "4-0"]}
+
+
+def test_coalesce_merge_keeps_every_bar_with_the_newest_version_winning() -> None:
+    batch = _batch(
+        _candle("BTC/USDT", (1, 1.0), (2, 2.0)),
+        _candle("ETH/USDT", (1, 10.0)),
+        _candle("BTC/USDT", (2, 2.5), (3, 3.0)),
+        _candle("BTC/USDT", (3, 3.5)),
+    )
+
+    kept, folded = coalesce_events(batch, _market_key, _merge_market_events)
+
+    assert [message_id for _, message_id in kept] == ["2-0", "4-0"]
+    assert kept[1][0].payload["data"] == [[1, 1.0], [2, 2.5], [3, 3.5]]
+    assert kept[0][0].payload["data"] == [[1, 10.0]]
+    assert folded == {"4-0": ["1-0", "3-0"]}
+    # The events that were read stay untouched.
+    assert batch[0][0].payload["data"] == [[1, 1.0], [2, 2.0]]
+
+
+def test_coalesce_without_duplicates_is_a_no_op() -> None:
+    batch = _batch(_candle("BTC/USDT", (1, 1.0)), _candle("ETH/USDT", (1, 10.0)))
+
+    assert coalesce_events(batch, _market_key, _merge_market_events) == (batch, {})
+
+
+def test_service_coalesces_only_once_lagging(settings: Settings) -> None:
+    settings.redis.backpressure.coalesce_lag_ms = 1_000
+    settings.redis.backpressure.coalesce_batch_size = 500
+    service = _Service(settings)
+
+    def batch(age_ms: float) -> list:
+        stamped = time.time_ns() - int(age_ms * 1e6)
+        events = [_candle("BTC/USDT", (ts, float(ts))) for ts in range(3)]
+        for event in events:
+            event.trace["published"] = stamped
+        return _batch(*events)
+
+    async def scenario() -> tuple:
+        await service.bus.connect()
+        fresh = await service._coalesce("market_data", batch(0), _market_key, _merge_market_events)
+        stale = await service._coalesce("market_data", batch(5_000), _market_key, _merge_market_events)
+        return fresh, stale, await service.bus.stream_stats("market_data")
+
+    fresh, stale, stats = asyncio.run(scenario())
+
+    assert len(fresh[0]) == 3 and fresh[2] == settings.redis.consumer_groups.batch_size
+    kept, folded, count = stale
+    assert [message_id for _, message_id in kept] == ["3-0"]
+    assert kept[0][0].payload["data"] == [[0, 0.0], [1, 1.0], [2, 2.0]]
+    assert folded == {"3-0": ["1-0", "2-0"]}
+    assert count == 500
+    assert stats["coalesced"] == [{"name": "test", "batches": 1, "dropped": 2}]
+
+
+def test_publish_throttle_waits_for_lagging_group() -> None:
+    async def scenario() -> tuple:
+        bus = EventBus()
+        await bus.connect()
+        await bus.ensure_group("market_data", "strategy")
+        await bus.publish_many("market_data", [Event(type="tick", payload={}) for _ in range(10)])
+        throttle = PublishThrottle(bus, max_lag=5, max_wait_ms=1_000, check_interval_ms=5)
+
+        async def consumer() -> None:
+            await asyncio.sleep(0.05)
+            await bus.consume_group("market_data", "strategy", "worker", count=10)
+
+        catching_up = asyncio.create_task(consumer())
+        waited = await throttle.wait("market_data")
+        await catching_up
+        return waited, await throttle.wait("market_data")
+
+    waited, cached = asyncio.run(scenario())
+
+    assert 0.03 < waited < 0.5
+    # Lag is only looked up again once the check interval has passed.
+    assert cached == 0.0
+
+
+def test_publish_throttle_gives_up_after_max_wait() -> None:
+    async def scenario() -> float:
+        bus = EventBus()
+        await bus.connect()
+        await bus.ensure_group("market_data", "strategy")
+        await bus.publish_many("market_data", [Event(type="tick", payload={}) for _ in range(10)])
+        throttle = PublishThrottle(bus, max_lag=5, max_wait_ms=50, check_interval_ms=10)
+        return await throttle.wait("market_data")
+
+    assert 0.04 <= asyncio.run(scenario()) < 0.5
+
+
+def test_publish_throttle_ignores_streams_without_groups() -> None:
+    async def scenario() -> float:
+        bus = EventBus()
+        await bus.connect()
+        await bus.publish_many("market_data", [Event(type="tick", payload={}) for _ in range(10)])
+        return await PublishThrottle(bus, max_lag=0, max_wait_ms=1_000).wait("market_data")
+
+    assert asyncio.run(scenario()) == 0.0
+
+
+def test_memory_group_keeps_unacked_entries_pending_per_consumer() -> None:
+    async def scenario() -> tuple:
+        bus = await _group_bus(5)
+        first = await bus.consume_group("orders", "execution", "a", count=3)
+        second = await bus.consume_group("orders", "execution", "b", count=3)
+        acked = await bus.ack("orders", "execution", ["1-0", "3-0", "3-0"])
+        return (
+            first,
+            second,
+            acked,
+            await bus.consume_group("orders", "execution", "a", pending=True),
+            await bus.consume_group("orders", "execution", "b", pending=True),
+            await bus.stream_stats("orders"),
+        )
+
+    first, second, acked, pending_a, pending_b, stats = asyncio.run(scenario())
+
+    # Consumers of one group share the cursor: every entry goes to exactly one of them.
+    assert [message_id for _, message_id in first] == ["1-0", "2-0", "3-0"]
+    assert [message_id for _, message_id in second] == ["4-0", "5-0"]
+    assert acked == 2
+    assert [message_id for _, message_id in pending_a] == ["2-0"]
+    assert [message_id for _, message_id in pending_b] == ["4-0", "5-0"]
+    assert pending_b[0][0].payload == {"n": 3}
+    assert stats["groups"] == [{"name": "execution", "pending": 3, "lag": 0}]
+
+
+def test_memory_group_reclaims_idle_entries_of_other_consumers() -> None:
+    async def scenario() -> tuple:
+        bus = await _group_bus(3)
+        await bus.consume_group("orders", "execution", "crashed", count=3)
+        not_idle = await bus.reclaim("orders", "execution", "b", min_idle_ms=60_000)
+        claimed = await bus.reclaim("orders", "execution", "b", min_idle_ms=0, count=2)
+        return (
+            not_idle,
+            claimed,
+            await bus.consume_group("orders", "execution", "crashed", pending=True),
+            await bus.consume_group("orders", "execution", "b", pending=True),
+        )
+
+    not_idle, claimed, crashed, owned = asyncio.run(scenario())
+
+    assert not_idle == []
+    assert [message_id for _, message_id in claimed] == ["1-0", "2-0"]
+    assert [message_id for _, message_id in crashed] == ["3-0"]
+    assert [message_id for _, message_id in owned] == ["1-0", "2-0"]
+
+
+def test_memory_group_drops_pending_entries_trimmed_from_the_stream() -> None:
+    async def scenario() -> tuple:
+        bus = EventBus(memory_maxlen=4)
+        await bus.connect()
+        await bus.ensure_group("orders", "execution")
+        await bus.publish_many("orders", _ticks(2))
+        await bus.consume_group("orders", "execution", "crashed", count=2)
+        await bus.publish_many("orders", _ticks(4))  # trims entries 1 and 2
+        claimed = await bus.reclaim("orders", "execution", "b", min_idle_ms=0)
+        return claimed, await bus.stream_stats("orders")
+
+    claimed, stats = asyncio.run(scenario())
+
+    assert claimed == []
+    assert stats["groups"][0]["pending"] == 0
+
+
+def test_group_consumer_replays_pending_first_and_retries_failures(settings: Settings) -> None:
+    group_conf = settings.redis.consumer_groups
+    group_conf.consumer_name = "worker"
+    group_conf.block_ms = 10
+    group_conf.reclaim_idle_ms = 0
+    group_conf.reclaim_interval_seconds = 0.0
+    service = _Service(settings)
+    seen: list = []
+    stop = asyncio.Event()
+
+    async def handler(event: Event) -> None:
+        seen.append(event.payload["n"])
+        if event.payload["n"] == 3 and seen.count(3) == 1:
+            raise RuntimeError("transient failure")
+        if set(seen) == set(range(5)) and seen.count(3) == 2:
+            stop.set()
+
+    async def scenario() -> dict:
+        bus = service.bus
+        await bus.connect()
+        await bus.ensure_group("orders", service.name)
+        await bus.publish_many("orders", _ticks(2))
+        # Delivered to this consumer before a "restart", never acknowledged.
+        await bus.consume_group("orders", service.name, "worker", count=2)
+        await bus.publish_many("orders", _ticks(5)[2:])
+        await asyncio.wait_for(service.consume_stream("orders", handler, group=True, stop=stop), 5.0)
+        return await bus.stream_stats("orders")
+
+    stats = asyncio.run(scenario())
+
+    # Pending entries come before new ones; the failed entry stays pending and is reclaimed.
+    assert seen[:2] == [0, 1]
+    assert seen[2:5] == [2, 3, 4]
+    assert seen[5:] == [3]
+    assert stats["groups"] == [{"name": "test", "pending": 0, "lag": 0}]
+
+
+class _AutoclaimRedis:
+    """Answers ``XAUTOCLAIM`` with scripted pages, like a Redis 7 server."""
+
+    def __init__(self, pages: list):
+        self.pages = pages
+        self.calls: list = []
+
+    async def xautoclaim(self, stream, group, consumer, *, min_idle_time, start_id, count):
+        self.calls.append((start_id, count))
+        return self.pages.pop(0)
+
+
+def test_redis_reclaim_pages_through_xautoclaim() -> None:
+    def entry(message_id: bytes, n: int) -> tuple:
+        return message_id, {b"payload": Event(type="tick", payload={"n": n}).dumps()}
+
+    client = _AutoclaimRedis(
+        [
+            # An entry deleted while pending comes back without fields and is skipped.
+            [b"5-0", [entry(b"1-0", 0), (b"2-0", None)], []],
+            [b"0-0", [entry(b"7-0", 6)], []],
+        ]
+    )
+    bus = EventBus("redis://unused")
+    bus._redis = client
+
+    claimed = asyncio.run(bus.reclaim("orders", "execution", "b", min_idle_ms=60_000, count=3))
+
+    assert [(event.payload["n"], message_id) for event, message_id in claimed] == [(0, "1-0"), (6, "7-0")]
+    assert client.calls == [("0-0", 3), (b"5-0", 2)]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+
+from trader.config import Settings
+from trader.db import create_schema, create_session_factory, session_scope
+from trader.events import Event, EventBus
+from trader.gateway import ExchangeGateway
+from trader.ledger import position_payload
+from trader.models import Position
+from trader.replay import StubExchange
+from trader.services.execution_service import ExecutionService
+from trader.utils import utc_now
+
+
+def test_fill_after_reconciliation_close_opens_fresh_position(settings: Settings) -> None:
+    create_schema(settings)
+    session_factory = create_session_factory(settings)
+    with session_scope(session_factory) as session:
+        session.add(
+            Position(
+                exchange="binance",
+                symbol="BTC/USDT",
+                strategy="trend_following",
+                quantity=2.0,
+                entry_price=100.0,
+                stop_price=95.0,
+                reduce_only_stop_installed=True,
+            )
+        )
+
+    async def scenario() -> None:
+        bus = EventBus(codec=settings.redis.codec)
+        gateway = ExchangeGateway.from_settings(
+            settings, clients={"binance": StubExchange("binance")}, rate_limited=False
+        )
+        service = ExecutionService(settings, bus=bus, gateway=gateway)
+        await service.setup()
+        try:
+            # Reconciliation closes the stale position in the database and announces it.
+            with session_scope(session_factory) as session:
+                position = session.query(Position).one()
+                position.closed_at = utc_now()
+                payload = position_payload(position, closed=True)
+            await service._handle_reconciliation(Event(type="position_update", payload=payload))
+
+            await service._handle_signal(
+                Event(
+                    type="approved_signal",
+                    payload={
+                        "strategy": "trend_following",
+                        "exchange": "binance",
+                        "symbol": "BTC/USDT",
+                        "decision": "buy",
+                        "price": 110.0,
+                        "risk": {"stop_distance": 5.0, "position_size": 0.5},
+                    },
+                )
+            )
+        finally:
+            await service.teardown()
+            await gateway.close()
+            await bus.disconnect()
+
+    asyncio.run(scenario())
+
+    with session_scope(session_factory) as session:
+        open_positions = session.query(Position).filter(Position.closed_at.is_(None)).all()
+        assert len(open_positions) == 1
+        assert open_positions[0].quantity == 0.5
+        assert open_positions[0].entry_price == 110.0
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from trader.gateway import ExchangeGateway, Priority, TokenBucket
+
+
+class _SlowExchange:
+    """Injected client whose reads take a while, so identical ones overlap."""
+
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+
+    async def fetch_open_orders(self, symbol: Any = None) -> List[Any]:
+        self.calls.append("fetch_open_orders")
+        await asyncio.sleep(0.01)
+        return []
+
+
+def test_bucket_serves_cost_above_capacity_without_deadlock() -> None:
+    async def scenario() -> float:
+        bucket = TokenBucket(rate=1_000.0, capacity=10.0)
+        await asyncio.wait_for(bucket.acquire(Priority.DATA, cost=40.0), 1.0)
+        return bucket._tokens
+
+    # The heavy call goes through on a full bucket and leaves it in debt.
+    assert asyncio.run(scenario()) < -25.0
+
+
+def test_bucket_serves_waiters_by_priority() -> None:
+    async def scenario() -> List[str]:
+        bucket = TokenBucket(rate=100.0, capacity=1.0)
+        await bucket.acquire(Priority.DATA)
+        served: List[str] = []
+
+        async def call(name: str, priority: Priority) -> None:
+            await bucket.acquire(priority)
+            served.append(name)
+
+        await asyncio.gather(call("data", Priority.DATA), call("order", Priority.ORDER))
+        return served
+
+    assert asyncio.run(scenario()) == ["order", "data"]
+
+
+def test_ccxt_endpoint_cost_is_charged_at_caller_priority() -> None:
+    pytest.importorskip("ccxt")
+
+    async def scenario() -> float:
+        gateway = ExchangeGateway([{"name": "binance", "module": "ccxt.binanceusdm"}])
+        await gateway.open()
+        try:
+            client = gateway.raw_client("binance")
+            bucket = gateway._bucket("binance")
+            before = bucket._tokens
+            # What ccxt's fetch2 does before each HTTP request.
+            await client.throttle(5)
+            return before - bucket._tokens
+        finally:
+            await gateway.close()
+
+    assert asyncio.run(scenario()) == pytest.approx(5.0, abs=0.5)
+
+
+def test_reads_coalesce_only_into_equally_or_more_urgent_requests() -> None:
+    exchange = _SlowExchange()
+
+    async def scenario(gateway: ExchangeGateway) -> None:
+        data = gateway.client("binance", Priority.DATA)
+        order = gateway.client("binance", Priority.ORDER)
+        await asyncio.gather(
+            data.fetch_open_orders("BTC/USDT"),
+            order.fetch_open_orders("BTC/USDT"),  # must not wait behind the data request
+            data.fetch_open_orders("BTC/USDT"),  # joins the order request
+            order.fetch_open_orders("BTC/USDT"),  # joins the order request
+        )
+
+    gateway = ExchangeGateway([], clients={"binance": exchange}, rate_limited=False)
+    asyncio.run(scenario(gateway))
+    assert gateway.requests["binance"] == 2
+    assert gateway.coalesced["binance"] == 2
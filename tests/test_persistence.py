@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+
+from trader.config import Settings
+from trader.db import create_async_session_factory, create_schema, create_session_factory, session_scope
+from trader.models import Order, OrderSide, OrderStatus, OrderType, Position
+from trader.persistence import OrderUpdate, PositionUpsert, WriteBehindWriter
+
+
+class _DatabaseDown:
+    """Session factory whose sessions fail on entry, like an unreachable database."""
+
+    calls = 0
+
+    def __call__(self) -> "_DatabaseDown":
+        self.calls += 1
+        return self
+
+    async def __aenter__(self) -> None:
+        raise ConnectionError("database is down")
+
+    async def __aexit__(self, *exc: object) -> None:
+        return None
+
+
+def _snapshot(i: int, quantity: float = 1.0) -> PositionUpsert:
+    return PositionUpsert(
+        exchange="binance", symbol=f"SYM{i}/USDT", strategy="s", quantity=quantity, entry_price=1.0, stop_price=0.9
+    )
+
+
+def _order(client_order_id: str) -> dict:
+    return dict(
+        client_order_id=client_order_id,
+        external_order_id=None,
+        strategy="s",
+        symbol="BTC/USDT",
+        exchange="binance",
+        side=OrderSide.BUY,
+        type=OrderType.LIMIT,
+        price=100.0,
+        stop_price=None,
+        quantity=1.0,
+        raw_request={},
+        raw_response={},
+        status=OrderStatus.PENDING,
+    )
+
+
+def _client_order_ids(settings: Settings) -> list:
+    with session_scope(create_session_factory(settings)) as session:
+        return sorted(order.client_order_id for order in session.query(Order))
+
+
+def test_bad_record_is_isolated_and_journaled(settings: Settings) -> None:
+    create_schema(settings)
+    journal = Path(settings.database.write_journal_path)
+
+    async def scenario() -> None:
+        writer = WriteBehindWriter(
+            create_async_session_factory(settings),
+            max_latency=1.0,
+            retry_delay=0.001,
+            max_attempts=2,
+            journal_path=journal,
+        )
+        writer.start()
+        await writer.record_order(**_order("a"))
+        await writer.record_order(**_order("b"))
+        await writer.record_order(**_order("a"))  # duplicate client_order_id fails the bulk insert
+        await writer.update_order(OrderUpdate("a", OrderStatus.FILLED, 1.0))
+        await writer.record_order(**_order("c"))
+        await writer.upsert_position(_snapshot(0))
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    assert _client_order_ids(settings) == ["a", "b", "c"]
+    with session_scope(create_session_factory(settings)) as session:
+        assert session.query(Position).count() == 1
+        # The update came after the journaled duplicate, so it waits in the journal behind it.
+        assert session.query(Order).filter_by(client_order_id="a").one().status == OrderStatus.PENDING
+    assert journal.exists()
+
+    async def replay() -> int:
+        writer = WriteBehindWriter(create_async_session_factory(settings), journal_path=journal)
+        return await writer.replay_journal()
+
+    # The duplicate insert is skipped on replay; the update behind it is applied.
+    assert asyncio.run(replay()) == 1
+    assert not journal.exists()
+    with session_scope(create_session_factory(settings)) as session:
+        assert session.query(Order).filter_by(client_order_id="a").one().status == OrderStatus.FILLED
+
+
+def test_close_timeout_journals_pending_records_for_replay(settings: Settings) -> None:
+    create_schema(settings)
+    journal = Path(settings.database.write_journal_path)
+
+    async def shutdown_while_database_down() -> float:
+        writer = WriteBehindWriter(_DatabaseDown(), retry_delay=10.0, max_attempts=100, journal_path=journal)
+        writer.start()
+        await writer.record_order(**_order("a"))
+        await writer.upsert_position(_snapshot(0, quantity=2.0))
+        started = time.perf_counter()
+        await writer.close(timeout=0.05)
+        return time.perf_counter() - started
+
+    assert asyncio.run(shutdown_while_database_down()) < 1.0
+    assert journal.exists()
+
+    async def restart() -> int:
+        writer = WriteBehindWriter(create_async_session_factory(settings), journal_path=journal)
+        return await writer.replay_journal()
+
+    assert asyncio.run(restart()) == 2
+    assert _client_order_ids(settings) == ["a"]
+    with session_scope(create_session_factory(settings)) as session:
+        assert session.query(Position).one().quantity == 2.0
+
+
+def test_journal_with_torn_record_replays_complete_records(settings: Settings) -> None:
+    create_schema(settings)
+    journal = Path(settings.database.write_journal_path)
+
+    async def spill() -> None:
+        writer = WriteBehindWriter(
+            _DatabaseDown(), max_latency=0.0, retry_delay=0.001, max_attempts=1, journal_path=journal
+        )
+        writer.start()
+        await writer.upsert_position(_snapshot(0))
+        await writer.upsert_position(_snapshot(1))
+        await writer.close()
+
+    asyncio.run(spill())
+    data = journal.read_bytes()
+    journal.write_bytes(data[:-5])  # crash while appending the last record
+
+    async def replay() -> int:
+        return await WriteBehindWriter(create_async_session_factory(settings), journal_path=journal).replay_journal()
+
+    assert asyncio.run(replay()) == 1
+
+
+def test_failing_batches_do_not_block_callers() -> None:
+    factory = _DatabaseDown()
+
+    async def scenario() -> WriteBehindWriter:
+        writer = WriteBehindWriter(factory, max_latency=0.0, retry_delay=0.001, max_attempts=3, max_queue=1)
+        writer.start()
+        # With a one-slot queue these puts only return because failed batches are set aside.
+        for i in range(3):
+            await asyncio.wait_for(writer.upsert_position(_snapshot(i)), 1.0)
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert writer.pending == 0
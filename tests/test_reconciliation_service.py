@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import asyncio
+
+from trader.config import Settings
+from trader.db import create_schema
+from trader.events import EventBus
+from trader.gateway import ExchangeGateway
+from trader.replay import StubExchange
+from trader.services.monitor_service import MonitorService
+from trader.services.reconciliation_service import ReconciliationService
+
+
+def test_cycle_duration_is_exported_by_monitor(settings: Settings) -> None:
+    create_schema(settings)
+    stream = settings.redis.streams.reconciliations
+
+    async def scenario() -> MonitorService:
+        bus = EventBus(codec=settings.redis.codec)
+        await bus.connect()
+        gateway = ExchangeGateway.from_settings(
+            settings, clients={"binance": StubExchange("binance")}, rate_limited=False
+        )
+        reconciliation = ReconciliationService(settings, bus=bus, gateway=gateway)
+        monitor = MonitorService(settings, bus=bus)
+        await reconciliation._reconcile_once()
+        for event, _ in await bus.consume_batch(stream, "0-0", block_ms=0):
+            await monitor._handle_reconciliation_event(event)
+        await gateway.close()
+        await bus.disconnect()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    registry = monitor.metrics.registry
+    assert registry.get_sample_value("trader_reconciliation_cycle_seconds_count") == 1
+    assert registry.get_sample_value("trader_reconciliation_cycle_seconds_sum") >= 0
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+
+from trader.config import Settings
+from trader.db import create_schema
+from trader.events import Event, EventBus
+from trader.services.risk_service import RiskService
+
+
+def _signal(symbol: str, *, price: float, position_size: float, confidence: float) -> Event:
+    return Event(
+        type="signal",
+        payload={
+            "strategy": "trend_following",
+            "exchange": "binance",
+            "symbol": symbol,
+            "decision": "buy",
+            "confidence": confidence,
+            "price": price,
+            "risk": {"stop_distance": price * 0.01, "position_size": position_size},
+        },
+    )
+
+
+def test_leverage_limit_uses_quote_notional(settings: Settings) -> None:
+    settings.risk.max_leverage = 1.5
+    stream = settings.redis.streams.approved_signals
+
+    async def scenario() -> list:
+        bus = EventBus(codec=settings.redis.codec)
+        await bus.connect()
+        service = RiskService(settings, bus=bus)
+        # 1 BTC at 100,000 is within 1.5x of 100,000 equity; 2 BTC more is not.
+        await service._handle_signals(
+            [
+                _signal("BTC/USDT", price=100_000.0, position_size=1.0, confidence=0.9),
+                _signal("ETH/USDT", price=100_000.0, position_size=2.0, confidence=0.8),
+            ],
+            stream,
+        )
+        approved = await bus.consume_batch(stream, "0-0", block_ms=0)
+        await bus.disconnect()
+        return approved
+
+    approved = asyncio.run(scenario())
+    assert [event.payload["symbol"] for event, _ in approved] == ["BTC/USDT"]
+
+
+def test_ledger_rebuilt_only_after_consecutive_mismatches(settings: Settings) -> None:
+    create_schema(settings)
+    settings.risk.ledger_rebuild_after_mismatches = 2
+    fill = {
+        "exchange": "binance",
+        "symbol": "BTC/USDT",
+        "strategy": "trend_following",
+        "quantity": 1.0,
+        "entry_price": 100.0,
+        "stop_price": 95.0,
+        "closed": False,
+    }
+
+    async def scenario() -> list:
+        service = RiskService(settings, bus=EventBus(codec=settings.redis.codec))
+        # A fill whose position row is still queued in the write-behind writer.
+        service.ledger.apply_event("position_update", fill)
+        sizes = []
+        for _ in range(3):
+            await service._verify_ledger()
+            sizes.append(len(service.ledger))
+        return sizes
+
+    # Kept through the first mismatch, reloaded from the database on the second.
+    assert asyncio.run(scenario()) == [1, 0, 0]
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from trader.utils.risk import (
+    EwmaCovariance,
+    RiskLimits,
+    calculate_position_size,
+    enforce_portfolio_limits,
+    size_positions,
+)
+
+MINUTE_MS = 60_000
+
+
+def _reference_limits(risks, notionals, *, equity, open_risk, gross_notional, limits, priority=None) -> list:
+    """Straight loop over candidates in priority order, stopping at the first misfit."""
+    order = sorted(range(len(risks)), key=lambda i: -priority[i] if priority is not None else 0)
+    accepted = [False] * len(risks)
+    for i in order:
+        open_risk += risks[i]
+        gross_notional += notionals[i]
+        if open_risk > limits.max_portfolio_heat * equity or gross_notional > limits.max_leverage * equity:
+            break
+        accepted[i] = True
+    return accepted
+
+
+class _ReferenceEwma:
+    """Per-pair EWMA written out with dicts, following the EwmaCovariance docstring."""
+
+    def __init__(self, halflife_days: float, min_observations: int):
+        self.halflife_days = halflife_days
+        self.min_observations = min_observations
+        self.bar: dict = {}
+        self.prev: dict = {}
+        self.latest_return: dict = {}
+        self.observations: dict = defaultdict(int)
+        self.cov: dict = defaultdict(float)
+        self.weight: dict = defaultdict(float)
+
+    def update(self, key, timestamp_ms: int, close: float) -> None:
+        if close <= 0:
+            return
+        bar = self.bar.get(key)
+        if bar is not None and timestamp_ms <= bar[0]:
+            if timestamp_ms == bar[0]:
+                self.bar[key] = (timestamp_ms, close)
+            return
+        if bar is not None and key in self.prev:
+            prev_ts, prev_close = self.prev[key]
+            days = (bar[0] - prev_ts) / 86_400_000
+            scaled = math.log(bar[1] / prev_close) / math.sqrt(days / 365)
+            decay = 0.5 ** (days / self.halflife_days)
+            self.latest_return[key] = (bar[0], scaled)
+            self.observations[key] += 1
+            for other, (return_ts, other_scaled) in self.latest_return.items():
+                if return_ts == bar[0]:
+                    pair = frozenset((key, other))
+                    self.cov[pair] = decay * self.cov[pair] + (1 - decay) * scaled * other_scaled
+                    self.weight[pair] = decay * self.weight[pair] + (1 - decay)
+        if bar is not None:
+            self.prev[key] = bar
+        self.bar[key] = (timestamp_ms, close)
+
+    def covariance(self, a, b) -> float:
+        pair = frozenset((a, b))
+        ready = min(self.observations[a], self.observations[b]) >= self.min_observations
+        if not ready or self.weight[pair] == 0:
+            return math.nan
+        return self.cov[pair] / self.weight[pair]
+
+
+def _feed(estimators, updates) -> None:
+    for update in updates:
+        for estimator in estimators:
+            estimator.update(*update)
+
+
+def _market(bars: int = 120, seed: int = 7) -> list:
+    """Interleaved closes for three symbols with revisions, gaps, stale and bad ticks."""
+    rng = np.random.default_rng(seed)
+    closes = {"BTC": 100.0, "ETH": 50.0, "SOL": 20.0}
+    updates = []
+    for bar in range(bars):
+        ts = bar * MINUTE_MS
+        common = rng.normal(0, 0.001)
+        for symbol in ("BTC", "ETH"):
+            if symbol == "ETH" and bar % 17 == 5:
+                continue  # missing bar
+            closes[symbol] *= math.exp(common + rng.normal(0, 0.001))
+            updates.append((symbol, ts, closes[symbol] * 0.999))  # forming bar...
+            updates.append((symbol, ts, closes[symbol]))  # ...revised by its final close
+        if bar % 5 == 0:
+            closes["SOL"] *= math.exp(rng.normal(0, 0.003))
+            updates.append(("SOL", ts, closes["SOL"]))
+        if bar % 11 == 3:
+            updates.append(("BTC", ts - 2 * MINUTE_MS, 1.0))  # stale tick for an older bar
+            updates.append(("ETH", ts + MINUTE_MS, 0.0))  # unusable close
+    return updates
+
+
+@pytest.mark.parametrize("with_priority", [False, True])
+def test_enforce_portfolio_limits_matches_reference_loop(with_priority: bool) -> None:
+    rng = np.random.default_rng(3)
+    limits = RiskLimits(max_portfolio_heat=0.06, max_leverage=2.0)
+    for _ in range(200):
+        n = int(rng.integers(0, 12))
+        risks = rng.uniform(0, 0.02, n) * 10_000
+        notionals = rng.uniform(0, 0.5, n) * 10_000
+        # Coarse priorities so ties (kept in input order) actually occur.
+        priority = rng.integers(0, 4, n).astype(float) if with_priority else None
+        kwargs = dict(
+            equity=10_000.0,
+            open_risk=float(rng.uniform(0, 300)),
+            gross_notional=float(rng.uniform(0, 10_000)),
+            limits=limits,
+            priority=priority,
+        )
+
+        accepted = enforce_portfolio_limits(risks, notionals, **kwargs)
+
+        assert accepted.tolist() == _reference_limits(list(risks), list(notionals), **kwargs)
+
+
+def test_enforce_portfolio_limits_rejects_everything_after_first_misfit() -> None:
+    limits = RiskLimits(max_portfolio_heat=0.06, max_leverage=10.0)
+
+    accepted = enforce_portfolio_limits(
+        [200.0, 500.0, 10.0], [0.0, 0.0, 0.0], equity=10_000.0, open_risk=0.0, gross_notional=0.0, limits=limits
+    )
+
+    # The small third signal would still fit, but budgets are filled strictly in order.
+    assert accepted.tolist() == [True, False, False]
+
+
+def test_size_positions_matches_scalar_sizing() -> None:
+    settings = {
+        "max_risk_per_trade": 0.01,
+        "volatility_targeting": {"enabled": True, "target_portfolio_vol": 0.15},
+    }
+    limits = RiskLimits.from_settings(settings)
+    stops = np.array([0.5, 1.0, 2.0, 4.0])
+    vols = np.array([0.2, np.nan, 3.0, 0.0])
+
+    sizes = size_positions(25_000.0, stops, limits, vols)
+
+    expected = [
+        calculate_position_size(25_000.0, stop, settings, vol if vol > 0 else None) for stop, vol in zip(stops, vols)
+    ]
+    np.testing.assert_allclose(sizes, expected)
+    with pytest.raises(ValueError):
+        size_positions(25_000.0, [1.0, 0.0], limits)
+
+
+def test_ewma_covariance_matches_reference_recursion() -> None:
+    symbols = ["BTC", "ETH", "SOL"]
+    estimator = EwmaCovariance(0.05, min_observations=10, capacity=1)  # forces the arrays to grow
+    reference = _ReferenceEwma(0.05, min_observations=10)
+
+    _feed([estimator, reference], _market())
+
+    expected = np.array([[reference.covariance(a, b) for b in symbols] for a in symbols])
+    np.testing.assert_allclose(estimator.covariance(symbols), expected, rtol=1e-10, equal_nan=True)
+    np.testing.assert_allclose(estimator.volatility(symbols), np.sqrt(np.diag(expected)), rtol=1e-10)
+    assert np.isfinite(expected[:2, :2]).all() and np.isfinite(expected[2, 2])
+    # 5-minute SOL returns never span the same bar as a 1-minute return, so they get no covariance.
+    assert np.isnan(expected[2, :2]).all()
+
+
+def test_ewma_covariance_is_nan_until_estimated() -> None:
+    estimator = EwmaCovariance(1.0, min_observations=3)
+    for bar in range(4):  # three closed returns for BTC, one for ETH
+        estimator.update("BTC", bar * MINUTE_MS, 100.0 + bar)
+        if bar < 3:
+            estimator.update("ETH", bar * MINUTE_MS, 50.0 + bar)
+    estimator.update("BTC", 4 * MINUTE_MS, 104.0)
+
+    vols = estimator.volatility(["BTC", "ETH", "XRP"])
+    assert np.isfinite(vols[0]) and np.isnan(vols[1:]).all()
+    matrix = estimator.covariance(["BTC", "ETH"])
+    assert np.isfinite(matrix[0, 0]) and np.isnan(matrix[[0, 1, 1], [1, 0, 1]]).all()
+    with pytest.raises(ValueError):
+        EwmaCovariance(0.0)
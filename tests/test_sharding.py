@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from collections import Counter
+
+from trader.sharding import HashRing, partition_for, partition_owners, partition_stream, stable_hash
+
+PARTITIONS = 64
+WORKERS = ["worker-a", "worker-b", "worker-c"]
+
+
+def test_stable_hash_is_fixed_across_processes() -> None:
+    # Pinned so a change of hash function (which would reshuffle every partition) is caught.
+    assert stable_hash("binance:BTC/USDT") == 0xAB19BF6658E223CE
+    assert stable_hash("binance:BTC/USDT") != stable_hash("binance:ETH/USDT")
+
+
+def test_partition_for_is_deterministic_and_in_range() -> None:
+    symbols = [f"SYM{i:03d}/USDT" for i in range(500)]
+    partitions = [partition_for("binance", symbol, PARTITIONS) for symbol in symbols]
+    assert partitions == [partition_for("binance", symbol, PARTITIONS) for symbol in symbols]
+    assert all(0 <= partition < PARTITIONS for partition in partitions)
+    # Spread over (nearly) every partition rather than piling onto a few.
+    assert len(set(partitions)) > PARTITIONS * 0.9
+    assert partition_stream("market_data", 7) == "market_data.7"
+
+
+def test_ring_owner_does_not_depend_on_insertion_order() -> None:
+    keys = [f"partition:{i}" for i in range(PARTITIONS)]
+    forward = HashRing(WORKERS)
+    backward = HashRing(reversed(WORKERS))
+    assert [forward.owner(key) for key in keys] == [backward.owner(key) for key in keys]
+
+
+def test_ring_assignments_cover_every_key_once() -> None:
+    keys = [f"partition:{i}" for i in range(PARTITIONS)]
+    assignments = HashRing(WORKERS).assignments(keys)
+    assert set(assignments) == set(WORKERS)
+    assert sorted(key for owned in assignments.values() for key in owned) == sorted(keys)
+    # Virtual nodes keep the load roughly even.
+    assert min(len(owned) for owned in assignments.values()) >= PARTITIONS // len(WORKERS) // 3
+
+
+def test_empty_ring_owns_nothing() -> None:
+    ring = HashRing()
+    assert ring.owner("partition:0") is None
+    assert partition_owners([], PARTITIONS) == {}
+
+
+def test_joining_worker_only_takes_partitions() -> None:
+    before = partition_owners(WORKERS, PARTITIONS)
+    after = partition_owners(WORKERS + ["worker-d"], PARTITIONS)
+    moved = {partition for partition in before if before[partition] != after[partition]}
+    assert moved
+    # Every partition that moved went to the new worker; nothing moved between existing ones.
+    assert {after[partition] for partition in moved} == {"worker-d"}
+
+
+def test_leaving_worker_only_releases_its_partitions() -> None:
+    before = partition_owners(WORKERS, PARTITIONS)
+    after = partition_owners(["worker-a", "worker-c"], PARTITIONS)
+    for partition, owner in before.items():
+        if owner != "worker-b":
+            assert after[partition] == owner
+        else:
+            assert after[partition] in ("worker-a", "worker-c")
+
+
+def test_remove_then_add_restores_ownership() -> None:
+    keys = [f"partition:{i}" for i in range(PARTITIONS)]
+    ring = HashRing(WORKERS)
+    original = [ring.owner(key) for key in keys]
+    ring.remove("worker-b")
+    assert "worker-b" not in ring.members and len(ring) == 2
+    assert Counter(ring.owner(key) for key in keys)["worker-b"] == 0
+    ring.add("worker-b")
+    assert [ring.owner(key) for key in keys] == original